@@ -0,0 +1,73 @@
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from sqlalchemy import insert, inspect
+from sqlalchemy.orm import Session
+
+from setting.base import BULK_INSERT_CHUNK_SIZE
+
+
+def new_id() -> str:
+    """Generate a primary key client-side, so no flush is needed to learn it."""
+    return str(uuid.uuid4())
+
+
+def to_row(obj: Any) -> Dict[str, Any]:
+    """
+    Convert an ORM instance into a column dict for a Core insert, assigning
+    a client-side id if it doesn't have one yet.
+    """
+    row = {}
+    # keyed by attribute, which differs from the column name for remapped
+    # vector columns (see setting.embedding)
+    for attr in inspect(obj).mapper.column_attrs:
+        value = getattr(obj, attr.key, None)
+        if value is not None:
+            row[attr.key] = value
+    if row.get("id") is None:
+        row["id"] = new_id()
+        obj.id = row["id"]
+    return row
+
+
+def bulk_insert(
+    db: Session,
+    model,
+    rows: Iterable[Union[Dict[str, Any], Any]],
+    chunk_size: Optional[int] = None,
+) -> List[str]:
+    """
+    Insert rows with multi-row INSERT statements instead of one INSERT per row.
+
+    Parameters:
+    - db: Session whose transaction the inserts join (the caller commits)
+    - model: Mapped class, e.g. KnowledgeBlock, Concept or Relationship
+    - rows: Column dicts or unsaved ORM instances of `model`
+    - chunk_size: Rows per INSERT statement, defaults to BULK_INSERT_CHUNK_SIZE
+
+    Returns:
+    - The ids of the inserted rows, in input order
+    """
+    chunk_size = chunk_size or BULK_INSERT_CHUNK_SIZE
+
+    prepared = []
+    for row in rows:
+        if isinstance(row, dict):
+            row = dict(row)
+            if row.get("id") is None:
+                row["id"] = new_id()
+        else:
+            row = to_row(row)
+        prepared.append(row)
+
+    # a multi-row VALUES clause needs the same columns in every row, so rows
+    # that leave different columns to their defaults go into separate statements
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    for row in prepared:
+        groups.setdefault(tuple(sorted(row.keys())), []).append(row)
+
+    for group in groups.values():
+        for start in range(0, len(group), chunk_size):
+            db.execute(insert(model).values(group[start : start + chunk_size]))
+
+    return [row["id"] for row in prepared]
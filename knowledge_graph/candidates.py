@@ -0,0 +1,348 @@
+import heapq
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from itertools import combinations
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from knowledge_graph.models import Concept, Relationship
+from knowledge_graph.vector_index import vector_search
+
+if TYPE_CHECKING:
+    from knowledge_graph.snapshot import GraphSnapshot
+
+# relationship targets that count as "blocks" a concept occurs in
+BLOCK_TYPES = ("KnowledgeBlock", "SourceData")
+
+# a block is identified by (entity type, entity id)
+BlockKey = Tuple[str, str]
+
+
+@dataclass
+class ConceptPair:
+    """A pair of concepts proposed for relationship judgment."""
+
+    concept_a_id: str
+    concept_b_id: str
+    score: float
+    shared_blocks: List[BlockKey] = field(default_factory=list)
+    method: str = "cooccurrence"
+    # concept id -> blocks of that concept alone, for pairs sharing no block
+    concept_blocks: Dict[str, List[BlockKey]] = field(default_factory=dict)
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return pair_key(self.concept_a_id, self.concept_b_id)
+
+
+def pair_key(concept_a_id: str, concept_b_id: str) -> Tuple[str, str]:
+    """Order-independent key of a concept pair."""
+    if concept_a_id <= concept_b_id:
+        return (concept_a_id, concept_b_id)
+    return (concept_b_id, concept_a_id)
+
+
+class CooccurrenceIndex:
+    """
+    Inverted index from knowledge block to the concepts it contains.
+
+    Built once per run; candidate pairs are then enumerated only from
+    concepts that share at least one block, instead of scanning every pair.
+    """
+
+    def __init__(self, block_concepts: Dict[BlockKey, Set[str]]):
+        self.block_concepts = block_concepts
+        self.concept_blocks: Dict[str, Set[BlockKey]] = defaultdict(set)
+        for block, concept_ids in block_concepts.items():
+            for concept_id in concept_ids:
+                self.concept_blocks[concept_id].add(block)
+
+    @classmethod
+    def from_db(cls, db: Session) -> "CooccurrenceIndex":
+        """Build the index from Concept -> KnowledgeBlock/SourceData relationships."""
+        rows = (
+            db.query(
+                Relationship.source_id,
+                Relationship.target_type,
+                Relationship.target_id,
+            )
+            .filter(
+                Relationship.source_type == "Concept",
+                Relationship.target_type.in_(BLOCK_TYPES),
+            )
+            .yield_per(10000)
+        )
+        block_concepts: Dict[BlockKey, Set[str]] = defaultdict(set)
+        for concept_id, target_type, target_id in rows:
+            block_concepts[(target_type, target_id)].add(concept_id)
+        return cls(dict(block_concepts))
+
+    @classmethod
+    def from_snapshot(cls, graph: "GraphSnapshot") -> "CooccurrenceIndex":
+        """Build the index from an in-memory graph snapshot instead of the database."""
+        if "Concept" not in graph.node_types:
+            return cls({})
+        concept_code = graph.node_types.index("Concept")
+        block_codes = [
+            graph.node_types.index(block_type)
+            for block_type in BLOCK_TYPES
+            if block_type in graph.node_types
+        ]
+        source_codes = graph.node_type_codes[graph.edge_sources]
+        target_codes = graph.node_type_codes[graph.edge_targets]
+        mask = (source_codes == concept_code) & np.isin(target_codes, block_codes)
+
+        block_concepts: Dict[BlockKey, Set[str]] = defaultdict(set)
+        for source, target in zip(
+            graph.edge_sources[mask].tolist(), graph.edge_targets[mask].tolist()
+        ):
+            block_type = graph.node_types[graph.node_type_codes[target]]
+            block_concepts[(block_type, graph.node_ids[target])].add(
+                graph.node_ids[source]
+            )
+        return cls(dict(block_concepts))
+
+    def shared_blocks(self, concept_a_id: str, concept_b_id: str) -> List[BlockKey]:
+        return sorted(
+            self.concept_blocks.get(concept_a_id, set())
+            & self.concept_blocks.get(concept_b_id, set())
+        )
+
+    def candidate_pairs(
+        self,
+        concept_ids: Optional[Iterable[str]] = None,
+        max_pairs: Optional[int] = None,
+        max_block_concepts: Optional[int] = 200,
+        exclude: Optional[Set[Tuple[str, str]]] = None,
+    ) -> List[ConceptPair]:
+        """
+        Enumerate co-occurring concept pairs ranked by shared-block count.
+
+        Parameters:
+        - concept_ids: Only pairs involving one of these concepts (all pairs if None)
+        - max_pairs: Keep only the best ranked pairs
+        - max_block_concepts: Ignore blocks mentioning more concepts than this,
+          they are hubs that relate everything to everything
+        - exclude: Pair keys (see pair_key) to leave out, e.g. already related pairs
+
+        Returns:
+        - Pairs ordered by descending shared-block count, ties broken by id
+        """
+        exclude = exclude or set()
+        counts: Counter = Counter()
+
+        if concept_ids is None:
+            for concept_set in self.block_concepts.values():
+                if max_block_concepts and len(concept_set) > max_block_concepts:
+                    continue
+                for a, b in combinations(sorted(concept_set), 2):
+                    counts[(a, b)] += 1
+        else:
+            focus = set(concept_ids)
+            for concept_id in focus:
+                for block in self.concept_blocks.get(concept_id, ()):
+                    concept_set = self.block_concepts[block]
+                    if max_block_concepts and len(concept_set) > max_block_concepts:
+                        continue
+                    for other_id in concept_set:
+                        if other_id == concept_id:
+                            continue
+                        key = pair_key(concept_id, other_id)
+                        # a pair of two focus concepts is seen from both sides
+                        if other_id in focus and key[0] != concept_id:
+                            continue
+                        counts[key] += 1
+
+        ranked = (
+            (count, key) for key, count in counts.items() if key not in exclude
+        )
+        sort_key = lambda item: (-item[0], item[1])
+        if max_pairs is not None:
+            ranked = heapq.nsmallest(max_pairs, ranked, key=sort_key)
+        else:
+            ranked = sorted(ranked, key=sort_key)
+
+        return [
+            ConceptPair(
+                concept_a_id=a,
+                concept_b_id=b,
+                score=float(count),
+                shared_blocks=self.shared_blocks(a, b),
+            )
+            for count, (a, b) in ranked
+        ]
+
+
+def load_concept_vectors(
+    db: Session, concept_ids: Optional[Iterable[str]] = None
+) -> Tuple[List[str], np.ndarray]:
+    """
+    Load concept definition vectors into one float32 matrix.
+
+    Returns:
+    - Concept ids and the matrix whose rows are their vectors
+    """
+    query = db.query(Concept.id, Concept.definition_vec).filter(
+        Concept.definition_vec.isnot(None)
+    )
+    if concept_ids is not None:
+        query = query.filter(Concept.id.in_(list(concept_ids)))
+
+    ids = []
+    vectors = []
+    for concept_id, vector in query.yield_per(10000):
+        ids.append(concept_id)
+        vectors.append(np.asarray(vector, dtype=np.float32))
+    if not vectors:
+        return [], np.zeros((0, 0), dtype=np.float32)
+    return ids, np.vstack(vectors)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _rank_pairs(
+    best: Dict[Tuple[str, str], float], max_pairs: Optional[int]
+) -> List[ConceptPair]:
+    ranked = sorted(best.items(), key=lambda item: (-item[1], item[0]))
+    if max_pairs is not None:
+        ranked = ranked[:max_pairs]
+    return [
+        ConceptPair(concept_a_id=a, concept_b_id=b, score=score, method="vector")
+        for (a, b), score in ranked
+    ]
+
+
+def vector_candidate_pairs(
+    ids: Sequence[str],
+    vectors: np.ndarray,
+    k: int = 10,
+    query_ids: Optional[Iterable[str]] = None,
+    min_similarity: Optional[float] = None,
+    max_pairs: Optional[int] = None,
+    exclude: Optional[Set[Tuple[str, str]]] = None,
+    max_chunk_bytes: int = 64 * 1024 * 1024,
+) -> List[ConceptPair]:
+    """
+    Propose concept pairs where one concept is among the k nearest neighbors of the other.
+
+    The similarity matrix is computed chunk by chunk, so memory stays bounded by
+    `max_chunk_bytes` instead of growing with n^2.
+
+    Parameters:
+    - ids: Concept ids, one per row of `vectors`
+    - vectors: Concept vectors, shape (n, dim)
+    - k: Neighbors kept per concept
+    - query_ids: Only search neighbors of these concepts (all if None)
+    - min_similarity: Drop pairs below this cosine similarity
+    - max_pairs: Keep only the most similar pairs
+    - exclude: Pair keys (see pair_key) to leave out
+
+    Returns:
+    - Pairs ordered by descending cosine similarity
+    """
+    n = len(ids)
+    if n < 2 or k <= 0:
+        return []
+    exclude = exclude or set()
+    k = min(k, n - 1)
+
+    matrix = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+    if query_ids is None:
+        rows = np.arange(n)
+    else:
+        position = {concept_id: i for i, concept_id in enumerate(ids)}
+        rows = np.array(
+            [position[concept_id] for concept_id in query_ids if concept_id in position],
+            dtype=np.int64,
+        )
+
+    chunk_size = max(1, max_chunk_bytes // (n * 4))
+    best: Dict[Tuple[str, str], float] = {}
+    for start in range(0, len(rows), chunk_size):
+        chunk_rows = rows[start : start + chunk_size]
+        similarities = matrix[chunk_rows] @ matrix.T
+        # a concept is not its own neighbor
+        similarities[np.arange(len(chunk_rows)), chunk_rows] = -np.inf
+
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(similarities, top, axis=1)
+        for row, neighbors, scores in zip(chunk_rows, top, top_scores):
+            for neighbor, score in zip(neighbors, scores):
+                if min_similarity is not None and score < min_similarity:
+                    continue
+                key = pair_key(ids[row], ids[neighbor])
+                if key in exclude:
+                    continue
+                if score > best.get(key, -np.inf):
+                    best[key] = float(score)
+
+    return _rank_pairs(best, max_pairs)
+
+
+def tidb_vector_candidate_pairs(
+    db: Session,
+    concept_ids: Optional[Iterable[str]],
+    k: int = 10,
+    min_similarity: Optional[float] = None,
+    max_pairs: Optional[int] = None,
+    exclude: Optional[Set[Tuple[str, str]]] = None,
+) -> List[ConceptPair]:
+    """
+    Same as vector_candidate_pairs, but lets TiDB find the nearest neighbors,
+    which uses the vector index on concepts.definition_vec when there is one.
+    The query vectors are loaded in one query; `concept_ids` None means all
+    concepts with a vector.
+    """
+    exclude = exclude or set()
+    query = db.query(Concept.id, Concept.definition_vec).filter(
+        Concept.definition_vec.isnot(None)
+    )
+    if concept_ids is not None:
+        query = query.filter(Concept.id.in_(list(concept_ids)))
+    query_vectors = query.all()
+
+    best: Dict[Tuple[str, str], float] = {}
+    for concept_id, vector in query_vectors:
+        # one extra neighbor, the concept finds itself
+        neighbors = vector_search(
+            db, Concept.definition_vec, vector, k + 1, columns=[Concept.id]
+        )
+        for neighbor_id, neighbor_distance in neighbors:
+            if neighbor_id == concept_id:
+                continue
+            score = 1.0 - float(neighbor_distance)
+            if min_similarity is not None and score < min_similarity:
+                continue
+            key = pair_key(concept_id, neighbor_id)
+            if key in exclude:
+                continue
+            if score > best.get(key, float("-inf")):
+                best[key] = score
+
+    return _rank_pairs(best, max_pairs)
+
+
+def merge_candidates(
+    *candidate_lists: List[ConceptPair], max_pairs: Optional[int] = None
+) -> List[ConceptPair]:
+    """
+    Interleave ranked candidate lists from different strategies, dropping
+    pairs already proposed by an earlier list.
+    """
+    merged = []
+    seen = set()
+    for rank in range(max((len(pairs) for pairs in candidate_lists), default=0)):
+        for pairs in candidate_lists:
+            if rank >= len(pairs) or pairs[rank].key in seen:
+                continue
+            seen.add(pairs[rank].key)
+            merged.append(pairs[rank])
+            if max_pairs is not None and len(merged) >= max_pairs:
+                return merged
+    return merged
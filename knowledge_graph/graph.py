@@ -1,16 +1,42 @@
 import json
-from typing import Dict, List, Optional, Any, Union, Tuple, Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Any, Union, Tuple, Callable, Iterable
 from pathlib import Path
-from math import ceil
 
 
-from graph.models import Concept, KnowledgeBlock, SourceData, Relationship
-from graph.prompt import PromptHub
-from graph.utils import gen_situate_context
-from utils.json_utils import extract_json_array
-from utils.token import calculate_tokens
+from knowledge_graph.models import (
+    Concept,
+    KnowledgeBlock,
+    SourceData,
+    Relationship,
+    STANDARD_RELATION_TYPES,
+)
+from knowledge_graph.prompts.hub import PromptHub
+from knowledge_graph.utils import gen_situate_context
+from knowledge_graph.bulk import bulk_insert
+from knowledge_graph.migration import write_migration_vectors
+from knowledge_graph.snapshot import GraphSnapshot
+from knowledge_graph.candidates import (
+    BlockKey,
+    ConceptPair,
+    CooccurrenceIndex,
+    load_concept_vectors,
+    merge_candidates,
+    pair_key,
+    tidb_vector_candidate_pairs,
+    vector_candidate_pairs,
+)
+from utils.json_utils import extract_json, extract_json_array
+from utils.token import count_tokens_batch, estimate_tokens
 from setting.db import SessionLocal
+from setting.embedding import DEFAULT_EMBEDDING_MODEL, get_embedding_spec
 from llm.factory import LLMInterface
+from llm.retry import RetryPolicy
+
+# retry of a concept extraction batch, on top of the provider's own retries
+CONCEPT_EXTRACTION_RETRY = RetryPolicy(
+    max_retries=1, base_delay=60.0, deadline=None, retry_unknown=True
+)
 
 
 class DocBuilder:
@@ -22,20 +48,68 @@ class DocBuilder:
         self,
         llm_client: LLMInterface,
         embedding_func: Callable,
+        batch_embedding_func: Optional[Callable] = None,
+        graph: Optional[GraphSnapshot] = None,
+        embedding_model: str = DEFAULT_EMBEDDING_MODEL,
     ):
         """
         Initialize the builder with a graph instance and specifications.
+
+        Parameters:
+        - llm_client: LLM used for extraction
+        - embedding_func: Embeds a single text
+        - batch_embedding_func: Optional, embeds a list of texts in one call
+        - graph: Optional snapshot to read the concept co-occurrences from,
+          instead of scanning the relationships table
+        - embedding_model: Model behind embedding_func and batch_embedding_func;
+          columns registered with another model are embedded with their own
         """
+        self.graph = graph
+        self.embedding_model = embedding_model
         self.embedding_func = embedding_func
+        self.batch_embedding_func = batch_embedding_func
         self.llm_client = llm_client
         self.prompt_hub = PromptHub()
 
-    def analyze_concepts(self, concept_file: Optional[str] = None) -> List[Concept]:
+    def _embed_texts(
+        self, texts: List[str], key: Optional[str] = None
+    ) -> List[List[float]]:
+        """
+        Embed texts in bulk, falling back to one call per text, and fit the
+        vectors to the registered spec of the column `key` they are stored in.
+        A column registered with another model than the builder's is embedded
+        with that model, so its vectors stay in one embedding space.
+        """
+        if not texts:
+            return []
+        spec = get_embedding_spec(key) if key is not None else None
+        if spec is not None and spec.model != self.embedding_model:
+            from llm.embedding import get_column_embedding_funcs
+
+            return get_column_embedding_funcs(key)[1](texts)
+        if self.batch_embedding_func is not None:
+            vectors = self.batch_embedding_func(texts)
+        else:
+            vectors = [self.embedding_func(text) for text in texts]
+        if spec is not None:
+            vectors = spec.prepare(vectors)
+        return vectors
+
+    def _write_migration_vectors(self, db, key: str, rows: List[Any]):
+        """Also fill the column of a registered re-embedding migration of `key`."""
+        write_migration_vectors(
+            db, key, rows, self.embedding_model, self.batch_embedding_func
+        )
+
+    def analyze_concepts(
+        self, concept_file: Optional[str] = None, topic: Optional[str] = None
+    ) -> List[Concept]:
         """
         Identify core concepts within the knowledge blocks.
 
         Parameters:
         - concept_file: Optional path to file with predefined concepts
+        - topic: Optional topic the extracted concepts should be about
 
         Returns:
         - List of discovered or defined concepts
@@ -52,18 +126,29 @@ class DocBuilder:
                 with open(concept_file, "r") as f:
                     predefined_concepts = json.load(f)
 
+                definition_vecs = self._embed_texts(
+                    [
+                        concept_data.get("definition", "")
+                        for concept_data in predefined_concepts
+                    ],
+                    "concepts.definition_vec",
+                )
+                new_concepts = [
+                    Concept(
+                        name=concept_data.get("name", ""),
+                        definition=concept_data.get("definition", ""),
+                        definition_vec=definition_vec,
+                        version=concept_data.get("version", "1.0"),
+                    )
+                    for concept_data, definition_vec in zip(
+                        predefined_concepts, definition_vecs
+                    )
+                ]
                 with SessionLocal() as db:
-                    for concept_data in predefined_concepts:
-                        concept = Concept(
-                            name=concept_data.get("name", ""),
-                            definition=concept_data.get("definition", ""),
-                            definition_vec=self.embedding_func(
-                                concept_data.get("definition", "")
-                            ),
-                            version=concept_data.get("version", "1.0"),
-                        )
-                        db.add(concept)
-
+                    bulk_insert(db, Concept, new_concepts)
+                    self._write_migration_vectors(
+                        db, "concepts.definition_vec", new_concepts
+                    )
                     db.commit()
 
                 return predefined_concepts
@@ -79,22 +164,22 @@ class DocBuilder:
                 return []
 
             # split knowledges block into batches that have 10000 tokens
-            total_tokens = 0
-            for i, kb in enumerate(knowledge_blocks):
-                tokens = calculate_tokens(kb.content)
-                total_tokens += tokens
-
+            block_tokens = count_tokens_batch(
+                [kb.content for kb in knowledge_blocks], model=self.llm_client.model
+            )
             knowledge_blocks_batches = []
-            index = 0
-            batch_size = ceil(total_tokens / (ceil(total_tokens / 10000)))
-            for kb in knowledge_blocks:
-                if total_tokens > batch_size:
-                    knowledge_blocks_batches.append(knowledge_blocks[index : i + 1])
-                    index = i + 1
-                    total_tokens = 0
-
-            if index < len(knowledge_blocks):
-                knowledge_blocks_batches.append(knowledge_blocks[index:])
+            current_batch = []
+            current_tokens = 0
+            for kb, tokens in zip(knowledge_blocks, block_tokens):
+                if current_batch and current_tokens + tokens > 10000:
+                    knowledge_blocks_batches.append(current_batch)
+                    current_batch = []
+                    current_tokens = 0
+                current_batch.append(kb)
+                current_tokens += tokens
+
+            if current_batch:
+                knowledge_blocks_batches.append(current_batch)
 
             print(f"Splitted {len(knowledge_blocks_batches)} batches")
 
@@ -109,41 +194,50 @@ class DocBuilder:
                     continue
 
                 # Extract concepts using LLM
-                prompt_format = self.graph_spec.get_extraction_prompt(
-                    "concept_extraction"
+                prompt = self.prompt_hub.get_prompt("concept_extraction").format(
+                    text=combined_blocks,
+                    topic=topic or "all topics covered by the context",
+                )
+                # the provider paces and retries transient errors; one more paused
+                # attempt covers whatever it gave up on, so a single failure
+                # doesn't abort the whole analysis
+                response = CONCEPT_EXTRACTION_RETRY.call(
+                    self.llm_client.generate, prompt
                 )
-                prompt = prompt_format.format(text=combined_blocks)
-                try:
-                    response = self.llm_client.generate(prompt)
-                except Exception as e:
-                    print(
-                        f"Failed to extract concepts from {combined_blocks}, error: {e}"
-                    )
-                    import time
-
-                    time.sleep(60)
-                    response = self.llm_client.generate(prompt)
 
                 try:
                     response_json_str = extract_json_array(response)
                     # Parse JSON response
                     extracted_concepts = json.loads(response_json_str)
 
-                    # Create and add concepts
-                    for concept_data in extracted_concepts:
-                        concept = Concept(
-                            name=concept_data.get("name", ""),
-                            definition=concept_data.get("definition", ""),
-                            definition_vec=self.embedding_func(
-                                concept_data.get("definition", "")
-                            ),
-                            version="1.0",
-                        )
-                        db.add(concept)
                     concepts.append(extracted_concepts)
                     print(f"Extracted {len(extracted_concepts)} concepts")
                 except (json.JSONDecodeError, TypeError):
                     print("Failed to parse concepts from LLM response")
+
+            # Create and add concepts, embedding all definitions in one call
+            all_concept_data = [
+                concept_data
+                for extracted_concepts in concepts
+                for concept_data in extracted_concepts
+            ]
+            definition_vecs = self._embed_texts(
+                [concept_data.get("definition", "") for concept_data in all_concept_data],
+                "concepts.definition_vec",
+            )
+            new_concepts = [
+                Concept(
+                    name=concept_data.get("name", ""),
+                    definition=concept_data.get("definition", ""),
+                    definition_vec=definition_vec,
+                    version="1.0",
+                )
+                for concept_data, definition_vec in zip(
+                    all_concept_data, definition_vecs
+                )
+            ]
+            bulk_insert(db, Concept, new_concepts)
+            self._write_migration_vectors(db, "concepts.definition_vec", new_concepts)
             db.commit()
 
         return concepts
@@ -152,186 +246,406 @@ class DocBuilder:
         self,
         source_concept: Optional[Concept] = None,
         target_concept: Optional[Concept] = None,
-    ):
+        max_pairs: Optional[int] = 100,
+        max_workers: int = 8,
+        min_confidence: float = 0.5,
+        max_context_tokens: int = 8000,
+        candidate_strategy: str = "cooccurrence",
+        vector_k: int = 10,
+        vector_backend: str = "numpy",
+        min_similarity: Optional[float] = None,
+    ) -> List[Relationship]:
         """
         Discover and create relationships between concepts.
 
         Parameters:
         - source_concept: Optional concept to use as relationship source
         - target_concept: Optional concept to use as relationship target
+        - max_pairs: Budget of candidate pairs sent to the LLM (None for all)
+        - max_workers: Concurrent LLM judgments
+        - min_confidence: Relationships judged below this confidence are dropped
+        - max_context_tokens: Budget for the shared block content of one prompt
+        - candidate_strategy: How candidate pairs are proposed, "cooccurrence"
+          (concepts sharing blocks), "vector" (nearest definition vectors) or
+          "hybrid" (both, interleaved)
+        - vector_k: Nearest neighbors considered per concept by the vector strategy
+        - vector_backend: "numpy" (in-memory chunked search) or "tidb" (the
+          database's vector index)
+        - min_similarity: Minimum cosine similarity of vector candidates
 
         Returns:
-        - Enhanced knowledge graph with relationships
+        - The created relationships
 
         Notes:
+        - Co-occurrence candidates come from a block -> concepts inverted index
+          built once per run, ranked by how many blocks the two concepts share
+        - Vector candidates are the top-k cosine neighbors of each concept, so
+          the LLM judges O(n*k) pairs instead of O(n^2)
         - When parameters are None, discovers relationships among all concepts
         - When specified, focuses on relationships involving those concepts
+        - Pairs that are already related are skipped
         """
+        with SessionLocal() as db:
+            if self.graph is not None:
+                index = CooccurrenceIndex.from_snapshot(self.graph)
+            else:
+                index = CooccurrenceIndex.from_db(db)
+            related_pairs = {
+                pair_key(source_id, target_id)
+                for source_id, target_id in db.query(
+                    Relationship.source_id, Relationship.target_id
+                ).filter(
+                    Relationship.source_type == "Concept",
+                    Relationship.target_type == "Concept",
+                )
+            }
+
+            if source_concept and target_concept:
+                # Analyze specific pair
+                pair = ConceptPair(
+                    concept_a_id=source_concept.id,
+                    concept_b_id=target_concept.id,
+                    score=0.0,
+                )
+                self._attach_blocks(index, pair)
+                pair.score = float(len(pair.shared_blocks))
+                pairs = [pair]
+            elif source_concept or target_concept:
+                # Analyze relationships between the given concept and its candidates
+                focus = source_concept or target_concept
+                pairs = self._candidate_pairs(
+                    db,
+                    index,
+                    [focus.id],
+                    candidate_strategy,
+                    max_pairs,
+                    related_pairs,
+                    vector_k,
+                    vector_backend,
+                    min_similarity,
+                )
+                for pair in pairs:
+                    other_id = (
+                        pair.concept_b_id
+                        if pair.concept_a_id == focus.id
+                        else pair.concept_a_id
+                    )
+                    if source_concept:
+                        pair.concept_a_id, pair.concept_b_id = focus.id, other_id
+                    else:
+                        pair.concept_a_id, pair.concept_b_id = other_id, focus.id
+            else:
+                pairs = self._candidate_pairs(
+                    db,
+                    index,
+                    None,
+                    candidate_strategy,
+                    max_pairs,
+                    related_pairs,
+                    vector_k,
+                    vector_backend,
+                    min_similarity,
+                )
 
-        # Determine which concepts to analyze
-        all_concepts = list(self.graph.concepts.values())
-
-        if source_concept and target_concept:
-            # Analyze specific pair
-            self._analyze_concept_pair(source_concept, target_concept)
+            pairs = [
+                pair
+                for pair in pairs
+                if pair.shared_blocks or any(pair.concept_blocks.values())
+            ]
+            if not pairs:
+                print("No candidate concept pairs with knowledge to judge them on")
+                return []
+            print(f"Analyzing {len(pairs)} candidate concept pairs")
+
+            concept_ids = {pair.concept_a_id for pair in pairs} | {
+                pair.concept_b_id for pair in pairs
+            }
+            concepts = {
+                concept.id: concept
+                for concept in db.query(
+                    Concept.id, Concept.name, Concept.definition
+                ).filter(Concept.id.in_(concept_ids))
+            }
+            block_texts = self._load_block_texts(
+                db,
+                {
+                    block
+                    for pair in pairs
+                    for blocks in (pair.shared_blocks, *pair.concept_blocks.values())
+                    for block in blocks
+                },
+            )
 
-        elif source_concept:
-            # Analyze relationships between source and all other concepts
-            for other_concept in all_concepts:
-                if other_concept.id != source_concept.id:
-                    self._analyze_concept_pair(source_concept, other_concept)
+        relationships = []
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = {
+                executor.submit(
+                    self._analyze_concept_pair,
+                    concepts[pair.concept_a_id],
+                    concepts[pair.concept_b_id],
+                    pair,
+                    block_texts,
+                    min_confidence,
+                    max_context_tokens,
+                ): pair
+                for pair in pairs
+                if pair.concept_a_id in concepts and pair.concept_b_id in concepts
+            }
+            for future in as_completed(futures):
+                pair = futures[future]
+                try:
+                    relationship = future.result()
+                except Exception as e:
+                    print(
+                        f"Failed to analyze concept pair {pair.concept_a_id} - {pair.concept_b_id}: {e}"
+                    )
+                    continue
+                if relationship is not None:
+                    relationships.append(relationship)
+
+        if relationships:
+            # Embed all relationship descriptions in one call
+            described_rels = [rel for rel in relationships if rel.relationship_desc]
+            desc_vecs = self._embed_texts(
+                [rel.relationship_desc for rel in described_rels],
+                "relationships.relationship_desc_vec",
+            )
+            for rel, desc_vec in zip(described_rels, desc_vecs):
+                rel.relationship_desc_vec = desc_vec
 
-        elif target_concept:
-            # Analyze relationships between target and all other concepts
-            for other_concept in all_concepts:
-                if other_concept.id != target_concept.id:
-                    self._analyze_concept_pair(other_concept, target_concept)
+            with SessionLocal() as db:
+                bulk_insert(db, Relationship, relationships)
+                self._write_migration_vectors(
+                    db, "relationships.relationship_desc_vec", relationships
+                )
+                db.commit()
 
-        else:
-            # Analyze all pairs of concepts (up to a reasonable limit)
-            max_pairs = min(len(all_concepts) * (len(all_concepts) - 1) // 2, 20)
-            pairs_analyzed = 0
+        print(
+            f"Created {len(relationships)} concept-to-concept relationships based on shared knowledge"
+        )
+        return relationships
 
-            for i, concept_a in enumerate(all_concepts):
-                for concept_b in all_concepts[i + 1 :]:
-                    if pairs_analyzed >= max_pairs:
-                        break
+    def _candidate_pairs(
+        self,
+        db,
+        index: CooccurrenceIndex,
+        concept_ids: Optional[List[str]],
+        strategy: str,
+        max_pairs: Optional[int],
+        exclude: set,
+        vector_k: int,
+        vector_backend: str,
+        min_similarity: Optional[float],
+    ) -> List[ConceptPair]:
+        """Propose ranked candidate pairs with the given strategy."""
+        if strategy not in ("cooccurrence", "vector", "hybrid"):
+            raise ValueError(f"Unknown candidate strategy: {strategy}")
+
+        cooccurrence_pairs = []
+        if strategy in ("cooccurrence", "hybrid"):
+            cooccurrence_pairs = index.candidate_pairs(
+                concept_ids, max_pairs=max_pairs, exclude=exclude
+            )
 
-                    self._analyze_concept_pair(concept_a, concept_b)
-                    pairs_analyzed += 1
+        vector_pairs = []
+        if strategy in ("vector", "hybrid"):
+            if vector_backend == "tidb":
+                vector_pairs = tidb_vector_candidate_pairs(
+                    db,
+                    concept_ids,
+                    k=vector_k,
+                    min_similarity=min_similarity,
+                    max_pairs=max_pairs,
+                    exclude=exclude,
+                )
+            elif vector_backend == "numpy":
+                ids, vectors = load_concept_vectors(db)
+                vector_pairs = vector_candidate_pairs(
+                    ids,
+                    vectors,
+                    k=vector_k,
+                    query_ids=concept_ids,
+                    min_similarity=min_similarity,
+                    max_pairs=max_pairs,
+                    exclude=exclude,
+                )
+            else:
+                raise ValueError(f"Unknown vector backend: {vector_backend}")
 
-                if pairs_analyzed >= max_pairs:
-                    break
+            for pair in vector_pairs:
+                self._attach_blocks(index, pair)
 
-        return self.graph
+        return merge_candidates(cooccurrence_pairs, vector_pairs, max_pairs=max_pairs)
 
-    def _analyze_concept_pair(self, concept_a: Concept, concept_b: Concept) -> None:
+    @staticmethod
+    def _attach_blocks(
+        index: CooccurrenceIndex, pair: ConceptPair, blocks_per_concept: int = 2
+    ):
         """
-        Analyze the relationship between two concepts and add any discovered relationships.
-
-        Parameters:
-        - concept_a: First concept
-        - concept_b: Second concept
+        Set the blocks a pair is judged on: the blocks both concepts share, or
+        for close concepts that never share one, a few blocks of each concept.
         """
-
-        # Create a mapping from concept to its subconcepts
-        concept_to_subconcepts = {}
-        for subconcept_id, subconcept in self.graph.subconcepts.items():
-            parent_concept_id = subconcept.parent_concept_id
-            if parent_concept_id:
-                if parent_concept_id not in concept_to_subconcepts:
-                    concept_to_subconcepts[parent_concept_id] = []
-                concept_to_subconcepts[parent_concept_id].append(subconcept_id)
-
-        # Create a mapping from subconcept to knowledge blocks
-        subconcept_to_blocks = {}
-        for subconcept_id, subconcept in self.graph.subconcepts.items():
-            knowledge_block_ids = subconcept.knowledge_block_ids
-            if knowledge_block_ids:
-                subconcept_to_blocks[subconcept_id] = knowledge_block_ids
-
-        # Skip if either concept has no subconcepts
-        if (concept_a.id not in concept_to_subconcepts) or (
-            concept_b.id not in concept_to_subconcepts
-        ):
+        pair.shared_blocks = index.shared_blocks(pair.concept_a_id, pair.concept_b_id)
+        if pair.shared_blocks:
+            pair.concept_blocks = {}
             return
-
-        # Get knowledge blocks for each concept through its subconcepts
-        blocks_for_concept_a = set()
-        for subconcept_id in concept_to_subconcepts[concept_a.id]:
-            if subconcept_id in subconcept_to_blocks:
-                blocks_for_concept_a.update(subconcept_to_blocks[subconcept_id])
-
-        blocks_for_concept_b = set()
-        for subconcept_id in concept_to_subconcepts[concept_b.id]:
-            if subconcept_id in subconcept_to_blocks:
-                blocks_for_concept_b.update(subconcept_to_blocks[subconcept_id])
-
-        # Find shared knowledge blocks
-        shared_blocks = blocks_for_concept_a.intersection(blocks_for_concept_b)
-        if not shared_blocks:
-            return
-
-        # Collect knowledge block content for analysis
-        shared_blocks_content = []
-        for block_id in shared_blocks:
-            kb = self.graph.get_knowledge_block(block_id)
-            if kb:
-                shared_blocks_content.append(
-                    f"Block {kb.id}, name: {kb.name}\nContent: {kb.definition}"
+        pair.concept_blocks = {
+            concept_id: sorted(index.concept_blocks.get(concept_id, ()))[
+                :blocks_per_concept
+            ]
+            for concept_id in (pair.concept_a_id, pair.concept_b_id)
+        }
+
+    def _load_block_texts(
+        self, db, block_keys: Iterable[BlockKey]
+    ) -> Dict[BlockKey, str]:
+        """Fetch the prompt text of knowledge blocks and source documents in two queries."""
+        ids_by_type: Dict[str, List[str]] = {}
+        for block_type, block_id in block_keys:
+            ids_by_type.setdefault(block_type, []).append(block_id)
+
+        block_texts = {}
+        if ids_by_type.get("KnowledgeBlock"):
+            for kb in db.query(
+                KnowledgeBlock.id, KnowledgeBlock.name, KnowledgeBlock.content
+            ).filter(KnowledgeBlock.id.in_(ids_by_type["KnowledgeBlock"])):
+                block_texts[("KnowledgeBlock", kb.id)] = (
+                    f"Block {kb.id}, name: {kb.name}\nContent: {kb.content}"
                 )
+        if ids_by_type.get("SourceData"):
+            for source in db.query(
+                SourceData.id, SourceData.name, SourceData.content
+            ).filter(SourceData.id.in_(ids_by_type["SourceData"])):
+                block_texts[("SourceData", source.id)] = (
+                    f"Document {source.id}, name: {source.name}\nContent: {source.content}"
+                )
+        return block_texts
+
+    @staticmethod
+    def _budget_block_texts(
+        blocks: List[BlockKey], block_texts: Dict[BlockKey, str], budget: int
+    ) -> Tuple[List[str], List[BlockKey]]:
+        """Texts of the blocks, in order, within the token budget (at least one)."""
+        texts = []
+        used_blocks = []
+        for block in blocks:
+            text = block_texts.get(block)
+            if not text:
+                continue
+            tokens = estimate_tokens(text)
+            if texts and tokens > budget:
+                break
+            texts.append(text)
+            used_blocks.append(block)
+            budget -= tokens
+        return texts, used_blocks
+
+    def _analyze_concept_pair(
+        self,
+        concept_a,
+        concept_b,
+        pair: ConceptPair,
+        block_texts: Dict[BlockKey, str],
+        min_confidence: float = 0.5,
+        max_context_tokens: int = 8000,
+    ) -> Optional[Relationship]:
+        """
+        Ask the LLM how two concepts relate, given the blocks they share, or
+        for a pair sharing no block, given the blocks of each concept under a
+        prompt that says they were not seen together.
+
+        Parameters:
+        - concept_a: First concept (anything with id, name and definition)
+        - concept_b: Second concept
+        - pair: The candidate pair, with its shared blocks or concept blocks
+        - block_texts: Prompt text of each block
+        - min_confidence: Minimum confidence to accept the relationship
+        - max_context_tokens: Budget for the block content
 
-        # Analyze relationship using LLM if shared blocks are found
-        if shared_blocks_content:
-            shared_blocks_text = "\n\n".join(shared_blocks_content)
-
-            # Get available relation types
-            relation_types = ", ".join(self.graph_spec.get_relation_types())
-
-            # Extract relationship using LLM
-            prompt_format = self.graph_spec.get_extraction_prompt("extend_relationship")
-            prompt = prompt_format.format(
-                concept_a_name=concept_a.name,
-                concept_a_definition=concept_a.definition,
-                concept_b_name=concept_b.name,
-                concept_b_definition=concept_b.definition,
-                relation_types=relation_types,
-                text=shared_blocks_text,
+        Returns:
+        - An unsaved Relationship, or None if no confident relationship was found
+        """
+        concept_fields = dict(
+            concept_a_name=concept_a.name,
+            concept_a_definition=concept_a.definition,
+            concept_b_name=concept_b.name,
+            concept_b_definition=concept_b.definition,
+            relation_types=", ".join(STANDARD_RELATION_TYPES),
+        )
+        if pair.shared_blocks:
+            shared_content, used_blocks = self._budget_block_texts(
+                pair.shared_blocks, block_texts, max_context_tokens
+            )
+            if not shared_content:
+                return None
+            prompt = self.prompt_hub.get_prompt("extend_relationship").format(
+                text="\n\n".join(shared_content), **concept_fields
             )
+        else:
+            # half of the budget for the knowledge of each concept
+            a_content, a_blocks = self._budget_block_texts(
+                pair.concept_blocks.get(concept_a.id, []),
+                block_texts,
+                max_context_tokens // 2,
+            )
+            b_content, b_blocks = self._budget_block_texts(
+                pair.concept_blocks.get(concept_b.id, []),
+                block_texts,
+                max_context_tokens // 2,
+            )
+            if not a_content and not b_content:
+                return None
+            used_blocks = a_blocks + [
+                block for block in b_blocks if block not in a_blocks
+            ]
+            prompt = self.prompt_hub.get_prompt("relate_similar_concepts").format(
+                concept_a_text="\n\n".join(a_content) or "(none)",
+                concept_b_text="\n\n".join(b_content) or "(none)",
+                **concept_fields,
+            )
+        response = self.llm_client.generate(prompt)
 
-            response = self.llm_client.complete(prompt=prompt)
+        try:
+            extracted_relationship = json.loads(extract_json(response))
+        except (ValueError, TypeError):
+            print(
+                f"Failed to parse relationship between {concept_a.name} and {concept_b.name}"
+            )
+            return None
 
-            try:
-                response_json_str = extract_json_array(response)
-                # Parse JSON response
-                extracted_relationship = json.loads(response_json_str)
-
-                # Only add if relationship is found
-                if extracted_relationship and "relation_type" in extracted_relationship:
-                    relation_type = extracted_relationship.get("relation_type")
-                    description = extracted_relationship.get("description", "")
-                    confidence = extracted_relationship.get("confidence", 0.0)
-
-                    # Check confidence threshold
-                    min_confidence = self.graph_spec.get_processing_parameter(
-                        "relationship_discovery", "min_confidence"
-                    )
+        # Only add if relationship is found
+        if (
+            not isinstance(extracted_relationship, dict)
+            or "relation_type" not in extracted_relationship
+        ):
+            return None
 
-                    if confidence >= min_confidence:
-                        # Add new relation type to config if it doesn't exist
-                        relation_types_list = self.graph_spec.get_relation_types()
-                        if relation_type not in relation_types_list:
-                            self.graph_spec.add_relation_type(
-                                relation_type,
-                                f"Auto-discovered relationship: {description}",
-                            )
-
-                        relationship = Relationship(
-                            source_id=concept_a.id,
-                            source_type="concept",
-                            target_id=concept_b.id,
-                            target_type="concept",
-                            relation_type=relation_type,
-                            attributes={
-                                "description": description,
-                                "confidence": confidence,
-                                "knowledge_block_ids": list(shared_blocks),
-                            },
-                        )
-
-                        # Add relationship to graph
-                        self.graph.add_relationship(relationship)
-                        relationship_count += 1
-                        print(
-                            f"Added relationship between '{concept_a.name}' and '{concept_b.name}': {relation_type}"
-                        )
-
-            except (json.JSONDecodeError, TypeError):
-                print(
-                    f"Failed to parse relationship between {concept_a.name} and {concept_b.name}"
-                )
+        try:
+            confidence = float(extracted_relationship.get("confidence", 0.0))
+        except (TypeError, ValueError):
+            confidence = 0.0
+        if confidence < min_confidence:
+            return None
 
+        relation_type = extracted_relationship.get("relation_type")
         print(
-            f"Created {relationship_count} concept-to-concept relationships based on shared knowledge"
+            f"Added relationship between '{concept_a.name}' and '{concept_b.name}': {relation_type}"
+        )
+        return Relationship(
+            source_id=concept_a.id,
+            source_type="Concept",
+            target_id=concept_b.id,
+            target_type="Concept",
+            relationship_type=relation_type,
+            relationship_desc=extracted_relationship.get("description", ""),
+            knowledge_bundle=[
+                {"id": block_id, "type": block_type}
+                for block_type, block_id in used_blocks
+            ],
+            attributes={
+                "confidence": confidence,
+                "candidate_method": pair.method,
+                "candidate_score": pair.score,
+                "shared_context": bool(pair.shared_blocks),
+            },
         )
-        return self.graph
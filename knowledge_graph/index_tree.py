@@ -0,0 +1,86 @@
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Union
+
+from knowledge_graph.parser.base import FileData, Index, IndexLeaf, LEAF_KINDS
+
+
+def _roots(indexes: Union[Index, Iterable[Index], None]) -> List[Index]:
+    if indexes is None:
+        return []
+    if isinstance(indexes, Index):
+        return [indexes]
+    return list(indexes)
+
+
+def walk_index_leaves(
+    indexes: Union[Index, Iterable[Index], None]
+) -> Iterator[IndexLeaf]:
+    """
+    Yield the Reference/Definition/Annotation nodes of index trees, in
+    document order.
+
+    The walk uses an explicit stack and shares path tuples between siblings,
+    so it neither recurses nor copies the path per node.
+
+    Parameters:
+    - indexes: Top-level index nodes, e.g. FileData.indexes
+
+    Returns:
+    - Generator of IndexLeaf; its path holds the names of the nodes above the
+      leaf, starting with the top-level index
+
+    Raises:
+    - ValueError: If a value of a leaf has children of its own
+    """
+    # (node, names of the nodes above it), popped in preorder
+    stack: List[Tuple[Index, Tuple[str, ...]]] = [
+        (root, ()) for root in reversed(_roots(indexes))
+    ]
+    while stack:
+        node, path = stack.pop()
+        kind = LEAF_KINDS.get(node.name)
+        if kind is not None:
+            for child in node.children:
+                if child.children:
+                    raise ValueError(
+                        "Reference node should be the leaf node without any children"
+                    )
+            yield IndexLeaf(
+                path=path,
+                kind=kind,
+                values=tuple(child.name for child in node.children),
+            )
+            continue
+
+        child_path = path + (node.name,)  # shared by all children
+        stack.extend((child, child_path) for child in reversed(node.children))
+
+
+def index_leaves(fd: FileData) -> List[IndexLeaf]:
+    """Leaves of a parsed document, as collected by its parser if it did."""
+    if fd.leaves is not None:
+        return fd.leaves
+    return list(walk_index_leaves(fd.indexes))
+
+
+def index_tree_dict(indexes: Union[Index, Iterable[Index], None]) -> Dict[str, Any]:
+    """
+    Nested {name: children} dict of index trees, e.g. to show the index to an
+    LLM. Leaf nodes map to the list of their values, other nodes without
+    children to an empty dict.
+
+    Parameters:
+    - indexes: Top-level index nodes, e.g. FileData.indexes
+
+    Returns:
+    - Dict keyed by the top-level index names
+    """
+    tree: Dict[str, Any] = {}
+    stack = [(root, tree) for root in reversed(_roots(indexes))]
+    while stack:
+        node, parent = stack.pop()
+        if node.name in LEAF_KINDS:
+            parent[node.name] = [child.name for child in node.children]
+            continue
+        children = parent.setdefault(node.name, {})
+        stack.extend((child, children) for child in reversed(node.children))
+    return tree
@@ -0,0 +1,416 @@
+import json
+import queue
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from loguru import logger
+from sqlalchemy import func
+
+from knowledge_graph.knowledge import KnowledgeBuilder, MAX_BLOCK_TOKENS
+from knowledge_graph.models import IngestionLedger, INGESTION_STAGES
+from knowledge_graph.parser import Block, FileData, parse_documents
+from setting.db import SessionLocal
+
+# end-of-stream marker passed between pipeline stages
+_DONE = object()
+
+
+def blocks_hash(blocks: List[Block]) -> str:
+    """Fingerprint of a parsed document, used to validate a ledger checkpoint."""
+    digest = hashlib.sha256()
+    for block in blocks:
+        digest.update(block.name.encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(block.content.encode("utf-8"))
+        digest.update(b"\x01")
+    return digest.hexdigest()
+
+
+@dataclass
+class DocumentTask:
+    """A document travelling through the pipeline, with its completed stage outputs."""
+
+    path: str
+    attributes: Dict[str, Any]
+    ledger_id: str
+    stage: str = "pending"
+    payload: Dict[str, Any] = field(default_factory=dict)
+    doc_knowledge: Optional[FileData] = None
+    blocks: Optional[List[Block]] = None
+    section_context: Optional[Dict[str, str]] = None
+    content_vecs: Optional[List[List[float]]] = None
+    # blocks of the previous version, by content hash, reused when unchanged
+    stored: Optional[Dict[str, Any]] = None
+
+    @property
+    def doc_link(self) -> str:
+        return self.attributes.get("doc_link", self.path)
+
+    @property
+    def doc_version(self) -> str:
+        return str(self.attributes.get("doc_version", "1.0"))
+
+
+class IngestionRunner:
+    """
+    Resumable ingestion of documents into knowledge blocks.
+
+    Documents flow through parse -> contextualize -> embed -> persist stages
+    connected by bounded queues, so one document is being embedded while the
+    next is contextualized and a third is parsed. Every completed stage is
+    checkpointed in the `ingestion_ledger` table (stage outputs go into its
+    JSON payload), so a rerun of the same job skips persisted documents and
+    resumes the others from their last completed stage.
+    """
+
+    def __init__(
+        self,
+        builder: KnowledgeBuilder,
+        job_name: str = "default",
+        context_workers: int = 2,
+        embed_workers: int = 1,
+        queue_size: int = 4,
+        parse_workers: int = 0,
+    ):
+        """
+        Parameters:
+        - builder: KnowledgeBuilder whose stage methods do the work
+        - job_name: Ledger namespace, rerun with the same name to resume
+        - context_workers: Documents contextualized concurrently (each one
+          already sends builder.context_workers requests in parallel)
+        - embed_workers: Documents embedded concurrently
+        - queue_size: Capacity of the queues between stages, bounds how many
+          parsed documents are held in memory
+        - parse_workers: Processes parsing documents ahead of the pipeline
+          (see parser.parse_documents), 0 parses on the pipeline's parse thread
+        """
+        self.builder = builder
+        self.job_name = job_name
+        self.context_workers = context_workers
+        self.embed_workers = embed_workers
+        self.queue_size = queue_size
+        self.parse_workers = parse_workers
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, int] = {}
+
+    def _count(self, outcome: str):
+        with self._stats_lock:
+            self._stats[outcome] = self._stats.get(outcome, 0) + 1
+
+    # ---- ledger ----
+
+    def _claim(self, path: str, attributes: Dict[str, Any]) -> Optional[DocumentTask]:
+        """Load or create the ledger entry of a document, None if it is already persisted."""
+        doc_link = attributes.get("doc_link", path)
+        doc_version = str(attributes.get("doc_version", "1.0"))
+        with SessionLocal() as db:
+            entry = (
+                db.query(IngestionLedger)
+                .filter(
+                    IngestionLedger.job_name == self.job_name,
+                    IngestionLedger.doc_link == doc_link,
+                    IngestionLedger.doc_version == doc_version,
+                )
+                .first()
+            )
+            if entry is None:
+                entry = IngestionLedger(
+                    job_name=self.job_name,
+                    doc_link=doc_link,
+                    doc_version=doc_version,
+                    stage="pending",
+                    attempts=0,
+                )
+                db.add(entry)
+            elif entry.stage == "persisted":
+                return None
+
+            entry.status = "running"
+            entry.attempts = (entry.attempts or 0) + 1
+            db.commit()
+
+            return DocumentTask(
+                path=path,
+                attributes=attributes,
+                ledger_id=entry.id,
+                stage=entry.stage,
+                payload=json.loads(entry.payload) if entry.payload else {},
+            )
+
+    def _checkpoint(self, task: DocumentTask, stage: str):
+        task.stage = stage
+        with SessionLocal() as db:
+            db.query(IngestionLedger).filter(IngestionLedger.id == task.ledger_id).update(
+                {
+                    IngestionLedger.stage: stage,
+                    IngestionLedger.status: (
+                        "completed" if stage == "persisted" else "running"
+                    ),
+                    # the payload is only needed to resume, drop it once done
+                    IngestionLedger.payload: (
+                        None if stage == "persisted" else json.dumps(task.payload)
+                    ),
+                    IngestionLedger.error: None,
+                },
+                synchronize_session=False,
+            )
+            db.commit()
+
+    def _fail(self, task: DocumentTask, stage_name: str, error: Exception):
+        logger.opt(exception=error).error(
+            f"Ingestion of {task.path} failed in {stage_name} stage: {error}"
+        )
+        self._count("failed")
+        try:
+            with SessionLocal() as db:
+                db.query(IngestionLedger).filter(
+                    IngestionLedger.id == task.ledger_id
+                ).update(
+                    {
+                        IngestionLedger.status: "failed",
+                        IngestionLedger.error: f"{stage_name}: {type(error).__name__}: {error}",
+                    },
+                    synchronize_session=False,
+                )
+                db.commit()
+        except Exception as e:
+            # the ledger entry stays in its last stage and is retried next run
+            logger.opt(exception=e).error(
+                f"Failed to record the failure of {task.path} in the ledger: {e}"
+            )
+
+    def _completed(self, task: DocumentTask, stage: str) -> bool:
+        return INGESTION_STAGES.index(task.stage) >= INGESTION_STAGES.index(stage)
+
+    # ---- stages ----
+
+    def _parse(self, task: DocumentTask, **kwargs) -> Optional[DocumentTask]:
+        if task.doc_knowledge is not None:
+            # parsed by the process pool already
+            task.blocks = self.builder.prepare_blocks(task.doc_knowledge)
+        else:
+            task.doc_knowledge, task.blocks = self.builder.parse_document(
+                task.path, **kwargs
+            )
+
+        source_id = self.builder.find_source(task.doc_link, task.doc_version)
+        if source_id:
+            logger.info(f"Source data already exists for {task.path}, id: {source_id}")
+            self._checkpoint(task, "persisted")
+            self._count("skipped")
+            return None
+
+        task.stored = self.builder.load_stored_blocks(task.doc_link)
+
+        content_hash = blocks_hash(task.blocks)
+        if task.payload.get("content_hash") != content_hash:
+            # nothing checkpointed yet, or the document changed since: start over
+            task.payload = {"content_hash": content_hash}
+            self._checkpoint(task, "parsed")
+        else:
+            task.section_context = task.payload.get("contexts")
+            task.content_vecs = task.payload.get("vectors")
+            if task.stage != "parsed":
+                logger.info(f"Resuming {task.path} after {task.stage} stage")
+        return task
+
+    def _contextualize(self, task: DocumentTask) -> DocumentTask:
+        if not self._completed(task, "contextualized") or task.section_context is None:
+            task.section_context = self.builder.contextualize_blocks(
+                task.path, task.doc_knowledge.content, task.blocks, task.stored
+            )
+            task.payload["contexts"] = task.section_context
+            self._checkpoint(task, "contextualized")
+        return task
+
+    def _embed(self, task: DocumentTask) -> DocumentTask:
+        if not self._completed(task, "embedded") or task.content_vecs is None:
+            task.content_vecs = self.builder.embed_blocks(
+                task.blocks, task.section_context, task.stored
+            )
+            task.payload["vectors"] = [list(vec) for vec in task.content_vecs]
+            self._checkpoint(task, "embedded")
+        return task
+
+    def _persist(self, task: DocumentTask) -> None:
+        self.builder.persist_blocks(
+            task.path,
+            task.attributes,
+            task.doc_knowledge,
+            task.blocks,
+            task.section_context,
+            task.content_vecs,
+        )
+        self._checkpoint(task, "persisted")
+        self._count("persisted")
+        return None
+
+    # ---- pipeline ----
+
+    def _start_stage(
+        self,
+        name: str,
+        stage_func: Callable[[DocumentTask], Optional[DocumentTask]],
+        workers: int,
+        in_queue: queue.Queue,
+        out_queue: Optional[queue.Queue],
+    ) -> List[threading.Thread]:
+        workers = max(1, workers)
+        remaining = [workers]
+        lock = threading.Lock()
+
+        def handle(task: DocumentTask):
+            try:
+                result = stage_func(task)
+                if result is not None and out_queue is not None:
+                    out_queue.put(result)
+            except Exception as e:
+                try:
+                    self._fail(task, name, e)
+                except Exception as fail_error:
+                    logger.opt(exception=fail_error).error(
+                        f"Failed to handle the failure of {task.path}: {fail_error}"
+                    )
+
+        def worker():
+            # whatever happens to a task, the worker must reach the end-of-stream
+            # bookkeeping, or the downstream stages never finish and run() hangs
+            try:
+                while True:
+                    task = in_queue.get()
+                    if task is _DONE:
+                        # hand the marker on to the sibling workers of this stage
+                        in_queue.put(_DONE)
+                        break
+                    handle(task)
+            finally:
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last and out_queue is not None:
+                    out_queue.put(_DONE)
+
+        threads = [
+            threading.Thread(target=worker, name=f"ingest-{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def _claim_all(self, docs: Iterable[Dict[str, Any]]) -> Iterable[DocumentTask]:
+        for doc in docs:
+            try:
+                task = self._claim(doc["path"], doc.get("metadata", {}))
+            except Exception as e:
+                logger.opt(exception=e).error(
+                    f"Failed to load ledger entry for {doc.get('path')}: {e}"
+                )
+                self._count("failed")
+                continue
+            if task is None:
+                self._count("skipped")
+                continue
+            yield task
+
+    def _parse_in_pool(
+        self, tasks: Iterable[DocumentTask], parse_queue: queue.Queue, **kwargs
+    ):
+        """Parse in worker processes, handing documents on as they finish."""
+        pending: Dict[int, DocumentTask] = {}
+
+        def paths():
+            for i, task in enumerate(tasks):
+                pending[i] = task
+                yield task.path
+
+        kwargs.setdefault("max_tokens", MAX_BLOCK_TOKENS)
+        for result in parse_documents(
+            paths(),
+            max_workers=self.parse_workers,
+            ordered=False,
+            token_model=self.builder.llm_client.model,
+            max_pending=self.parse_workers + self.queue_size,
+            **kwargs,
+        ):
+            task = pending.pop(result.index)
+            if result.error is not None:
+                self._fail(task, "parse", result.error)
+                continue
+            task.doc_knowledge = result.data
+            parse_queue.put(task)
+
+    def run(self, docs: Iterable[Dict[str, Any]], **kwargs) -> Dict[str, int]:
+        """
+        Ingest documents, resuming whatever a previous run of this job left unfinished.
+
+        Parameters:
+        - docs: Iterable of {"path": ..., "metadata": {...}} items, consumed lazily
+        - **kwargs: Passed on to the document parser
+
+        Returns:
+        - Number of documents per outcome: persisted, skipped, failed
+        """
+        self._stats = {"persisted": 0, "skipped": 0, "failed": 0}
+
+        parse_queue = queue.Queue(maxsize=self.queue_size)
+        context_queue = queue.Queue(maxsize=self.queue_size)
+        embed_queue = queue.Queue(maxsize=self.queue_size)
+        persist_queue = queue.Queue(maxsize=self.queue_size)
+
+        threads = []
+        # parsing is CPU bound and persisting is one transaction per document,
+        # so both run single-threaded; the LLM and embedding stages fan out
+        threads += self._start_stage(
+            "parse",
+            lambda task: self._parse(task, **kwargs),
+            1,
+            parse_queue,
+            context_queue,
+        )
+        threads += self._start_stage(
+            "contextualize",
+            self._contextualize,
+            self.context_workers,
+            context_queue,
+            embed_queue,
+        )
+        threads += self._start_stage(
+            "embed", self._embed, self.embed_workers, embed_queue, persist_queue
+        )
+        threads += self._start_stage("persist", self._persist, 1, persist_queue, None)
+
+        try:
+            tasks = self._claim_all(docs)
+            if self.parse_workers > 0:
+                self._parse_in_pool(tasks, parse_queue, **kwargs)
+            else:
+                for task in tasks:
+                    parse_queue.put(task)
+        finally:
+            parse_queue.put(_DONE)
+            for thread in threads:
+                thread.join()
+
+        logger.info(f"Ingestion job {self.job_name} finished: {self._stats}")
+        return dict(self._stats)
+
+    def status(self) -> Dict[str, Dict[str, int]]:
+        """Number of ledger entries of this job per status and stage."""
+        with SessionLocal() as db:
+            rows = (
+                db.query(
+                    IngestionLedger.status,
+                    IngestionLedger.stage,
+                    func.count(IngestionLedger.id),
+                )
+                .filter(IngestionLedger.job_name == self.job_name)
+                .group_by(IngestionLedger.status, IngestionLedger.stage)
+                .all()
+            )
+        summary: Dict[str, Dict[str, int]] = {}
+        for status, stage, count in rows:
+            summary.setdefault(status, {})[stage] = count
+        return summary
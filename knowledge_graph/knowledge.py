@@ -1,89 +1,343 @@
 import json
-import copy
-from typing import Dict, List, Any, Union, Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Union, Callable, Optional, Tuple
+
+from sqlalchemy import case, delete, update
 
 from knowledge_graph.models import Concept, Relationship, KnowledgeBlock, SourceData
-from knowledge_graph.utils import gen_situate_context
+from knowledge_graph.utils import block_embedding_text, gen_situate_contexts
+from knowledge_graph.bulk import bulk_insert, new_id
+from knowledge_graph.resolution import ConceptResolver
+from knowledge_graph.index_tree import index_leaves
+from knowledge_graph.migration import write_migration_vectors
+from knowledge_graph.vector_store import VectorStore
 from utils.json_utils import extract_json_array, extract_json
-from utils.token import calculate_tokens
+from utils.token import calculate_tokens, count_tokens_batch
 from setting.db import SessionLocal
+from setting.embedding import DEFAULT_EMBEDDING_MODEL, get_embedding_spec
 from llm.factory import LLMInterface
-from knowledge_graph.parser import Block, get_parser
+from llm.rate_limit import RateLimiter
+from knowledge_graph.parser import Block, FileData, MarkdownParser, get_parser
+from knowledge_graph.parser.utils import content_hash
 from knowledge_graph.prompts.hub import PromptHub
 
+# token budget of a knowledge block, parent context included
+MAX_BLOCK_TOKENS = 4096
+
+# metadata mirrored into the vector store, usable as search filters
+BLOCK_METADATA_KEYS = ["source_id", "knowledge_type", "source_version"]
+RELATIONSHIP_METADATA_KEYS = ["source_id", "target_id", "relationship_type"]
+
+
+def block_hash(block: Block) -> str:
+    return block.content_hash or content_hash(block.content)
+
+
+def check_index_subgraph(subgraph: Any):
+    """
+    Check the shape of a subgraph extracted from a knowledge index path.
+
+    Raises:
+    - ValueError: If it is not {"entities": [{"name", "definition"}, ...],
+      "relationships": [{"source_entity", "target_entity", ...}, ...]}
+    """
+    if not isinstance(subgraph, dict):
+        raise ValueError(f"subgraph is a {type(subgraph).__name__}, not an object")
+    entities = subgraph.get("entities")
+    relationships = subgraph.get("relationships")
+    if not isinstance(entities, list) or not isinstance(relationships, list):
+        raise ValueError("subgraph needs 'entities' and 'relationships' lists")
+    for entity in entities:
+        if not isinstance(entity, dict) or not all(
+            isinstance(entity.get(key), str) for key in ("name", "definition")
+        ):
+            raise ValueError(f"invalid entity: {entity}")
+    for relationship in relationships:
+        if (
+            not isinstance(relationship, dict)
+            or not all(
+                isinstance(relationship.get(key), str)
+                for key in ("source_entity", "target_entity")
+            )
+            or not all(
+                isinstance(relationship.get(key), (str, type(None)))
+                for key in ("relationship_type", "definition")
+            )
+        ):
+            raise ValueError(f"invalid relationship: {relationship}")
+
 
 class KnowledgeBuilder:
     """
     A builder class for constructing knowledge graphs from documents.
     """
 
-    def __init__(self, llm_client: LLMInterface, embedding_func: Callable):
+    def __init__(
+        self,
+        llm_client: LLMInterface,
+        embedding_func: Callable,
+        batch_embedding_func: Optional[Callable] = None,
+        context_workers: int = 8,
+        index_workers: int = 8,
+        context_rate_limiter: Optional[RateLimiter] = None,
+        concept_resolver: Optional[ConceptResolver] = None,
+        vector_store: Optional[VectorStore] = None,
+        embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+    ):
         """
         Initialize the builder with a graph instance and specifications.
+
+        Parameters:
+        - llm_client: LLM used for extraction
+        - embedding_func: Embeds a single text
+        - batch_embedding_func: Optional, embeds a list of texts in one call
+          (e.g. llm.embedding.get_text_embeddings)
+        - context_workers: Concurrent situated-context requests per document
+        - index_workers: Concurrent subgraph extractions per knowledge index
+        - context_rate_limiter: Optional limiter for situated-context requests
+        - concept_resolver: Optional, merges newly extracted concepts into
+          near-identical existing ones after every knowledge index extraction
+        - vector_store: Optional, receives the vectors of every committed block,
+          concept and relationship (not needed for TiDB, which stores them inline)
+        - embedding_model: Model behind embedding_func and batch_embedding_func;
+          columns registered with another model are embedded with their own
         """
         self.embedding_func = embedding_func
+        self.batch_embedding_func = batch_embedding_func
+        self.context_workers = context_workers
+        self.index_workers = index_workers
+        self.context_rate_limiter = context_rate_limiter
+        self.concept_resolver = concept_resolver
+        self.vector_store = vector_store
+        self.embedding_model = embedding_model
         self.llm_client = llm_client
         self.prompt_hub = PromptHub()
 
-    def extract_knowledge_blocks(self, path: str, attributes: Dict[str, Any], **kwargs):
-        # Extract basic info of source
-        doc_version = attributes.get("doc_version", "1.0")
-        doc_link = attributes.get("doc_link", path)
+    def _embed_texts(
+        self, texts: List[str], key: Optional[str] = None
+    ) -> List[List[float]]:
+        """
+        Embed texts in bulk, falling back to one call per text, and fit the
+        vectors to the registered spec of the column `key` they are stored in.
+        A column registered with another model than the builder's is embedded
+        with that model, so its vectors stay in one embedding space.
+        """
+        if not texts:
+            return []
+        spec = get_embedding_spec(key) if key is not None else None
+        if spec is not None and spec.model != self.embedding_model:
+            from llm.embedding import get_column_embedding_funcs
+
+            return get_column_embedding_funcs(key)[1](texts)
+        if self.batch_embedding_func is not None:
+            vectors = self.batch_embedding_func(texts)
+        else:
+            vectors = [self.embedding_func(text) for text in texts]
+        if spec is not None:
+            vectors = spec.prepare(vectors)
+        return vectors
+
+    def _write_migration_vectors(self, db, key: str, rows: List[Any]):
+        """Also fill the column of a registered re-embedding migration of `key`."""
+        write_migration_vectors(
+            db, key, rows, self.embedding_model, self.batch_embedding_func
+        )
+
+    def _store_vectors(
+        self,
+        collection: str,
+        rows: List[Any],
+        vector_attr: str,
+        metadata_keys: List[str],
+    ):
+        """Mirror the vectors of committed rows into the vector store, if any."""
+        if self.vector_store is None:
+            return
+        rows = [row for row in rows if getattr(row, vector_attr, None) is not None]
+        if not rows:
+            return
+        self.vector_store.add(
+            collection,
+            [row.id for row in rows],
+            [getattr(row, vector_attr) for row in rows],
+            [{key: getattr(row, key) for key in metadata_keys} for row in rows],
+        )
+
+    def parse_document(self, path: str, **kwargs) -> Tuple[FileData, List[Block]]:
+        """
+        Parse a document into blocks and check every block fits the context budget.
 
+        Returns:
+        - The parsed document and its blocks (the whole document as one block
+          if the parser produced none)
+        """
         # find suitable parser to parse knowledge
         parser = get_parser(path)
+        if isinstance(parser, MarkdownParser):
+            # split oversized sections instead of rejecting the document below
+            kwargs.setdefault("max_tokens", MAX_BLOCK_TOKENS)
+            kwargs.setdefault(
+                "token_counter",
+                lambda text: calculate_tokens(text, model=self.llm_client.model),
+            )
         doc_knowledge = parser.parse(path, **kwargs)
+        return doc_knowledge, self.prepare_blocks(doc_knowledge)
 
-        blocks = doc_knowledge.blocks
-        full_content = doc_knowledge.content
-        name = doc_knowledge.name
-
+    def prepare_blocks(self, doc_knowledge: FileData) -> List[Block]:
+        """
+        Blocks of a parsed document (the whole document as one block if the
+        parser produced none), checked against the context budget.
+        """
         if doc_knowledge.blocks is None or len(doc_knowledge.blocks) == 0:
-            blocks = [Block(name=name, content=full_content, position=1)]
+            blocks = [
+                Block(name=doc_knowledge.name, content=doc_knowledge.content, position=1)
+            ]
         else:
             blocks = doc_knowledge.blocks
 
-        for block in blocks:
-            content = block.content
-            tokens = calculate_tokens(content)
-            if tokens > 4096:
-                # TODO: Consider making 4096 configurable or handling splitting differently
+        # parse_documents' workers count tokens already
+        if all(block.tokens is not None for block in blocks):
+            block_tokens = [block.tokens for block in blocks]
+        else:
+            block_tokens = count_tokens_batch(
+                [block.content for block in blocks], model=self.llm_client.model
+            )
+        for block, tokens in zip(blocks, block_tokens):
+            if tokens > MAX_BLOCK_TOKENS:
                 raise ValueError(
-                    f"Section '{block.name}' including parent context has {tokens} tokens, exceeding 4096. Please restructure the document."
+                    f"Section '{block.name}' including parent context has {tokens} tokens, exceeding {MAX_BLOCK_TOKENS}. Please restructure the document."
                 )
 
-        # Generate situated context for each section\
-        # Add document and knowledge blocks to database
-        section_context = {}
+        return blocks
+
+    def find_source(self, doc_link: str, doc_version: str) -> Optional[str]:
+        """Return the id of the source already stored at this link and version, if any."""
         with SessionLocal() as db:
             source_data = (
-                db.query(SourceData)
+                db.query(SourceData.id)
+                .filter(SourceData.link == doc_link, SourceData.version == doc_version)
+                .first()
+            )
+            return source_data.id if source_data else None
+
+    def load_stored_blocks(self, doc_link: str) -> Dict[str, Any]:
+        """
+        Paragraph blocks already stored for a source, keyed by content hash, so
+        a new version can reuse the context and vector of unchanged blocks.
+        """
+        with SessionLocal() as db:
+            rows = (
+                db.query(
+                    KnowledgeBlock.content_hash,
+                    KnowledgeBlock.context,
+                    KnowledgeBlock.content_vec,
+                )
+                .join(SourceData, KnowledgeBlock.source_id == SourceData.id)
                 .filter(
-                    SourceData.link == doc_link and SourceData.version == doc_version
+                    SourceData.link == doc_link,
+                    KnowledgeBlock.knowledge_type == "paragraph",
+                    KnowledgeBlock.content_hash.isnot(None),
                 )
-                .first()
+                .all()
             )
-            if not source_data:
-                for block in blocks:
-                    # gen_situate_context expects the original doc and the specific block content
-                    # We provide the full content of the section (including parent context) as the "block"
-                    # This assumes gen_situate_context can handle this structure appropriately
-                    section_context[block.name] = gen_situate_context(
-                        full_content, block.content
-                    )
+        return {row.content_hash: row for row in rows}
+
+    def contextualize_blocks(
+        self,
+        path: str,
+        full_content: str,
+        blocks: List[Block],
+        stored: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, str]:
+        """
+        Generate the situated context of each block, keyed by block name.
+        Blocks found in `stored` (see load_stored_blocks) keep their context.
+        """
+        stored = stored or {}
+        section_context = {}
+        changed = []
+        for block in blocks:
+            row = stored.get(block_hash(block))
+            if row is not None:
+                section_context[block.name] = row.context
+            else:
+                changed.append(block)
+        if not changed:
+            return section_context
+
+        # We provide the full content of the section (including parent context) as the "block"
+        contexts, usage = gen_situate_contexts(
+            full_content,
+            [block.content for block in changed],
+            max_workers=self.context_workers,
+            rate_limiter=self.context_rate_limiter,
+        )
+        print(
+            f"Situated context token usage for {path} "
+            f"({len(changed)}/{len(blocks)} blocks changed): {usage}"
+        )
+        section_context.update(
+            {block.name: context for block, context in zip(changed, contexts)}
+        )
+        return section_context
+
+    def embed_blocks(
+        self,
+        blocks: List[Block],
+        section_context: Dict[str, str],
+        stored: Optional[Dict[str, Any]] = None,
+    ) -> List[List[float]]:
+        """
+        Embed context + block content of every block in one bulk call.
+        Blocks found in `stored` (see load_stored_blocks) keep their vector.
+        """
+        stored = stored or {}
+        content_vecs = [None] * len(blocks)
+        changed = []
+        for i, block in enumerate(blocks):
+            row = stored.get(block_hash(block))
+            if row is not None and row.content_vec is not None:
+                content_vecs[i] = list(row.content_vec)
             else:
-                print(f"Source data already exists for {path}, id: {source_data.id}")
-                return blocks
+                changed.append(i)
+
+        embedding_inputs = [
+            block_embedding_text(
+                blocks[i].content, section_context.get(blocks[i].name, None)
+            )
+            for i in changed
+        ]
+        vectors = self._embed_texts(embedding_inputs, "knowledge_blocks.content_vec")
+        for i, vector in zip(changed, vectors):
+            content_vecs[i] = vector
+        return content_vecs
+
+    def persist_blocks(
+        self,
+        path: str,
+        attributes: Dict[str, Any],
+        doc_knowledge: FileData,
+        blocks: List[Block],
+        section_context: Dict[str, str],
+        content_vecs: List[List[float]],
+    ) -> bool:
+        """
+        Write the source and its knowledge blocks in one transaction.
+
+        Returns:
+        - False if the blocks of this version were already stored, True otherwise
+        """
+        doc_version = attributes.get("doc_version", "1.0")
+        doc_link = attributes.get("doc_link", path)
 
-        # Add document and knowledge blocks to database
         with SessionLocal() as db:
             source_data = (
                 db.query(SourceData).filter(SourceData.link == doc_link).first()
             )
             if not source_data:
                 source_data = SourceData(
-                    name=name,
-                    content=full_content,  # Store original full content
+                    name=doc_knowledge.name,
+                    content=doc_knowledge.content,  # Store original full content
                     link=doc_link,
                     version=doc_version,
                     data_type="document",
@@ -95,7 +349,7 @@ class KnowledgeBuilder:
                 print(f"Source data created for {path}, id: {source_data_id}")
             elif source_data.version != doc_version:
                 print(f"Update source data - path: {path}, id: {source_data.id}")
-                source_data.content = full_content
+                source_data.content = doc_knowledge.content
                 source_data.version = doc_version
                 source_data.attributes = attributes
                 db.add(source_data)
@@ -106,51 +360,138 @@ class KnowledgeBuilder:
                     f"Source data already exists for {path}, id: {source_data.id}"
                 )
 
-            # Check if knowledge blocks for this version already exist
-            existing_kbs = (
-                db.query(KnowledgeBlock.name)
-                .filter(
-                    KnowledgeBlock.source_id == source_data_id,
-                    KnowledgeBlock.knowledge_type == "paragraph",
-                    KnowledgeBlock.source_version == doc_version,
+            # Diff against the stored blocks by content hash: unchanged blocks are
+            # updated in place, new ones inserted, removed ones deleted
+            stored_by_hash: Dict[str, List[Any]] = {}
+            stale_ids = set()
+            for row in db.query(
+                KnowledgeBlock.id,
+                KnowledgeBlock.name,
+                KnowledgeBlock.position_in_source,
+                KnowledgeBlock.source_version,
+                KnowledgeBlock.content_hash,
+            ).filter(
+                KnowledgeBlock.source_id == source_data_id,
+                KnowledgeBlock.knowledge_type == "paragraph",
+            ):
+                stale_ids.add(row.id)
+                if row.content_hash:
+                    stored_by_hash.setdefault(row.content_hash, []).append(row)
+
+            reused = []  # (stored row, block)
+            new_blocks = []
+            for block, content_vec in zip(blocks, content_vecs):
+                digest = block_hash(block)
+                candidates = stored_by_hash.get(digest)
+                if candidates:
+                    row = candidates.pop(0)
+                    stale_ids.discard(row.id)
+                    reused.append((row, block))
+                    continue
+                new_blocks.append(
+                    KnowledgeBlock(
+                        name=block.name,
+                        context=section_context.get(block.name, None),
+                        content=block.content,
+                        knowledge_type="paragraph",
+                        content_vec=content_vec,
+                        source_version=doc_version,
+                        source_id=source_data_id,
+                        position_in_source=block.position,
+                        content_hash=digest,
+                    )
                 )
-                .all()
-            )
-            existing_kb_names = {kb.name for kb in existing_kbs}
 
-            if existing_kb_names == set([block.name for block in blocks]):
+            if (
+                not new_blocks
+                and not stale_ids
+                and all(row.source_version == doc_version for row, _ in reused)
+            ):
                 print(
                     f"Knowledge blocks already exist for {path} version {doc_version}"
                 )
-                return blocks  # Return the newly structured blocks
+                return False
 
-            print(f"Generating knowledge blocks for {path} version {doc_version}")
+            print(
+                f"Generating knowledge blocks for {path} version {doc_version}: "
+                f"{len(reused)} reused, {len(new_blocks)} new, {len(stale_ids)} removed"
+            )
 
-            for block in blocks:
-                context = section_context.get(block.name, None)
-                content_str = block.content
-                content_position = block.position
+            if reused:
+                reused_ids = [row.id for row, _ in reused]
+                db.execute(
+                    update(KnowledgeBlock)
+                    .where(KnowledgeBlock.id.in_(reused_ids))
+                    .values(
+                        source_version=doc_version,
+                        name=case(
+                            {row.id: block.name for row, block in reused},
+                            value=KnowledgeBlock.id,
+                        ),
+                        position_in_source=case(
+                            {row.id: block.position for row, block in reused},
+                            value=KnowledgeBlock.id,
+                        ),
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+            if stale_ids:
+                db.execute(
+                    delete(KnowledgeBlock)
+                    .where(KnowledgeBlock.id.in_(list(stale_ids)))
+                    .execution_options(synchronize_session=False)
+                )
+            bulk_insert(db, KnowledgeBlock, new_blocks)
+            self._write_migration_vectors(
+                db, "knowledge_blocks.content_vec", new_blocks
+            )
 
-                # Generate embedding based on context + block content
-                if context:
-                    embedding_input = f"<context>\n{context}</context>\n\n{content_str}"
-                else:
-                    embedding_input = content_str
+            db.commit()
 
-                content_vec = self.embedding_func(embedding_input)
-                kb = KnowledgeBlock(
-                    name=block.name,
-                    context=context,
-                    content=content_str,
+        if self.vector_store is not None:
+            if stale_ids:
+                self.vector_store.delete("knowledge_blocks", list(stale_ids))
+            # reused vectors are re-added to refresh their source_version
+            vec_by_block = {id(block): vec for block, vec in zip(blocks, content_vecs)}
+            reused_blocks = [
+                KnowledgeBlock(
+                    id=row.id,
+                    content_vec=vec_by_block[id(block)],
                     knowledge_type="paragraph",
-                    content_vec=content_vec,
                     source_version=doc_version,
                     source_id=source_data_id,
-                    position_in_source=content_position,
                 )
-                db.add(kb)
+                for row, block in reused
+            ]
+            self._store_vectors(
+                "knowledge_blocks",
+                new_blocks + reused_blocks,
+                "content_vec",
+                BLOCK_METADATA_KEYS,
+            )
+        return True
 
-            db.commit()
+    def extract_knowledge_blocks(self, path: str, attributes: Dict[str, Any], **kwargs):
+        # Extract basic info of source
+        doc_version = attributes.get("doc_version", "1.0")
+        doc_link = attributes.get("doc_link", path)
+
+        doc_knowledge, blocks = self.parse_document(path, **kwargs)
+
+        source_id = self.find_source(doc_link, doc_version)
+        if source_id:
+            print(f"Source data already exists for {path}, id: {source_id}")
+            return blocks
+
+        # a new version only regenerates the blocks whose content changed
+        stored = self.load_stored_blocks(doc_link)
+        section_context = self.contextualize_blocks(
+            path, doc_knowledge.content, blocks, stored
+        )
+        content_vecs = self.embed_blocks(blocks, section_context, stored)
+        self.persist_blocks(
+            path, attributes, doc_knowledge, blocks, section_context, content_vecs
+        )
 
         return blocks  # Return the sections dictionary
 
@@ -159,7 +500,7 @@ class KnowledgeBuilder:
     ) -> List[KnowledgeBlock]:
         doc_version = attributes.get("doc_version", "1.0")
         doc_link = attributes.get("doc_link", file_path)
-        doc_knowledge = self.parser(file_path, **kwargs)
+        doc_knowledge, _ = self.parse_document(file_path, **kwargs)
         doc_content = doc_knowledge.content
         name = doc_knowledge.name
 
@@ -209,21 +550,36 @@ class KnowledgeBuilder:
                     raise ValueError(f"Knowledge blocks already exist for {file_path}")
 
                 # Create and add knowledge blocks
-                for block_data in extracted_qa_pairs:
-                    question = block_data.get("question", "")
-                    answer = block_data.get("answer", "")
-                    qa_content = question + "\n" + answer
-                    qa_block = KnowledgeBlock(
-                        name=question,
-                        definition=qa_content,
+                qa_contents = [
+                    block_data.get("question", "") + "\n" + block_data.get("answer", "")
+                    for block_data in extracted_qa_pairs
+                ]
+                qa_vecs = self._embed_texts(
+                    qa_contents, "knowledge_blocks.content_vec"
+                )
+                qa_blocks = [
+                    KnowledgeBlock(
+                        name=block_data.get("question", ""),
+                        content=qa_content,
                         source_version=doc_version,
                         source_id=source_data_id,
                         knowledge_type="qa",
-                        content_vec=self.embedding_func(qa_content),
+                        content_vec=qa_vec,
+                    )
+                    for block_data, qa_content, qa_vec in zip(
+                        extracted_qa_pairs, qa_contents, qa_vecs
                     )
-                    db.add(qa_block)
+                ]
+                bulk_insert(db, KnowledgeBlock, qa_blocks)
+                self._write_migration_vectors(
+                    db, "knowledge_blocks.content_vec", qa_blocks
+                )
                 db.commit()
 
+            self._store_vectors(
+                "knowledge_blocks", qa_blocks, "content_vec", BLOCK_METADATA_KEYS
+            )
+
         except (json.JSONDecodeError, TypeError):
             print(f"Failed to parse knowledge blocks from {file_path}")
 
@@ -237,65 +593,19 @@ class KnowledgeBuilder:
         parser = get_parser(path)
         kb = parser.parse(path, **kwargs)
         
-        def get_node_attributes(node):
-            references = []
-            for child in node.children:
-                if len(child.children) > 0:
-                    raise ValueError("Reference node should be the leaf node without any children")
-                
-                references.append(child.name)
-            
-            return references
-
-        def depth_traversal(root, current_path: list):
-            if root.name == "Reference":
-                return [
-                    {
-                        "path": copy.deepcopy(current_path),
-                        "references": get_node_attributes(root),
-                        "source_link": doc_link,  # Add source link
-                        "source_version": doc_version,  # Add source version
-                    }
-                ]
-            elif root.name == "Definition":
-                return [
-                    {
-                        "path": copy.deepcopy(current_path),
-                        "definition": get_node_attributes(root),
-                        "source_link": doc_link,  # Add source link
-                        "source_version": doc_version,  # Add source version
-                    }
-                ]
-            elif root.name == "Annotation":
-                return [
-                    {
-                        "path": copy.deepcopy(current_path),
-                        "annotation": get_node_attributes(root),
-                        "source_link": doc_link,  # Add source link
-                        "source_version": doc_version,  # Add source version
-                    }
-                ]
-
-            all_paths = []
-            for child in root.children:
-                curent_path_copy = copy.deepcopy(current_path)
-                all_paths.extend(depth_traversal(child, curent_path_copy + [root.name]))
-
-            return all_paths
-
         # Process all knowledge indexes
         all_knowledges = {}
-        for index in kb.indexes:
-            paths = depth_traversal(index, [])
-            for path_data in paths:
-                if not path_data:  # Skip empty results
-                    continue
-                path_str = "->".join(path_data["path"])
-                if path_str not in all_knowledges:
-                    all_knowledges[path_str] = {}
-
-                for key, value in path_data.items():
-                    all_knowledges[path_str][key] = value
+        for leaf in index_leaves(kb):
+            path_str = "->".join(leaf.path)
+            knowledge = all_knowledges.setdefault(path_str, {})
+            knowledge.update(
+                {
+                    "path": list(leaf.path),
+                    leaf.kind: list(leaf.values),
+                    "source_link": doc_link,  # Add source link
+                    "source_version": doc_version,  # Add source version
+                }
+            )
 
         # No knowledge found
         if not all_knowledges:
@@ -333,8 +643,8 @@ class KnowledgeBuilder:
 
         print("source", source_map)
 
-        # Process each knowledge item
-        results = []
+        # Build the prompt of each knowledge item, in path order
+        pending = []
         for knowledge in all_knowledges.values():
             invalid_references = []
             valid_references = []
@@ -358,147 +668,216 @@ class KnowledgeBuilder:
             prompt = prompt_template.format(
                 knowledge=knowledge, reference_documents=valid_references
             )
+            pending.append((knowledge, valid_references, prompt))
+
+        if not pending:
+            return []
+
+        def extract(item):
+            knowledge, valid_references, prompt = item
+            try:
+                response = self.llm_client.generate(prompt)
+                subgraph = json.loads(extract_json(response))
+                # a bad shape would otherwise only fail the batched upsert
+                check_index_subgraph(subgraph)
+            except Exception as e:
+                print(f"Failed to extract subgraph of {knowledge['path']}: {e}")
+                return None
+            return knowledge, valid_references, response, subgraph
+
+        # LLM calls run concurrently, map keeps the results in path order
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(self.index_workers, len(pending)))
+        ) as executor:
+            extracted = [result for result in executor.map(extract, pending) if result]
+
+        self._upsert_index_subgraphs(extracted, doc_link, doc_version)
 
-            response = self.llm_client.generate(prompt)
-            subgraph_json_str = extract_json(response)
-            subgraph = json.loads(subgraph_json_str)
+        # Return all results or first result to maintain backward compatibility
+        return [response for _, _, response, _ in extracted]
+
+    def _upsert_index_subgraphs(
+        self,
+        extracted: List[Tuple[Dict[str, Any], List[Dict[str, Any]], str, Dict]],
+        doc_link: str,
+        doc_version: str,
+    ):
+        """
+        Write the subgraphs extracted from a knowledge index in one transaction.
 
-            with SessionLocal() as db:
-                # First check if concepts with these names already exist
-                existing_concepts = {}
-                concept_names = [entity["name"] for entity in subgraph["entities"]]
-                if concept_names:
-                    for existing in (
-                        db.query(Concept).filter(Concept.name.in_(concept_names)).all()
-                    ):
-                        existing_concepts[existing.name] = existing
+        Concepts are keyed by name: an existing concept is reused, otherwise
+        the first path (in index order) defining a name wins, so the result
+        does not depend on which LLM call finished first.
 
-                # Create new concepts only for those that don't exist
-                new_concepts = []
-                concept_map = (
-                    {}
-                )  # Will map concept names to their IDs (either existing or new)
+        Parameters:
+        - extracted: (knowledge, valid references, response, subgraph) per
+          path, in index order
+        - doc_link: Link of the knowledge index document
+        - doc_version: Version of the knowledge index document
+        """
+        concept_names = list(
+            dict.fromkeys(
+                entity["name"]
+                for _, _, _, subgraph in extracted
+                for entity in subgraph["entities"]
+            )
+        )
+        if not concept_names:
+            return
+
+        with SessionLocal() as db:
+            # First check if concepts with these names already exist
+            concept_map = {}  # concept name -> id, existing or new
+            for existing in (
+                db.query(Concept)
+                .filter(Concept.name.in_(concept_names))
+                .order_by(Concept.id)
+                .all()
+            ):
+                concept_map.setdefault(existing.name, existing.id)
+                print(f"Using existing concept: {existing.name}")
 
+            # Create new concepts only for those that don't exist
+            new_entities = {}
+            for _, _, _, subgraph in extracted:
                 for entity in subgraph["entities"]:
-                    if entity["name"] in existing_concepts:
-                        # Use existing concept
-                        concept = existing_concepts[entity["name"]]
-                        concept_map[entity["name"]] = concept.id
-                        print(f"Using existing concept: {entity['name']}")
-                    else:
-                        # Create new concept
-                        concept = Concept(
-                            name=entity["name"],
-                            definition=entity["definition"],
-                            definition_vec=self.embedding_func(entity["definition"]),
-                            version="1.0",
-                        )
-                        new_concepts.append(concept)
-                        print(f"Creating new concept: {entity['name']}")
+                    if entity["name"] not in concept_map:
+                        new_entities.setdefault(entity["name"], entity)
+            for name in new_entities:
+                print(f"Creating new concept: {name}")
+
+            # Create new concepts, embedding all definitions in one call
+            definition_vecs = self._embed_texts(
+                [entity["definition"] for entity in new_entities.values()],
+                "concepts.definition_vec",
+            )
+            new_concepts = []
+            for entity, definition_vec in zip(new_entities.values(), definition_vecs):
+                concept = Concept(
+                    id=new_id(),
+                    name=entity["name"],
+                    definition=entity["definition"],
+                    definition_vec=definition_vec,
+                    version="1.0",
+                )
+                new_concepts.append(concept)
+                # ids are generated client-side, no flush needed
+                concept_map[concept.name] = concept.id
+
+            # Add new concepts to database
+            if new_concepts:
+                bulk_insert(db, Concept, new_concepts)
+                self._write_migration_vectors(
+                    db, "concepts.definition_vec", new_concepts
+                )
 
-                # Add new concepts to database
-                if new_concepts:
-                    db.add_all(new_concepts)
-                    db.flush()
-                    # Update concept_map with IDs of new concepts
-                    for concept in new_concepts:
-                        concept_map[concept.name] = concept.id
-
-                # Check for existing concept->source relationships
-                existing_relationships = {}
-                concept_ids = list(concept_map.values())
-                source_ids = [source["id"] for source in valid_references]
-
-                if concept_ids and source_ids:
-                    for rel in (
-                        db.query(Relationship)
-                        .filter(
-                            Relationship.source_id.in_(concept_ids),
-                            Relationship.source_type == "Concept",
-                            Relationship.target_id.in_(source_ids),
-                            Relationship.target_type == "SourceData",
-                            Relationship.relationship_type == "SOURCE_OF",
-                        )
-                        .all()
-                    ):
-                        # Key by (source_id, target_id) tuple
-                        existing_relationships[(rel.source_id, rel.target_id)] = rel
+            concept_ids = list(dict.fromkeys(concept_map.values()))
+            source_ids = list(
+                {
+                    source["id"]
+                    for _, valid_references, _, _ in extracted
+                    for source in valid_references
+                }
+            )
 
-                # Create only new relationships
-                source_rel = []
-                for concept_name, concept_id in concept_map.items():
+            # Check for existing concept->source relationships
+            existing_relationships = set()
+            if source_ids:
+                for rel in (
+                    db.query(Relationship)
+                    .filter(
+                        Relationship.source_id.in_(concept_ids),
+                        Relationship.source_type == "Concept",
+                        Relationship.target_id.in_(source_ids),
+                        Relationship.target_type == "SourceData",
+                        Relationship.relationship_type == "SOURCE_OF",
+                    )
+                    .all()
+                ):
+                    existing_relationships.add((rel.source_id, rel.target_id))
+
+            # Check for existing concept-to-concept relationships
+            concept_to_concept_rels = set()
+            for rel in (
+                db.query(Relationship)
+                .filter(
+                    Relationship.source_id.in_(concept_ids),
+                    Relationship.source_type == "Concept",
+                    Relationship.target_id.in_(concept_ids),
+                    Relationship.target_type == "Concept",
+                )
+                .all()
+            ):
+                # Key by (source_id, target_id, relationship_type) tuple to handle different relationship types
+                concept_to_concept_rels.add(
+                    (rel.source_id, rel.target_id, rel.relationship_type)
+                )
+
+            # Create only new relationships, each path linking its own concepts
+            source_rel = []
+            concept_rels = []
+            for knowledge, valid_references, _, subgraph in extracted:
+                path_concepts = {
+                    entity["name"]: concept_map[entity["name"]]
+                    for entity in subgraph["entities"]
+                }
+
+                for concept_name, concept_id in path_concepts.items():
                     for source in valid_references:
-                        if (concept_id, source["id"]) not in existing_relationships:
+                        if (concept_id, source["id"]) in existing_relationships:
                             print(
-                                f"Creating new relationship: {concept_name} -> {source['name']}"
+                                f"Relationship already exists: {concept_name} -> {source['name']}"
                             )
-                            rel = Relationship(
+                            continue
+                        print(
+                            f"Creating new relationship: {concept_name} -> {source['name']}"
+                        )
+                        existing_relationships.add((concept_id, source["id"]))
+                        source_rel.append(
+                            Relationship(
                                 source_id=concept_id,
                                 source_type="Concept",
                                 target_id=source["id"],
                                 target_type="SourceData",
                                 relationship_type="SOURCE_OF",
                             )
-                            source_rel.append(rel)
-                        else:
-                            print(
-                                f"Relationship already exists: {concept_name} -> {source['name']}"
-                            )
-
-                if source_rel:
-                    db.add_all(source_rel)
-
-                # Check for existing concept-to-concept relationships
-                concept_to_concept_rels = {}
-                if concept_ids:
-                    for rel in (
-                        db.query(Relationship)
-                        .filter(
-                            Relationship.source_id.in_(concept_ids),
-                            Relationship.source_type == "Concept",
-                            Relationship.target_id.in_(concept_ids),
-                            Relationship.target_type == "Concept",
                         )
-                        .all()
-                    ):
-                        # Key by (source_id, target_id, relationship_type) tuple to handle different relationship types
-                        concept_to_concept_rels[
-                            (rel.source_id, rel.target_id, rel.relationship_type)
-                        ] = rel
 
-                # Create new concept-to-concept relationships
-                concept_rels = []
                 for relationship in subgraph["relationships"]:
                     source_name = relationship["source_entity"]
                     target_name = relationship["target_entity"]
-                    rel_type = relationship.get("relationship_type", "REFERENCES")
+                    rel_type = relationship.get("relationship_type") or "REFERENCES"
                     rel_desc = relationship.get("definition", None)
 
                     # Skip if either concept is missing
-                    if source_name not in concept_map or target_name not in concept_map:
+                    if (
+                        source_name not in path_concepts
+                        or target_name not in path_concepts
+                    ):
                         print(
                             f"Skipping relationship: {source_name} -> {target_name} (missing concept)"
                         )
                         continue
 
-                    source_id = concept_map[source_name]
-                    target_id = concept_map[target_name]
-
+                    key = (path_concepts[source_name], path_concepts[target_name], rel_type)
                     # Check if this relationship already exists
-                    if (source_id, target_id, rel_type) not in concept_to_concept_rels:
+                    if key in concept_to_concept_rels:
                         print(
-                            f"Creating new concept relationship: {source_name} ({rel_type}) -> {target_name}"
+                            f"Relationship already exists: {source_name} ({rel_type}) -> {target_name}"
                         )
-                        rel = Relationship(
-                            source_id=source_id,
+                        continue
+                    print(
+                        f"Creating new concept relationship: {source_name} ({rel_type}) -> {target_name}"
+                    )
+                    concept_to_concept_rels.add(key)
+                    concept_rels.append(
+                        Relationship(
+                            source_id=key[0],
                             source_type="Concept",
-                            target_id=target_id,
+                            target_id=key[1],
                             target_type="Concept",
                             relationship_type=rel_type,
                             relationship_desc=rel_desc,
-                            relationship_desc_vec=(
-                                self.embedding_func(rel_desc) if rel_desc else None
-                            ),
                             knowledge_bundle=[
                                 {
                                     "id": k["id"],
@@ -511,18 +890,52 @@ class KnowledgeBuilder:
                                 for k in valid_references
                             ],
                         )
-                        concept_rels.append(rel)
-                    else:
-                        print(
-                            f"Relationship already exists: {source_name} ({rel_type}) -> {target_name}"
-                        )
+                    )
 
-                if concept_rels:
-                    db.add_all(concept_rels)
+            if source_rel:
+                bulk_insert(db, Relationship, source_rel)
 
-                db.commit()
+            if concept_rels:
+                # Embed all relationship descriptions in one call
+                described_rels = [rel for rel in concept_rels if rel.relationship_desc]
+                desc_vecs = self._embed_texts(
+                    [rel.relationship_desc for rel in described_rels],
+                    "relationships.relationship_desc_vec",
+                )
+                for rel, desc_vec in zip(described_rels, desc_vecs):
+                    rel.relationship_desc_vec = desc_vec
+                bulk_insert(db, Relationship, concept_rels)
+                self._write_migration_vectors(
+                    db, "relationships.relationship_desc_vec", concept_rels
+                )
 
-            results.append(response)
+            # Merge the new concepts into near-identical ones, in the same transaction
+            merged = {}
+            if self.concept_resolver is not None and new_concepts:
+                plan = self.concept_resolver.resolve_and_apply(
+                    db, [concept.id for concept in new_concepts]
+                )
+                for duplicate_id, canonical_id in plan.canonical.items():
+                    print(f"Merged concept {duplicate_id} into {canonical_id}")
+                merged = plan.canonical
 
-        # Return all results or first result to maintain backward compatibility
-        return results
+            db.commit()
+
+        if self.vector_store is not None:
+            for rel in concept_rels:
+                rel.source_id = merged.get(rel.source_id, rel.source_id)
+                rel.target_id = merged.get(rel.target_id, rel.target_id)
+            if merged:
+                self.vector_store.delete("concepts", list(merged))
+            self._store_vectors(
+                "concepts",
+                [c for c in new_concepts if c.id not in merged],
+                "definition_vec",
+                [],
+            )
+            self._store_vectors(
+                "relationships",
+                [rel for rel in concept_rels if rel.source_id != rel.target_id],
+                "relationship_desc_vec",
+                RELATIONSHIP_METADATA_KEYS,
+            )
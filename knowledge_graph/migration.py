@@ -0,0 +1,331 @@
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+from sqlalchemy import bindparam, func, literal_column, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from tidb_vector.sqlalchemy import VectorType
+
+from knowledge_graph.models import BestPractice, Concept, KnowledgeBlock, Relationship
+from knowledge_graph.utils import block_embedding_text
+from knowledge_graph.vector_index import (
+    VectorIndexSpec,
+    column_name,
+    create_vector_indexes,
+)
+from setting.embedding import (
+    EmbeddingSpec,
+    get_embedding_migration,
+    get_embedding_spec,
+    register_embedding_migration,
+)
+
+# "table.attribute" -> (model, text columns, row -> text that was embedded)
+EMBEDDING_SOURCES = {
+    "knowledge_blocks.content_vec": (
+        KnowledgeBlock,
+        [KnowledgeBlock.content, KnowledgeBlock.context],
+        lambda row: block_embedding_text(row.content, row.context),
+    ),
+    "concepts.definition_vec": (
+        Concept,
+        [Concept.definition],
+        lambda row: row.definition,
+    ),
+    "relationships.relationship_desc_vec": (
+        Relationship,
+        [Relationship.relationship_desc],
+        lambda row: row.relationship_desc,
+    ),
+    "best_practices.guideline_vec": (
+        BestPractice,
+        [BestPractice.guideline],
+        lambda row: row.guideline,
+    ),
+}
+
+
+def _mapped_column(key: str) -> str:
+    model = EMBEDDING_SOURCES[key][0]
+    return column_name(getattr(model, key.split(".", 1)[1]))
+
+
+def _embed_for(
+    spec: EmbeddingSpec,
+    texts: List[str],
+    batch_embedding_func: Optional[Callable[[List[str]], List[List[float]]]] = None,
+) -> List[List[float]]:
+    """Embed texts with the spec's model and fit them to its column."""
+    if batch_embedding_func is None:
+        from llm.embedding import get_text_embeddings
+
+        return spec.prepare(get_text_embeddings(texts, model=spec.model))
+    return spec.prepare(batch_embedding_func(texts))
+
+
+def _vector_update(table: str, spec: EmbeddingSpec):
+    return text(
+        f"UPDATE {table} SET {spec.column} = :vec WHERE id = :id"
+    ).bindparams(bindparam("vec", type_=VectorType(spec.dimension)))
+
+
+def write_migration_vectors(
+    db: Session,
+    key: str,
+    rows: List[Any],
+    embedding_model: Optional[str] = None,
+    batch_embedding_func: Optional[Callable[[List[str]], List[List[float]]]] = None,
+):
+    """
+    Dual-write: fill the target column of the re-embedding migration registered
+    for `key` (if any) for rows just inserted, in the caller's transaction.
+    Without it, rows written after a backfill passed them and before the
+    registry switches to the new column would have no vector there.
+
+    Parameters:
+    - db: Session the rows were inserted with (the caller commits)
+    - key: Column key of the rows' vectors, e.g. "concepts.definition_vec"
+    - rows: ORM instances with ids
+    - embedding_model: Model behind batch_embedding_func
+    - batch_embedding_func: Used when it embeds with the migration's model,
+      otherwise the texts go to llm.embedding.get_text_embeddings
+    """
+    spec = get_embedding_migration(key)
+    if spec is None or not rows or spec.column == _mapped_column(key):
+        return
+    model, text_columns, to_text = EMBEDDING_SOURCES[key]
+    rows = [row for row in rows if getattr(row, text_columns[0].key) is not None]
+    if not rows:
+        return
+    vectors = _embed_for(
+        spec,
+        [to_text(row) for row in rows],
+        batch_embedding_func if spec.model == embedding_model else None,
+    )
+    db.execute(
+        _vector_update(model.__tablename__, spec),
+        [{"id": row.id, "vec": vec} for row, vec in zip(rows, vectors)],
+    )
+
+
+@dataclass
+class MigrationProgress:
+    total: int = 0
+    embedded: int = 0
+    batches: int = 0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self.started_at is not None and self.finished_at is None
+
+
+class ReembeddingMigration:
+    """
+    Re-embed one vector column with another model or dimension, without
+    downtime.
+
+    The new vectors go to a new nullable column next to the one in use, which
+    keeps serving reads and writes meanwhile:
+
+    1. `add_column` adds the column, sized by the target spec
+    2. Register the migration with every writer, so the builders also fill
+       the new column for the rows they insert (dual-write), e.g.
+       EMBEDDING_MIGRATIONS={"concepts.definition_vec": {"dimension": 512,
+       "column": "definition_vec_512"}}; `run` registers it in its own process
+    3. `start` (or `run`) backfills it in batches, keyset-paginated on id, and
+       catches up with rows written during the backfill
+    4. `create_index` builds its vector index
+    5. Point the registry at it with the same value in EMBEDDING_CONFIGS,
+       drop EMBEDDING_MIGRATIONS, and restart
+    6. Optionally run a migration with the now current spec: targeting the
+       column in use, it only fills the rows still without a vector there,
+       e.g. written by a process that missed step 2
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        key: str,
+        spec: EmbeddingSpec,
+        batch_embedding_func: Optional[Callable[[List[str]], List[List[float]]]] = None,
+        batch_size: int = 256,
+        pause: float = 0.0,
+    ):
+        """
+        Parameters:
+        - engine: Engine of the TiDB database
+        - key: Column to re-embed, e.g. "concepts.definition_vec"
+        - spec: Target spec; spec.column names the new column, or the column
+          in use for a catch-up pass with the registered model and dimension
+        - batch_embedding_func: Embeds a list of texts with the target model,
+          defaults to llm.embedding.get_text_embeddings with spec.model
+        - batch_size: Rows embedded and written per transaction
+        - pause: Seconds to sleep between batches, to throttle the load
+        """
+        if key not in EMBEDDING_SOURCES:
+            raise ValueError(f"No embedding source for {key}")
+        self.model, self.text_columns, self.to_text = EMBEDDING_SOURCES[key]
+        current_column = _mapped_column(key)
+        # a catch-up pass over the column in use, after the registry switch
+        self.catch_up = spec.column in (None, current_column)
+        if self.catch_up:
+            current = get_embedding_spec(key)
+            if (spec.model, spec.dimension) != (current.model, current.dimension):
+                raise ValueError(
+                    f"{key} is stored in {current_column} with {current.model} "
+                    f"({current.dimension} dimensions), another model or "
+                    f"dimension needs a new column"
+                )
+            spec = replace(spec, column=current_column)
+
+        self.engine = engine
+        self.key = key
+        self.spec = spec
+        self.batch_size = batch_size
+        self.pause = pause
+        self.batch_embedding_func = batch_embedding_func
+        self.table = self.model.__tablename__
+        self.progress = MigrationProgress()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        return _embed_for(self.spec, texts, self.batch_embedding_func)
+
+    def add_column(self):
+        with self.engine.begin() as conn:
+            exists = conn.execute(
+                text(f"SHOW COLUMNS FROM {self.table} LIKE :column"),
+                {"column": self.spec.column},
+            ).first()
+            if exists:
+                return
+            logger.info(f"Adding column {self.table}.{self.spec.column}")
+            conn.execute(
+                text(
+                    f"ALTER TABLE {self.table} ADD COLUMN {self.spec.column} "
+                    f"VECTOR({int(self.spec.dimension)}) NULL"
+                )
+            )
+
+    def create_index(self, metric: str = "cosine") -> VectorIndexSpec:
+        index = VectorIndexSpec(self.table, self.spec.column, metric)
+        create_vector_indexes(self.engine, [index])
+        return index
+
+    def _pending(self):
+        """Rows with something to embed and nothing in the new column yet."""
+        return [
+            literal_column(self.spec.column).is_(None),
+            self.text_columns[0].isnot(None),
+        ]
+
+    def remaining(self) -> int:
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(func.count()).select_from(self.model).where(*self._pending())
+            ).scalar()
+
+    def run_batch(self, after_id: str = "") -> Optional[str]:
+        """
+        Embed and write one batch of rows with ids above `after_id`.
+
+        Returns:
+        - The last id of the batch, or None when no rows are left
+        """
+        id_column = self.model.id
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(id_column, *self.text_columns)
+                .where(id_column > after_id, *self._pending())
+                .order_by(id_column)
+                .limit(self.batch_size)
+            ).all()
+        if not rows:
+            return None
+
+        vectors = self._embed([self.to_text(row) for row in rows])
+        with self.engine.begin() as conn:
+            conn.execute(
+                _vector_update(self.table, self.spec),
+                [{"id": row.id, "vec": vec} for row, vec in zip(rows, vectors)],
+            )
+
+        self.progress.embedded += len(rows)
+        self.progress.batches += 1
+        return rows[-1].id
+
+    def run(self) -> MigrationProgress:
+        """Backfill until no row is left, including rows written meanwhile."""
+        self.progress = MigrationProgress(started_at=time.time())
+        try:
+            self.add_column()
+            if not self.catch_up:
+                # rows inserted by this process from now on get both vectors
+                register_embedding_migration(self.key, self.spec)
+            while not self._stop.is_set():
+                embedded = self.progress.embedded
+                self.progress.total = embedded + self.remaining()
+                if self.progress.total == embedded:
+                    break
+                # one pass over the ids, then another for rows inserted behind it
+                after_id = ""
+                while not self._stop.is_set():
+                    after_id = self.run_batch(after_id)
+                    if after_id is None:
+                        break
+                    logger.info(
+                        f"Re-embedded {self.progress.embedded}/{self.progress.total} "
+                        f"rows of {self.key}"
+                    )
+                    if self.pause:
+                        time.sleep(self.pause)
+                if self.progress.embedded == embedded:
+                    break  # nothing could be written, don't spin
+        except Exception as e:
+            self.progress.error = str(e)
+            logger.error(f"Re-embedding of {self.key} failed: {e}")
+            raise
+        finally:
+            self.progress.finished_at = time.time()
+        return self.progress
+
+    def start(self) -> threading.Thread:
+        """Run the backfill on a background thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return self._thread
+        self._stop.clear()
+
+        def target():
+            try:
+                self.run()
+            except Exception:
+                pass  # recorded in self.progress.error
+
+        self._thread = threading.Thread(
+            target=target, name=f"reembed-{self.key}", daemon=True
+        )
+        self._thread.start()
+        return self._thread
+
+    def stop(self, wait: bool = True):
+        """Stop after the current batch; `start` resumes where it left off."""
+        self._stop.set()
+        if wait and self._thread is not None:
+            self._thread.join()
+
+    def status(self) -> Dict[str, object]:
+        return {
+            "key": self.key,
+            "column": self.spec.column,
+            "running": self.progress.running,
+            "embedded": self.progress.embedded,
+            "total": self.progress.total,
+            "error": self.progress.error,
+        }
@@ -17,9 +17,19 @@ from sqlalchemy.sql import func
 
 from tidb_vector.sqlalchemy import VectorType
 
+from setting.embedding import get_embedding_spec
+
 Base = declarative_base()
 
 
+def vector_column(key: str) -> Column:
+    """Vector column sized (and possibly renamed) by the embedding registry."""
+    spec = get_embedding_spec(key)
+    if spec.column:
+        return Column(spec.column, VectorType(spec.dimension), nullable=True)
+    return Column(VectorType(spec.dimension), nullable=True)
+
+
 class SourceData(Base):
     """Source document entity"""
 
@@ -65,10 +75,12 @@ class KnowledgeBlock(Base):
     )
     content = Column(LONGTEXT, nullable=True)
     context = Column(Text, nullable=True)
-    content_vec = Column(VectorType(1536), nullable=True)
+    content_vec = vector_column("knowledge_blocks.content_vec")
     attributes = Column(JSON, nullable=True)
     position_in_source = Column(BigInteger, default=0)
     source_version = Column(String(50), nullable=True)
+    # sha256 of the content, lets a new version reuse unchanged blocks
+    content_hash = Column(String(64), nullable=True)
     source_id = Column(String(36), ForeignKey("source_data.id"), nullable=False)
     created_at = Column(DateTime, default=func.current_timestamp())
     updated_at = Column(
@@ -81,6 +93,7 @@ class KnowledgeBlock(Base):
     __table_args__ = (
         Index("idx_kb_source_version", "source_version"),
         Index("idx_kb_knowledge_type", "knowledge_type"),
+        Index("idx_kb_source_hash", "source_id", "content_hash"),
     )
 
     def __repr__(self):
@@ -95,7 +108,7 @@ class Concept(Base):
     id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     name = Column(String(255), nullable=False)
     definition = Column(Text, nullable=True)
-    definition_vec = Column(VectorType(1536), nullable=True)
+    definition_vec = vector_column("concepts.definition_vec")
     version = Column(String(50), nullable=True)
     created_at = Column(DateTime, default=func.current_timestamp())
     updated_at = Column(
@@ -134,8 +147,8 @@ class Relationship(Base):
     target_type = Column(String(50), nullable=False)
     relationship_type = Column(String(255), nullable=False, default="REFERENCES")
     relationship_desc = Column(Text, nullable=True)
-    relationship_desc_vec = Column(
-        VectorType(1536), nullable=True
+    relationship_desc_vec = vector_column(
+        "relationships.relationship_desc_vec"
     )  # Vector column for embeddings
     knowledge_bundle = Column(JSON, nullable=True)
     attributes = Column(JSON, nullable=True)
@@ -161,7 +174,7 @@ class BestPractice(Base):
     source_id = Column(String(36), ForeignKey("source_data.id"), nullable=True)
     labels = Column(String(255), nullable=True)
     guideline = Column(Text, nullable=True)
-    guideline_vec = Column(VectorType(1536), nullable=True)
+    guideline_vec = vector_column("best_practices.guideline_vec")
     created_at = Column(DateTime, default=func.current_timestamp())
     updated_at = Column(
         DateTime, default=func.current_timestamp(), onupdate=func.current_timestamp()
@@ -174,3 +187,38 @@ class BestPractice(Base):
 
     def __repr__(self):
         return f"<BestPractice(id={self.id}, source_id={self.source_id}, tag={self.labels})>"
+
+
+# Ingestion stages in pipeline order, see knowledge_graph.ingestion
+INGESTION_STAGES = ["pending", "parsed", "contextualized", "embedded", "persisted"]
+
+
+class IngestionLedger(Base):
+    """Progress of one document through an ingestion job"""
+
+    __tablename__ = "ingestion_ledger"
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    job_name = Column(String(255), nullable=False)
+    doc_link = Column(String(512), nullable=False)
+    doc_version = Column(String(50), nullable=False)
+    stage = Column(Enum(*INGESTION_STAGES), nullable=False, default="pending")
+    status = Column(
+        Enum("running", "completed", "failed"), nullable=False, default="running"
+    )
+    # JSON checkpoint of the completed stages' outputs (contexts, vectors)
+    payload = Column(LONGTEXT, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(BigInteger, default=0)
+    created_at = Column(DateTime, default=func.current_timestamp())
+    updated_at = Column(
+        DateTime, default=func.current_timestamp(), onupdate=func.current_timestamp()
+    )
+
+    __table_args__ = (
+        Index("idx_ledger_job_doc", "job_name", "doc_link", "doc_version", unique=True),
+        Index("idx_ledger_job_stage", "job_name", "stage"),
+    )
+
+    def __repr__(self):
+        return f"<IngestionLedger(job={self.job_name}, doc={self.doc_link}, stage={self.stage}, status={self.status})>"
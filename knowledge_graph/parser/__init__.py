@@ -1,7 +1,8 @@
 from .freemind import FreemindParser
 from .markdown import MarkdownParser
-from .base import BaseParser, Block, Index, FileData
+from .base import BaseParser, Block, Index, IndexLeaf, FileData, LEAF_KINDS
 from .factory import get_parser
+from .pool import ParsedDocument, parse_documents
 
 __all__ = [
     "BaseParser",
@@ -9,6 +10,10 @@ __all__ = [
     "MarkdownParser",
     "Block",
     "Index",
+    "IndexLeaf",
+    "LEAF_KINDS",
     "FileData",
     "get_parser",
+    "ParsedDocument",
+    "parse_documents",
 ]
@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
-from typing import Any, Dict, Optional, List, Union
+from typing import Any, Dict, Optional, List, Tuple, Union
 
 
 @dataclass
@@ -14,6 +14,26 @@ class Block:
     name: str
     content: str
     position: Optional[int] = 0
+    # filled in by parse_documents' workers, computed on demand otherwise
+    tokens: Optional[int] = None
+    content_hash: Optional[str] = None
+
+
+# index nodes whose children are values rather than sub-indexes, by leaf kind
+LEAF_KINDS = {
+    "Reference": "references",
+    "Definition": "definition",
+    "Annotation": "annotation",
+}
+
+
+@dataclass(frozen=True)
+class IndexLeaf:
+    """A Reference/Definition/Annotation node of an index tree."""
+
+    path: Tuple[str, ...]  # names of the index nodes above it
+    kind: str  # "references", "definition" or "annotation"
+    values: Tuple[str, ...]  # names of its children
 
 
 @dataclass
@@ -22,6 +42,8 @@ class FileData:
     content: str
     blocks: List[Block] = field(default_factory=list)
     indexes: Union[Index, List[Index], None] = None
+    # leaves of `indexes`, when the parser collects them while parsing
+    leaves: Optional[List[IndexLeaf]] = None
 
 
 class BaseParser(ABC):
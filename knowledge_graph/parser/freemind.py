@@ -1,40 +1,30 @@
 import xml.etree.ElementTree as ET
-from typing import Dict, Any, Optional, List
+from typing import Any, List, Optional
 import json
 import re
 
-from .base import BaseParser, Index, FileData
-from .utils import read_file_content, extract_file_info
+from .base import BaseParser, Index, IndexLeaf, FileData, LEAF_KINDS
+from .utils import extract_file_info
+
+# zero-width spaces and other invisible characters
+_INVISIBLE_RE = re.compile(
+    r"[\u200b\u200c\u200d\u2060\ufeff\u00a0\u2000-\u200f\u2028-\u202f]+"
+)
 
 
 class FreemindParser(BaseParser):
     """
-    Parses Freemind (.mm) files into a hierarchical Block structure
-    and provides a clean JSON representation of the mind map.
+    Parses Freemind (.mm) files into a hierarchical Index structure
+    and provides a compact JSON representation of the mind map.
+
+    The XML is streamed with iterparse and nodes are tracked on an explicit
+    stack, so deep or large maps neither recurse nor keep the element tree
+    in memory.
     """
 
     def _clean_text(self, text):
         """Clean text of all invisible characters and whitespace"""
-        # Remove all zero-width spaces and other invisible characters
-        cleaned = re.sub(
-            r"[\u200b\u200c\u200d\u2060\ufeff\u00a0\u2000-\u200f\u2028-\u202f]+",
-            "",
-            text,
-        )
-        # Then remove regular whitespace from ends
-        return cleaned.strip()
-
-    def _parse_node(self, node_elem: ET.Element) -> Index:
-        """
-        Recursively parse an XML element representing a node into a Block.
-        """
-        text = node_elem.get("TEXT", "").strip()
-        # Clean the text of invisible characters
-        clean_text = self._clean_text(text)
-
-        children = [self._parse_node(child) for child in node_elem.findall("node")]
-
-        return Index(name=clean_text, children=children)
+        return _INVISIBLE_RE.sub("", text).strip()
 
     def parse(self, path: str, **kwargs: Any) -> FileData:
         """
@@ -47,40 +37,76 @@ class FreemindParser(BaseParser):
         Returns:
         - FileData with:
             - name: Filename without extension
-            - blocks: Root Block of the parsed mind map tree
-            - content: JSON string representation of the mind map (without XML tags)
+            - indexes: Children of the map's title node
+            - leaves: Reference/Definition/Annotation nodes of the indexes
+              with their paths, in document order (None if a leaf's value
+              has children of its own)
+            - content: Compact JSON representation of the mind map (without XML tags)
         """
         name, _ = extract_file_info(path)
 
+        # (index, names of the index nodes above it, whether it has children yet)
+        stack: List[list] = []
+        root: Optional[Index] = None
+        leaves: List[IndexLeaf] = []
+        json_parts: List[str] = []
+        # stack depth of the open leaf node, its children are values
+        leaf_depth: Optional[int] = None
+        # a leaf value with children of its own, left for the caller to report
+        malformed_leaf = False
+
         try:
-            # Parse the XML file directly
-            tree = ET.parse(path)
-            root = tree.getroot()
-
-            map_node = root.find("node")
-            if map_node is None:
-                raise ValueError("Could not find the root node in the Freemind file.")
-
-            # Parse the mind map structure into Block objects
-            root_node_index = self._parse_node(map_node)
-
-            # Convert the Index structure to a dictionary for JSON serialization
-            def index_to_dict(index: Index) -> Dict:
-                return {
-                    "text": index.name,
-                    "children": [index_to_dict(child) for child in index.children],
-                }
-
-            # Create a clean representation and convert to JSON
-            clean_map = index_to_dict(root_node_index)
-            json_content = json.dumps(clean_map, indent=2, ensure_ascii=False)
-
-            # Return FileData with the parsed structure and JSON content
-            return FileData(
-                name=name,
-                content=json_content,  # JSON string instead of raw XML
-                indexes=root_node_index.children,  # Exclude the title node
-            )
+            for event, elem in ET.iterparse(path, events=("start", "end")):
+                if elem.tag != "node":
+                    continue
+
+                if event == "start":
+                    index = Index(name=self._clean_text(elem.get("TEXT", "")))
+                    if stack:
+                        parent = stack[-1]
+                        parent[0].children.append(index)
+                        if parent[2]:
+                            json_parts.append(",")
+                        parent[2] = True
+                        if leaf_depth is not None and len(stack) > leaf_depth + 1:
+                            malformed_leaf = True
+                        # the title node is not part of the paths
+                        path_names = (
+                            parent[1] + (parent[0].name,) if len(stack) > 1 else ()
+                        )
+                    elif root is None:
+                        root = index
+                        path_names = ()
+                    else:
+                        continue  # only the first top-level node is the map
+
+                    if (
+                        leaf_depth is None
+                        and len(stack) > 0
+                        and index.name in LEAF_KINDS
+                    ):
+                        leaf_depth = len(stack)
+                    stack.append([index, path_names, False])
+                    json_parts.append(
+                        '{"text":'
+                        + json.dumps(index.name, ensure_ascii=False)
+                        + ',"children":['
+                    )
+                else:
+                    if not stack:
+                        continue
+                    index, path_names, _ = stack.pop()
+                    json_parts.append("]}")
+                    if leaf_depth == len(stack):
+                        leaf_depth = None
+                        leaves.append(
+                            IndexLeaf(
+                                path=path_names,
+                                kind=LEAF_KINDS[index.name],
+                                values=tuple(child.name for child in index.children),
+                            )
+                        )
+                    elem.clear()  # the Index holds all we need
 
         except ET.ParseError as e:
             raise ValueError(f"Error parsing XML content from file {path}: {e}")
@@ -88,3 +114,13 @@ class FreemindParser(BaseParser):
             raise FileNotFoundError(f"Freemind file not found at {path}")
         except Exception as e:
             raise RuntimeError(f"Error processing {path}: {e}")
+
+        if root is None:
+            raise ValueError("Could not find the root node in the Freemind file.")
+
+        return FileData(
+            name=name,
+            content="".join(json_parts),  # JSON string instead of raw XML
+            indexes=root.children,  # Exclude the title node
+            leaves=None if malformed_leaf else leaves,
+        )
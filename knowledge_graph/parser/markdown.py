@@ -1,100 +1,271 @@
-import json
-from typing import Dict, List, Optional, Any, Union, Tuple, Callable
-from pathlib import Path
-from math import ceil
+import re
+from typing import Callable, Iterable, Iterator, List, Optional
 
+from utils.token import calculate_tokens
 from .base import BaseParser, FileData, Block
-from .utils import read_file_content, extract_file_info
+from .utils import extract_file_info
 
+_HEADING_RE = re.compile(r"(#{1,6}) ")
+_FENCE_RE = re.compile(r"\s*(```|~~~)")
+_PARAGRAPH_BREAK_RE = re.compile(r"\n\s*\n")
+# CJK full stops end a sentence even without whitespace after them
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+|(?<=[。！？])\s*")
 
-class MarkdownParser:
+
+def _read_lines(path: str, sink: Optional[List[str]] = None) -> Iterator[str]:
+    """
+    Lines of a file without their newline, like content.split("\\n") but read
+    lazily. Every line read is also appended to `sink` if given.
     """
-    A builder class for constructing knowledge graphs from documents.
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            line = ""
+            for line in f:
+                if sink is not None:
+                    sink.append(line)
+                yield line[:-1] if line.endswith("\n") else line
+            if line == "" or line.endswith("\n"):
+                yield ""
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Markdown file not found at {path}")
+
+
+class MarkdownParser(BaseParser):
+    """
+    Splits a markdown document into one block per section of `heading_level`.
+
+    Each block starts with the latest higher-level heading and its text (the
+    parent context), followed by the section itself. Text before the first
+    heading becomes a preamble block named after the document. Headings
+    inside fenced code blocks are ignored.
+
+    With `max_tokens`, oversized sections are split on paragraph boundaries
+    (then sentences, then words, then wherever the budget runs out) into parts
+    that each repeat the parent and section headings, optionally overlapping
+    by `overlap_tokens`. Oversized preambles are split the same way.
     """
 
-    def parse(self, path: str, heading_level=2) -> FileData:
-        # Extract basic info
+    def parse(
+        self,
+        path: str,
+        heading_level: int = 2,
+        max_tokens: Optional[int] = None,
+        overlap_tokens: int = 0,
+        token_counter: Optional[Callable[[str], int]] = None,
+    ) -> FileData:
         name, extension = extract_file_info(path)
-        markdown_content = read_file_content(path)
-        lines = markdown_content.split("\n")
+        raw_lines: List[str] = []
+        blocks = list(
+            self.iter_blocks(
+                _read_lines(path, raw_lines),
+                name,
+                heading_level=heading_level,
+                max_tokens=max_tokens,
+                overlap_tokens=overlap_tokens,
+                token_counter=token_counter,
+            )
+        )
+        return FileData(name=name, content="".join(raw_lines), blocks=blocks)
+
+    def iter_file_blocks(self, path: str, **kwargs) -> Iterator[Block]:
+        """Stream the blocks of a file, reading it line by line."""
+        name, extension = extract_file_info(path)
+        return self.iter_blocks(_read_lines(path), name, **kwargs)
+
+    def iter_blocks(
+        self,
+        lines: Iterable[str],
+        name: str,
+        heading_level: int = 2,
+        max_tokens: Optional[int] = None,
+        overlap_tokens: int = 0,
+        token_counter: Optional[Callable[[str], int]] = None,
+    ) -> Iterator[Block]:
+        """
+        Yield the blocks of a document in one pass over its lines.
+
+        Parameters:
+        - lines: Lines of the document, without newlines
+        - name: Document name, used for the preamble block
+        - heading_level: Heading level of a block, higher levels are its context
+        - max_tokens: Optional, split blocks longer than this
+        - overlap_tokens: Tokens of trailing text repeated at the start of the
+          next part of a split section
+        - token_counter: Counts the tokens of a text, defaults to tiktoken's gpt-4o
+
+        Returns:
+        - Generator of Blocks, in document order
+        """
+        count = token_counter or calculate_tokens
+        position = 0
+        preamble: List[str] = []
+        context: List[str] = []
+        title: Optional[str] = None
+        section: List[str] = []
+        in_fence = False
 
-        blocks = []
-        current_block_position = 0
-        current_higher_level_context = []
-        current_block_content = []
-        current_block_title = None
+        def emit(
+            block_name: str, content: str, header: str, body: str
+        ) -> Iterator[Block]:
+            nonlocal position
+            if max_tokens is None or count(content) <= max_tokens:
+                yield Block(name=block_name, content=content, position=position)
+                position += 1
+                return
+            for part in self._split_section(
+                block_name, header, body, max_tokens, overlap_tokens, count
+            ):
+                part.position = position
+                yield part
+                position += 1
+
+        def flush() -> Iterator[Block]:
+            # split parts repeat the parent and section headings
+            return emit(
+                title,
+                "\n".join(context + section),
+                "\n".join(context[:1] + section[:1]),
+                "\n".join(context[1:] + section[1:]),
+            )
+
+        def flush_preamble() -> Iterator[Block]:
+            content = "\n".join(preamble)
+            return emit(name, content, "", content)
 
         for line in lines:
-            is_target_heading = line.startswith("#" * heading_level + " ")
-            is_higher_heading = False
-            # Check if the line is a heading with a level strictly less than heading_level
-            for level in range(1, heading_level):
-                if line.startswith("#" * level + " "):
-                    is_higher_heading = True
-                    break
-
-            if is_higher_heading:
-                # Finalize the previous target-level block if it exists, adding parent context
-                if current_block_title is not None:
-                    full_block_content = "\n".join(
-                        current_higher_level_context + current_block_content
-                    )
-                    blocks.append(
-                        Block(
-                            name=current_block_title,
-                            content=full_block_content,
-                            position=current_block_position,
-                        )
-                    )
-                    # Reset for the next block under the *new* higher context
-                    current_block_content = []
-                    current_block_title = None
-                    current_block_position += 1
-
-                # Start new higher-level context, including the heading line itself
-                current_higher_level_context = [line]
-
-            elif is_target_heading:
-                # Finalize the previous target-level block if it exists, adding parent context
-                if current_block_title is not None:
-                    full_block_content = "\n".join(
-                        current_higher_level_context + current_block_content
-                    )
-                    blocks.append(
-                        Block(
-                            name=current_block_title,
-                            content=full_block_content,
-                            position=current_block_position,
-                        )
-                    )
-                    current_block_content = []
-                    current_block_title = None
-                    current_block_position += 1
-
-                # Start new target-level block
-                current_block_title = line[heading_level + 1 :].strip()  # +1 for space
-                current_block_content = [line]  # Start block content with its heading
+            if _FENCE_RE.match(line):
+                in_fence = not in_fence
+            heading = None if in_fence else _HEADING_RE.match(line)
+            level = len(heading.group(1)) if heading else None
 
+            if level is None or level > heading_level:
+                # body text of whatever is open
+                if title is not None:
+                    section.append(line)
+                elif context:
+                    context.append(line)
+                else:
+                    preamble.append(line)
+                continue
+
+            if preamble:
+                if any(text.strip() for text in preamble):
+                    yield from flush_preamble()
+                preamble = []
+            if title is not None:
+                yield from flush()
+                title, section = None, []
+
+            if level < heading_level:
+                # a new parent context, including the heading line itself
+                context = [line]
             else:
-                # Append line to the appropriate context
-                if current_block_title is not None:
-                    current_block_content.append(line)
-                elif current_higher_level_context:
-                    current_higher_level_context.append(line)
+                title = line[heading_level + 1 :].strip()
+                section = [line]  # the block starts with its heading
+
+        if title is not None:
+            yield from flush()
+        elif any(text.strip() for text in preamble):
+            # a document without any heading is one preamble block
+            yield from flush_preamble()
+
+    @staticmethod
+    def _hard_cut(text: str, budget: int, count: Callable[[str], int]) -> List[str]:
+        """
+        Cut text without any break in it (e.g. CJK) into the longest prefixes
+        of at most `budget` tokens, found by bisection with `count`.
+        """
+        pieces = []
+        while text:
+            if count(text) <= budget:
+                pieces.append(text)
+                break
+            low, high = 1, len(text) - 1
+            while low < high:
+                middle = (low + high + 1) // 2
+                if count(text[:middle]) <= budget:
+                    low = middle
                 else:
-                    raise ValueError(f"not found suitable block for {line}")
+                    high = middle - 1
+            pieces.append(text[:low])
+            text = text[low:]
+        return pieces
 
-        # Save the last block after the loop
-        if current_block_title is not None:
-            full_block_content = "\n".join(
-                current_higher_level_context + current_block_content
-            )
-            blocks.append(
-                Block(
-                    name=current_block_title,
-                    content=full_block_content,
-                    position=current_block_position,
-                )
-            )
+    @classmethod
+    def _split_units(
+        cls, text: str, budget: int, count: Callable[[str], int]
+    ) -> List[str]:
+        """
+        Cut text into paragraphs, sentences, word runs or, as a last resort,
+        hard cuts of at most `budget` tokens.
+        """
+        units = []
+        for paragraph in _PARAGRAPH_BREAK_RE.split(text):
+            if not paragraph.strip():
+                continue
+            if count(paragraph) <= budget:
+                units.append(paragraph)
+                continue
+            for sentence in _SENTENCE_END_RE.split(paragraph):
+                if not sentence.strip():
+                    continue
+                if count(sentence) <= budget:
+                    units.append(sentence)
+                    continue
+                words: List[str] = []
+                words_tokens = 0
+                for word in sentence.split(" "):
+                    tokens = count(word) + 1
+                    if words and words_tokens + tokens > budget:
+                        units.append(" ".join(words))
+                        words, words_tokens = [], 0
+                    if tokens > budget:
+                        units.extend(cls._hard_cut(word, budget, count))
+                        continue
+                    words.append(word)
+                    words_tokens += tokens
+                if words:
+                    units.append(" ".join(words))
+        return units
 
-        return FileData(name=name, content=markdown_content, blocks=blocks)
+    def _split_section(
+        self,
+        title: str,
+        header: str,
+        body: str,
+        max_tokens: int,
+        overlap_tokens: int,
+        count: Callable[[str], int],
+    ) -> List[Block]:
+        # every part starts with the header, if any
+        budget = max(1, max_tokens - count(header) - 1) if header else max_tokens
+
+        parts: List[List[str]] = []
+        current: List[str] = []
+        current_tokens = 0
+        for unit in self._split_units(body, budget, count):
+            tokens = count(unit) + 1  # the paragraph break joining it
+            if current and current_tokens + tokens > budget:
+                parts.append(current)
+                # carry trailing units over to the next part
+                overlap: List[str] = []
+                overlap_size = 0
+                for previous in reversed(current):
+                    size = count(previous) + 1
+                    if overlap_size + size > min(overlap_tokens, budget - tokens):
+                        break
+                    overlap.insert(0, previous)
+                    overlap_size += size
+                current, current_tokens = overlap, overlap_size
+            current.append(unit)
+            current_tokens += tokens
+        if current:
+            parts.append(current)
+
+        return [
+            Block(
+                name=f"{title} ({i}/{len(parts)})",
+                content="\n\n".join([header] + units if header else units),
+            )
+            for i, units in enumerate(parts, start=1)
+        ]
@@ -0,0 +1,107 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from utils.token import calculate_tokens, count_tokens_batch
+from .base import FileData
+from .factory import get_parser
+from .markdown import MarkdownParser
+from .utils import content_hash
+
+
+@dataclass
+class ParsedDocument:
+    """Outcome of parsing one path; `index` is its position in the input."""
+
+    index: int
+    path: str
+    data: Optional[FileData] = None
+    error: Optional[BaseException] = None
+
+
+def parse_file(path: str, token_model: str = "gpt-4o", **kwargs: Any) -> FileData:
+    """
+    Parse a document and annotate its blocks with their token count and
+    content hash. Runs in the pool's worker processes.
+    """
+    parser = get_parser(path)
+    if isinstance(parser, MarkdownParser):
+        kwargs.setdefault("token_counter", partial(calculate_tokens, model=token_model))
+    data = parser.parse(path, **kwargs)
+    if data.blocks:
+        token_counts = count_tokens_batch(
+            [block.content for block in data.blocks], model=token_model
+        )
+        for block, tokens in zip(data.blocks, token_counts):
+            block.tokens = tokens
+            block.content_hash = content_hash(block.content)
+    return data
+
+
+def parse_documents(
+    paths: Iterable[str],
+    max_workers: Optional[int] = None,
+    ordered: bool = True,
+    token_model: str = "gpt-4o",
+    max_pending: Optional[int] = None,
+    **kwargs: Any,
+) -> Iterator[ParsedDocument]:
+    """
+    Parse documents in a process pool, keeping CPU-bound parsing and
+    tokenization off the threads that wait on the network.
+
+    Parameters:
+    - paths: Document paths, consumed lazily
+    - max_workers: Worker processes, defaults to the CPU count
+    - ordered: Yield results in input order, otherwise as soon as each is done
+    - token_model: Model whose tokenizer counts the block tokens
+    - max_pending: Documents submitted but not yet yielded, bounds memory;
+      defaults to twice the worker count
+    - **kwargs: Passed on to the parsers, must be picklable
+
+    Returns:
+    - Generator of ParsedDocument; a failed parse carries its exception
+      instead of stopping the generator
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * max_workers
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        path_iter = enumerate(paths)
+        futures: Dict[Any, ParsedDocument] = {}
+        finished: Dict[int, ParsedDocument] = {}
+        next_index = 0
+        exhausted = False
+
+        while True:
+            while not exhausted and len(futures) + len(finished) < max_pending:
+                try:
+                    index, path = next(path_iter)
+                except StopIteration:
+                    exhausted = True
+                    break
+                future = executor.submit(
+                    parse_file, path, token_model=token_model, **kwargs
+                )
+                futures[future] = ParsedDocument(index=index, path=path)
+            if not futures and not finished:
+                return
+
+            if futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = futures.pop(future)
+                    try:
+                        result.data = future.result()
+                    except Exception as e:
+                        result.error = e
+                    finished[result.index] = result
+
+            if ordered:
+                while next_index in finished:
+                    yield finished.pop(next_index)
+                    next_index += 1
+            else:
+                for index in list(finished):
+                    yield finished.pop(index)
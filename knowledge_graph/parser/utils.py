@@ -1,3 +1,4 @@
+import hashlib
 from typing import Tuple
 from pathlib import Path
 
@@ -25,3 +26,8 @@ def extract_file_info(file_path: str) -> Tuple[str, str]:
     """
     path = Path(file_path)
     return path.stem, path.suffix
+
+
+def content_hash(content: str) -> str:
+    """sha256 hex digest of a block's content."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
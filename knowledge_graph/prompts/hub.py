@@ -108,6 +108,33 @@ JSON Output (surround with ```json and ```):
 }}
 ```"""
 
+default_relate_similar_concepts_prompt = """I have two concepts with similar definitions that do not appear together in any knowledge block:
+Concept 1: {concept_a_name} - {concept_a_definition}
+Concept 2: {concept_b_name} - {concept_b_definition}
+
+Knowledge that mentions Concept 1:
+{concept_a_text}
+
+Knowledge that mentions Concept 2:
+{concept_b_text}
+
+The two texts above are separate, they are not evidence that the concepts occur together. Based on the definitions and this knowledge, determine whether the two concepts are related. Similar wording alone is not a relationship; if the knowledge does not support one, return a confidence of 0.0.
+Provide:
+1. The relationship type {relation_types}
+2. A detail description of the relationship
+3. A confidence score (0.0-1.0) for this relationship
+
+Return the result in JSON format with 'relation_type', 'description', and 'confidence' fields.
+
+JSON Output (surround with ```json and ```):
+```json
+{{
+    "relation_type": "relationship_type",
+    "description": "relationship_description",
+    "confidence": 0.0-1.0
+}}
+```"""
+
 default_extract_graph_from_knowledge_index = """You are an expert knowledge graph architect. Your task is to analyze the provided 'knowledge' object and its referenced document content ('reference_documents') to create concept node entities and their relationships for a knowledge graph.
 
 **Inputs:**
@@ -227,6 +254,7 @@ class PromptHub:
             "knowledge_qa_extraction": default_qa_extraction_prompt,
             "concept_extraction": default_concept_extraction_prompt,
             "extend_relationship": default_extend_relationship_prompt,
+            "relate_similar_concepts": default_relate_similar_concepts_prompt,
             "from_knowledge_index_graph_extraction": default_extract_graph_from_knowledge_index,
         }
 
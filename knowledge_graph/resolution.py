@@ -0,0 +1,389 @@
+import re
+import json
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from loguru import logger
+from sqlalchemy import case, delete, or_, update
+from sqlalchemy.orm import Session
+
+from knowledge_graph.models import Concept, Relationship
+from knowledge_graph.vector_index import vector_search
+
+_STOPWORDS = {"a", "an", "the", "of", "in", "on", "for", "to", "and", "with", "by"}
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def name_tokens(name: str) -> List[str]:
+    """Lowercased, stopword-free, crudely singularized tokens of a concept name."""
+    tokens = []
+    for token in _TOKEN_RE.findall(name.lower()):
+        if token in _STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def normalize_name(name: str) -> str:
+    """
+    Blocking key of a concept name, insensitive to case, punctuation, word
+    order, stopwords and plurals: "TiDB Placement Rules" and "Placement rules
+    in TiDB" both become "placement rule tidb".
+    """
+    return " ".join(sorted(set(name_tokens(name))))
+
+
+def name_similarity(name_a: str, name_b: str) -> float:
+    """Jaccard similarity of the normalized name tokens."""
+    tokens_a, tokens_b = set(name_tokens(name_a)), set(name_tokens(name_b))
+    if not tokens_a or not tokens_b:
+        return 0.0
+    return len(tokens_a & tokens_b) / len(tokens_a | tokens_b)
+
+
+def cosine_similarity(vec_a, vec_b) -> float:
+    a = np.asarray(vec_a, dtype=np.float32)
+    b = np.asarray(vec_b, dtype=np.float32)
+    denominator = float(np.linalg.norm(a) * np.linalg.norm(b))
+    if denominator == 0:
+        return 0.0
+    return float(a @ b) / denominator
+
+
+def merge_knowledge_bundles(bundle: list, other: Optional[list]) -> list:
+    """Entries of `bundle` followed by those of `other` it doesn't have yet."""
+    merged = list(bundle)
+    seen = {json.dumps(entry, sort_keys=True) for entry in merged}
+    for entry in other or []:
+        entry_key = json.dumps(entry, sort_keys=True)
+        if entry_key not in seen:
+            seen.add(entry_key)
+            merged.append(entry)
+    return merged
+
+
+class UnionFind:
+    """
+    Disjoint sets of concept ids. The root of each set is its smallest member
+    according to `rank`, so the canonical concept doesn't depend on merge order.
+    """
+
+    def __init__(self, rank: Optional[Callable[[str], tuple]] = None):
+        self.parent: Dict[str, str] = {}
+        self.rank = rank or (lambda item: (item,))
+
+    def find(self, item: str) -> str:
+        parent = self.parent.setdefault(item, item)
+        if parent == item:
+            return item
+        root = self.find(parent)
+        self.parent[item] = root  # path compression
+        return root
+
+    def union(self, item_a: str, item_b: str) -> str:
+        root_a, root_b = self.find(item_a), self.find(item_b)
+        if root_a == root_b:
+            return root_a
+        if self.rank(root_b) < self.rank(root_a):
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        return root_a
+
+    def groups(self) -> Dict[str, Set[str]]:
+        groups: Dict[str, Set[str]] = {}
+        for item in list(self.parent):
+            groups.setdefault(self.find(item), set()).add(item)
+        return groups
+
+
+@dataclass
+class MergePlan:
+    """Duplicate concept id -> canonical concept id, plus why they matched."""
+
+    canonical: Dict[str, str] = field(default_factory=dict)
+    matches: List[Tuple[str, str, str, float]] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.canonical)
+
+    def groups(self) -> Dict[str, Set[str]]:
+        groups: Dict[str, Set[str]] = {}
+        for duplicate_id, canonical_id in self.canonical.items():
+            groups.setdefault(canonical_id, set()).add(duplicate_id)
+        return groups
+
+
+class ConceptResolver:
+    """
+    Incremental entity resolution for concepts.
+
+    Candidates come from two blocking keys: the normalized name, and the
+    nearest neighbors of the definition vector (found by TiDB's vector search).
+    A candidate is merged when
+    - the normalized names are equal and the definitions agree
+      (cosine >= name_match_threshold), or
+    - the definitions are near-identical (cosine >= vector_match_threshold)
+      and the names overlap (token Jaccard >= min_name_overlap).
+
+    Matches are clustered with union-find; the oldest concept of a cluster is
+    kept and the relationships of the others are rewritten to it in bulk.
+    """
+
+    def __init__(
+        self,
+        name_match_threshold: float = 0.8,
+        vector_match_threshold: float = 0.95,
+        min_name_overlap: float = 0.5,
+        neighbors: int = 5,
+    ):
+        self.name_match_threshold = name_match_threshold
+        self.vector_match_threshold = vector_match_threshold
+        self.min_name_overlap = min_name_overlap
+        self.neighbors = neighbors
+        # normalized name -> concept ids, loaded once and kept up to date
+        self._name_index: Optional[Dict[str, Set[str]]] = None
+        self._lock = threading.Lock()
+
+    def _load_name_index(self, db: Session) -> Dict[str, Set[str]]:
+        if self._name_index is None:
+            name_index: Dict[str, Set[str]] = {}
+            for concept_id, name in db.query(Concept.id, Concept.name).yield_per(
+                10000
+            ):
+                name_index.setdefault(normalize_name(name), set()).add(concept_id)
+            self._name_index = name_index
+        return self._name_index
+
+    def _vector_neighbors(
+        self, db: Session, concept_id: str, vector
+    ) -> List[Tuple[str, float]]:
+        # one extra neighbor, the concept finds itself
+        rows = vector_search(
+            db, Concept.definition_vec, vector, self.neighbors + 1, columns=[Concept.id]
+        )
+        return [
+            (neighbor_id, 1.0 - float(d))
+            for neighbor_id, d in rows
+            if neighbor_id != concept_id
+        ][: self.neighbors]
+
+    def resolve(
+        self, db: Session, concept_ids: Optional[Iterable[str]] = None
+    ) -> MergePlan:
+        """
+        Find the concepts that duplicate each other or an existing concept.
+
+        Parameters:
+        - db: Session that can see the new concepts (they may be uncommitted)
+        - concept_ids: The newly inserted concepts, or None to resolve all concepts
+
+        Returns:
+        - The merge plan, apply it with `apply`
+        """
+        query = db.query(
+            Concept.id, Concept.name, Concept.definition_vec, Concept.created_at
+        )
+        if concept_ids is not None:
+            concept_ids = list(concept_ids)
+            if not concept_ids:
+                return MergePlan()
+            query = query.filter(Concept.id.in_(concept_ids))
+        new_concepts = {row.id: row for row in query}
+        if not new_concepts:
+            return MergePlan()
+
+        with self._lock:
+            name_index = self._load_name_index(db)
+            for concept in new_concepts.values():
+                name_index.setdefault(normalize_name(concept.name), set()).add(
+                    concept.id
+                )
+
+            # candidate pairs from both blocking keys
+            candidates: Dict[Tuple[str, str], Optional[float]] = {}
+            for concept in new_concepts.values():
+                for other_id in name_index.get(normalize_name(concept.name), ()):
+                    if other_id != concept.id:
+                        candidates[tuple(sorted((concept.id, other_id)))] = None
+                if concept.definition_vec is not None:
+                    for other_id, similarity in self._vector_neighbors(
+                        db, concept.id, concept.definition_vec
+                    ):
+                        candidates[tuple(sorted((concept.id, other_id)))] = similarity
+
+        if not candidates:
+            return MergePlan()
+
+        # fetch whatever is needed to score the candidates in one query
+        candidate_ids = {concept_id for pair in candidates for concept_id in pair}
+        concepts = dict(new_concepts)
+        missing = candidate_ids - set(concepts)
+        if missing:
+            concepts.update(
+                (row.id, row)
+                for row in db.query(
+                    Concept.id, Concept.name, Concept.definition_vec, Concept.created_at
+                ).filter(Concept.id.in_(missing))
+            )
+
+        def rank(concept_id: str) -> tuple:
+            # keep pre-existing concepts, then the oldest one
+            concept = concepts.get(concept_id)
+            created_at = concept.created_at if concept is not None else None
+            return (
+                concept_id in new_concepts,
+                created_at.timestamp() if created_at else float("inf"),
+                concept_id,
+            )
+
+        union_find = UnionFind(rank)
+        plan = MergePlan()
+        for (id_a, id_b), similarity in candidates.items():
+            concept_a, concept_b = concepts.get(id_a), concepts.get(id_b)
+            if concept_a is None or concept_b is None:
+                continue
+            if similarity is None:
+                if (
+                    concept_a.definition_vec is not None
+                    and concept_b.definition_vec is not None
+                ):
+                    similarity = cosine_similarity(
+                        concept_a.definition_vec, concept_b.definition_vec
+                    )
+                else:
+                    similarity = 1.0
+
+            same_name = normalize_name(concept_a.name) == normalize_name(concept_b.name)
+            if same_name and similarity >= self.name_match_threshold:
+                reason = "name"
+            elif (
+                similarity >= self.vector_match_threshold
+                and name_similarity(concept_a.name, concept_b.name)
+                >= self.min_name_overlap
+            ):
+                reason = "vector"
+            else:
+                continue
+
+            union_find.union(id_a, id_b)
+            plan.matches.append((id_a, id_b, reason, similarity))
+
+        for canonical_id, members in union_find.groups().items():
+            for member_id in members:
+                if member_id != canonical_id:
+                    plan.canonical[member_id] = canonical_id
+
+        return plan
+
+    def apply(self, db: Session, plan: MergePlan) -> int:
+        """
+        Rewrite relationships of duplicate concepts to their canonical concept,
+        drop relationships made redundant by the merge, and delete the duplicates.
+        Of relationships that became identical, the first one with a
+        description survives and takes over the knowledge bundles of the
+        others. The caller commits.
+
+        Returns:
+        - Number of concepts merged away
+        """
+        if not plan:
+            return 0
+
+        duplicate_ids = list(plan.canonical)
+        for column, type_column in (
+            (Relationship.source_id, Relationship.source_type),
+            (Relationship.target_id, Relationship.target_type),
+        ):
+            db.execute(
+                update(Relationship)
+                .where(type_column == "Concept", column.in_(duplicate_ids))
+                .values({column.key: case(plan.canonical, value=column, else_=column)})
+                .execution_options(synchronize_session=False)
+            )
+
+        # the merge can turn distinct relationships into duplicates or self-loops
+        canonical_ids = list(set(plan.canonical.values()))
+        groups: Dict[tuple, list] = {}
+        redundant_ids = []
+        for rel in (
+            db.query(
+                Relationship.id,
+                Relationship.source_type,
+                Relationship.source_id,
+                Relationship.target_type,
+                Relationship.target_id,
+                Relationship.relationship_type,
+                Relationship.relationship_desc,
+                Relationship.knowledge_bundle,
+            )
+            .filter(
+                or_(
+                    Relationship.source_id.in_(canonical_ids),
+                    Relationship.target_id.in_(canonical_ids),
+                )
+            )
+            .order_by(Relationship.created_at, Relationship.id)
+        ):
+            key = (
+                rel.source_type,
+                rel.source_id,
+                rel.target_type,
+                rel.target_id,
+                rel.relationship_type,
+            )
+            is_self_loop = (
+                rel.source_type == rel.target_type and rel.source_id == rel.target_id
+            )
+            if is_self_loop:
+                redundant_ids.append(rel.id)
+            else:
+                groups.setdefault(key, []).append(rel)
+
+        bundle_updates = []
+        for group in groups.values():
+            if len(group) == 1:
+                continue
+            survivor = next((rel for rel in group if rel.relationship_desc), group[0])
+            bundle = list(survivor.knowledge_bundle or [])
+            for rel in group:
+                if rel is not survivor:
+                    redundant_ids.append(rel.id)
+                    bundle = merge_knowledge_bundles(bundle, rel.knowledge_bundle)
+            if bundle != (survivor.knowledge_bundle or []):
+                bundle_updates.append({"id": survivor.id, "knowledge_bundle": bundle})
+
+        if bundle_updates:
+            db.execute(update(Relationship), bundle_updates)
+        if redundant_ids:
+            db.execute(
+                delete(Relationship)
+                .where(Relationship.id.in_(redundant_ids))
+                .execution_options(synchronize_session=False)
+            )
+        db.execute(
+            delete(Concept)
+            .where(Concept.id.in_(duplicate_ids))
+            .execution_options(synchronize_session=False)
+        )
+
+        with self._lock:
+            if self._name_index is not None:
+                for ids in self._name_index.values():
+                    ids.difference_update(duplicate_ids)
+
+        logger.info(
+            f"Merged {len(duplicate_ids)} duplicate concepts into {len(canonical_ids)}, "
+            f"dropped {len(redundant_ids)} redundant relationships"
+        )
+        return len(duplicate_ids)
+
+    def resolve_and_apply(
+        self, db: Session, concept_ids: Optional[Iterable[str]] = None
+    ) -> MergePlan:
+        plan = self.resolve(db, concept_ids)
+        self.apply(db, plan)
+        return plan
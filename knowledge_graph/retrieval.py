@@ -0,0 +1,539 @@
+import time
+import threading
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+from sqlalchemy import or_
+
+from knowledge_graph.models import Concept, KnowledgeBlock, Relationship, SourceData
+from knowledge_graph.snapshot import GraphSnapshot
+from knowledge_graph.vector_store import TiDBVectorStore, VectorStore
+from setting.embedding import DEFAULT_EMBEDDING_MODEL, get_embedding_spec
+from setting.db import SessionLocal
+
+# how much a hit of each entity type counts before graph expansion
+DEFAULT_TYPE_WEIGHTS = {
+    "KnowledgeBlock": 1.0,
+    "Concept": 0.9,
+    "Relationship": 0.8,
+}
+
+# vector columns searched for every query
+SEARCHED_COLUMNS = [
+    "knowledge_blocks.content_vec",
+    "concepts.definition_vec",
+    "relationships.relationship_desc_vec",
+]
+
+
+@dataclass
+class RetrievalResult:
+    """One retrieved knowledge block, concept or relationship."""
+
+    id: str
+    type: str
+    name: str
+    content: str
+    score: float
+    hop: int = 0
+    # how the item was reached: seed id and relationship ids walked from it
+    path: List[str] = field(default_factory=list)
+    knowledge_bundle: List[Dict[str, Any]] = field(default_factory=list)
+
+
+class LatencyTracker:
+    """Rolling per-stage latency samples, for p50/p95 reporting."""
+
+    def __init__(self, window: int = 1000):
+        self._samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self._samples[stage].append(seconds)
+
+    def percentile(self, stage: str, q: float) -> Optional[float]:
+        with self._lock:
+            samples = list(self._samples.get(stage, ()))
+        if not samples:
+            return None
+        return float(np.percentile(samples, q))
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            stages = {stage: list(samples) for stage, samples in self._samples.items()}
+        return {
+            stage: {
+                "p50": float(np.percentile(samples, 50)),
+                "p95": float(np.percentile(samples, 95)),
+                "count": len(samples),
+            }
+            for stage, samples in stages.items()
+            if samples
+        }
+
+
+class Retriever:
+    """
+    Hybrid vector + graph retrieval.
+
+    1. ANN search over knowledge blocks, concepts and relationships, in parallel
+    2. Expansion of the hits along relationships for a bounded number of hops,
+       each hop multiplying the score by `hop_decay`
+    3. Ranking by the combined score, then hydration of the results in small
+       batches so the first ones stream back before the rest are loaded
+
+    Timings of every stage are kept in `last_timings` and in the rolling
+    `latency` tracker.
+    """
+
+    def __init__(
+        self,
+        embedding_func: Callable[[str], List[float]],
+        graph: Optional[GraphSnapshot] = None,
+        vector_store: Optional[VectorStore] = None,
+        type_weights: Optional[Dict[str, float]] = None,
+        hop_decay: float = 0.5,
+        max_expanded_nodes: int = 500,
+        hydrate_batch_size: int = 10,
+        embedding_model: str = DEFAULT_EMBEDDING_MODEL,
+    ):
+        """
+        Parameters:
+        - embedding_func: Embeds the query
+        - graph: Optional snapshot used for expansion, otherwise every hop is
+          one relationships query
+        - vector_store: Where the vector searches run, defaults to TiDB
+        - type_weights: Score weight of direct hits per entity type
+        - hop_decay: Score multiplier per hop away from a direct hit
+        - max_expanded_nodes: Cap on the nodes reached by graph expansion
+        - hydrate_batch_size: Results loaded (and yielded) per batch
+        - embedding_model: Model behind embedding_func; columns registered with
+          another model get the query embedded with their own
+        """
+        self.embedding_func = embedding_func
+        self.graph = graph
+        self.vector_store = vector_store or TiDBVectorStore()
+        self.type_weights = type_weights or DEFAULT_TYPE_WEIGHTS
+        self.hop_decay = hop_decay
+        self.max_expanded_nodes = max_expanded_nodes
+        self.hydrate_batch_size = hydrate_batch_size
+        self.embedding_model = embedding_model
+        self.latency = LatencyTracker()
+        self.last_timings: Dict[str, float] = {}
+        self._executor = ThreadPoolExecutor(max_workers=3)
+
+    @contextmanager
+    def _stage(self, timings: Dict[str, float], stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+            self.latency.record(stage, elapsed)
+
+    # ---- ANN search ----
+
+    def _embed_query(self, query: str) -> Dict[str, List[float]]:
+        """
+        Query vector per searched column, embedded once per registered model
+        and truncated like the column (see setting.embedding).
+        """
+        by_model: Dict[str, List[float]] = {}
+        query_vecs = {}
+        for key in SEARCHED_COLUMNS:
+            spec = get_embedding_spec(key)
+            if spec.model not in by_model:
+                if spec.model == self.embedding_model:
+                    by_model[spec.model] = self.embedding_func(query)
+                else:
+                    from llm.embedding import get_text_embedding
+
+                    by_model[spec.model] = get_text_embedding(query, model=spec.model)
+            query_vecs[key] = spec.prepare([by_model[spec.model]])[0]
+        return query_vecs
+
+    def _search_blocks(
+        self, query_vec, k: int, filters: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[str, str, float]]:
+        """(block id, source id, similarity) of the nearest knowledge blocks."""
+        hits = self.vector_store.search("knowledge_blocks", query_vec, k, filters)
+        return [
+            (block_id, metadata.get("source_id"), similarity)
+            for block_id, similarity, metadata in hits
+        ]
+
+    def _search_concepts(self, query_vec, k: int) -> List[Tuple[str, float]]:
+        """(concept id, similarity) of the nearest concepts."""
+        hits = self.vector_store.search("concepts", query_vec, k)
+        return [(concept_id, similarity) for concept_id, similarity, _ in hits]
+
+    def _search_relationships(
+        self, query_vec, k: int
+    ) -> List[Tuple[str, str, str, float]]:
+        """(relationship id, source id, target id, similarity) of the nearest relationships."""
+        hits = self.vector_store.search("relationships", query_vec, k)
+        return [
+            (rel_id, metadata.get("source_id"), metadata.get("target_id"), similarity)
+            for rel_id, similarity, metadata in hits
+        ]
+
+    # ---- graph expansion ----
+
+    def _neighbors(self, frontier: List[str]) -> List[Tuple[str, str, str]]:
+        """(node, neighbor, relationship id) for every edge touching the frontier."""
+        if self.graph is not None:
+            edges = []
+            for node_id in frontier:
+                if node_id not in self.graph:
+                    continue
+                node = self.graph.node_index(node_id)
+                for indptr, indices, edge_index in (
+                    (self.graph.indptr, self.graph.indices, self.graph.edge_index),
+                    (
+                        self.graph.rev_indptr,
+                        self.graph.rev_indices,
+                        self.graph.rev_edge_index,
+                    ),
+                ):
+                    start, end = indptr[node], indptr[node + 1]
+                    for neighbor, edge in zip(
+                        indices[start:end].tolist(), edge_index[start:end].tolist()
+                    ):
+                        edges.append(
+                            (
+                                node_id,
+                                self.graph.node_ids[neighbor],
+                                self.graph.relationship_ids[edge],
+                            )
+                        )
+            return edges
+
+        with SessionLocal() as db:
+            rows = (
+                db.query(Relationship.id, Relationship.source_id, Relationship.target_id)
+                .filter(
+                    or_(
+                        Relationship.source_id.in_(frontier),
+                        Relationship.target_id.in_(frontier),
+                    )
+                )
+                .all()
+            )
+        frontier_set = set(frontier)
+        edges = []
+        for rel_id, source_id, target_id in rows:
+            if source_id in frontier_set:
+                edges.append((source_id, target_id, rel_id))
+            if target_id in frontier_set:
+                edges.append((target_id, source_id, rel_id))
+        return edges
+
+    def _expand(
+        self, seeds: Dict[str, Tuple[float, List[str]]], hops: int
+    ) -> Dict[str, Tuple[float, int, List[str]]]:
+        """
+        Propagate seed scores along relationships.
+
+        Returns:
+        - node id -> (best score, hop, path) for every node reached, seeds included;
+          edges traversed on the way are returned as nodes too, keyed by their id
+        """
+        reached = {node_id: (score, 0, path) for node_id, (score, path) in seeds.items()}
+        frontier = list(seeds)
+        for hop in range(1, hops + 1):
+            if not frontier or len(reached) >= self.max_expanded_nodes:
+                break
+            next_frontier = {}
+            for node_id, neighbor_id, rel_id in self._neighbors(frontier):
+                score, _, path = reached[node_id]
+                new_score = score * self.hop_decay
+                new_path = path + [rel_id]
+                # the relationship itself is a result, scored like the node it leads to
+                if rel_id not in reached or reached[rel_id][0] < new_score:
+                    reached[rel_id] = (new_score, hop, new_path)
+                if neighbor_id in reached and reached[neighbor_id][0] >= new_score:
+                    continue
+                if neighbor_id not in reached and len(reached) >= self.max_expanded_nodes:
+                    continue
+                reached[neighbor_id] = (new_score, hop, new_path)
+                next_frontier[neighbor_id] = True
+            frontier = list(next_frontier)
+        return reached
+
+    # ---- hydration ----
+
+    def _hydrate(
+        self, ranked: List[Tuple[str, float, int, List[str]]]
+    ) -> List[RetrievalResult]:
+        """Load content and provenance of a batch of ranked ids, in a few queries."""
+        ids = [item_id for item_id, _, _, _ in ranked]
+        found: Dict[str, RetrievalResult] = {}
+        with SessionLocal() as db:
+            blocks = (
+                db.query(
+                    KnowledgeBlock.id,
+                    KnowledgeBlock.name,
+                    KnowledgeBlock.content,
+                    KnowledgeBlock.context,
+                    KnowledgeBlock.source_id,
+                    KnowledgeBlock.source_version,
+                )
+                .filter(KnowledgeBlock.id.in_(ids))
+                .all()
+            )
+            concepts = (
+                db.query(Concept.id, Concept.name, Concept.definition)
+                .filter(Concept.id.in_(ids))
+                .all()
+            )
+            relationships = (
+                db.query(
+                    Relationship.id,
+                    Relationship.source_id,
+                    Relationship.target_id,
+                    Relationship.relationship_type,
+                    Relationship.relationship_desc,
+                    Relationship.knowledge_bundle,
+                )
+                .filter(Relationship.id.in_(ids))
+                .all()
+            )
+
+            # sources of blocks, and SOURCE_OF sources of concepts, for provenance
+            concept_sources: Dict[str, List[str]] = defaultdict(list)
+            if concepts:
+                for concept_id, source_id in db.query(
+                    Relationship.source_id, Relationship.target_id
+                ).filter(
+                    Relationship.source_id.in_([c.id for c in concepts]),
+                    Relationship.relationship_type == "SOURCE_OF",
+                    Relationship.target_type == "SourceData",
+                ):
+                    concept_sources[concept_id].append(source_id)
+            source_ids = {block.source_id for block in blocks} | {
+                source_id for ids_ in concept_sources.values() for source_id in ids_
+            }
+            sources = {}
+            if source_ids:
+                for source in db.query(
+                    SourceData.id, SourceData.name, SourceData.link, SourceData.version
+                ).filter(SourceData.id.in_(source_ids)):
+                    sources[source.id] = {
+                        "id": source.id,
+                        "name": source.name,
+                        "link": source.link,
+                        "version": source.version,
+                    }
+
+        for block in blocks:
+            found[block.id] = RetrievalResult(
+                id=block.id,
+                type="KnowledgeBlock",
+                name=block.name,
+                content=(
+                    f"<context>\n{block.context}</context>\n\n{block.content}"
+                    if block.context
+                    else block.content
+                ),
+                score=0.0,
+                knowledge_bundle=[sources[block.source_id]]
+                if block.source_id in sources
+                else [],
+            )
+        for concept in concepts:
+            found[concept.id] = RetrievalResult(
+                id=concept.id,
+                type="Concept",
+                name=concept.name,
+                content=concept.definition or "",
+                score=0.0,
+                knowledge_bundle=[
+                    sources[source_id]
+                    for source_id in concept_sources.get(concept.id, [])
+                    if source_id in sources
+                ],
+            )
+        for rel in relationships:
+            found[rel.id] = RetrievalResult(
+                id=rel.id,
+                type="Relationship",
+                name=rel.relationship_type,
+                content=rel.relationship_desc or "",
+                score=0.0,
+                knowledge_bundle=rel.knowledge_bundle or [],
+            )
+
+        results = []
+        for item_id, score, hop, path in ranked:
+            result = found.get(item_id)
+            if result is None:
+                # source documents and other entity types are only traversed
+                continue
+            result.score = score
+            result.hop = hop
+            result.path = path
+            results.append(result)
+        return results
+
+    # ---- entry point ----
+
+    def retrieve(
+        self,
+        query: str,
+        k: int = 10,
+        hops: int = 1,
+        seed_k: Optional[int] = None,
+        block_filters: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[RetrievalResult]:
+        """
+        Retrieve the k best knowledge blocks, concepts and relationships for a query.
+
+        Parameters:
+        - query: Natural language query
+        - k: Number of results
+        - hops: Relationship hops expanded from the vector search hits
+        - seed_k: Hits fetched per vector search, defaults to k
+        - block_filters: Column filters on the knowledge block search, e.g.
+          {"knowledge_type": "paragraph", "source_version": "1.0"}
+
+        Returns:
+        - Results in descending score order, yielded as soon as each batch is loaded
+        """
+        timings: Dict[str, float] = {}
+        self.last_timings = timings
+        seed_k = seed_k or k
+
+        with self._stage(timings, "embed"):
+            query_vecs = self._embed_query(query)
+
+        with self._stage(timings, "ann"):
+            block_future = self._executor.submit(
+                self._search_blocks,
+                query_vecs["knowledge_blocks.content_vec"],
+                seed_k,
+                block_filters,
+            )
+            concept_future = self._executor.submit(
+                self._search_concepts, query_vecs["concepts.definition_vec"], seed_k
+            )
+            rel_future = self._executor.submit(
+                self._search_relationships,
+                query_vecs["relationships.relationship_desc_vec"],
+                seed_k,
+            )
+            block_hits = block_future.result()
+            concept_hits = concept_future.result()
+            rel_hits = rel_future.result()
+
+        # seeds: hit entities plus the graph nodes they hang off
+        seeds: Dict[str, Tuple[float, List[str]]] = {}
+
+        def add_seed(node_id: str, score: float, path: List[str]):
+            if node_id not in seeds or seeds[node_id][0] < score:
+                seeds[node_id] = (score, path)
+
+        for block_id, source_id, similarity in block_hits:
+            score = similarity * self.type_weights.get("KnowledgeBlock", 1.0)
+            add_seed(block_id, score, [block_id])
+            if source_id:
+                add_seed(source_id, score, [block_id])
+        for concept_id, similarity in concept_hits:
+            add_seed(
+                concept_id,
+                similarity * self.type_weights.get("Concept", 1.0),
+                [concept_id],
+            )
+        for rel_id, source_id, target_id, similarity in rel_hits:
+            score = similarity * self.type_weights.get("Relationship", 1.0)
+            add_seed(rel_id, score, [rel_id])
+            for node_id in (source_id, target_id):
+                if node_id:
+                    add_seed(node_id, score, [rel_id])
+
+        with self._stage(timings, "expand"):
+            reached = self._expand(seeds, hops)
+
+        with self._stage(timings, "rank"):
+            ranked = sorted(
+                (
+                    (item_id, score, hop, path)
+                    for item_id, (score, hop, path) in reached.items()
+                ),
+                key=lambda item: (-item[1], item[2], item[0]),
+            )
+
+        # hydrate in batches until k results came out, skipping traversal-only nodes
+        emitted = 0
+        position = 0
+        while emitted < k and position < len(ranked):
+            batch = ranked[position : position + max(self.hydrate_batch_size, k - emitted)]
+            position += len(batch)
+            with self._stage(timings, "hydrate"):
+                results = self._hydrate(batch)
+            for result in results[: k - emitted]:
+                emitted += 1
+                yield result
+
+        # time spent by the consumer between results is not retrieval latency
+        timings["total"] = sum(timings.values())
+        self.latency.record("total", timings["total"])
+        logger.debug(f"Retrieval timings for {query!r}: {timings}")
+
+
+# Retrievers shared by retrieve(), per (embedding_func, graph, vector_store);
+# least recently used ones beyond the limit are dropped, and their executor
+# threads exit once the last running retrieval lets go of them
+_retrievers: "OrderedDict[Tuple[Any, Any, Any], Retriever]" = OrderedDict()
+_retrievers_lock = threading.Lock()
+MAX_SHARED_RETRIEVERS = 8
+
+
+def _shared_retriever(
+    embedding_func: Optional[Callable[[str], List[float]]],
+    graph: Optional[GraphSnapshot],
+    vector_store: Optional[VectorStore],
+) -> Retriever:
+    if embedding_func is None:
+        from llm.embedding import get_text_embedding
+
+        embedding_func = get_text_embedding
+    key = (embedding_func, graph, vector_store)
+    with _retrievers_lock:
+        retriever = _retrievers.get(key)
+        if retriever is None:
+            retriever = Retriever(embedding_func, graph=graph, vector_store=vector_store)
+            _retrievers[key] = retriever
+            while len(_retrievers) > MAX_SHARED_RETRIEVERS:
+                _retrievers.popitem(last=False)
+        else:
+            _retrievers.move_to_end(key)
+        return retriever
+
+
+def retrieve(
+    query: str,
+    k: int = 10,
+    hops: int = 1,
+    embedding_func: Optional[Callable[[str], List[float]]] = None,
+    graph: Optional[GraphSnapshot] = None,
+    block_filters: Optional[Dict[str, Any]] = None,
+    vector_store: Optional[VectorStore] = None,
+) -> Iterator[RetrievalResult]:
+    """
+    Retrieve knowledge for a query with a shared Retriever.
+
+    Calls with the same embedding_func, graph and vector_store reuse one
+    Retriever (and its thread pool and latency tracker), so pass the same
+    objects on every call; a fresh graph snapshot or store per call defeats
+    the cache. Hold a Retriever of your own for non-default settings.
+    """
+    return _shared_retriever(embedding_func, graph, vector_store).retrieve(
+        query, k=k, hops=hops, block_filters=block_filters
+    )
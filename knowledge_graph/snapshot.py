@@ -0,0 +1,382 @@
+import json
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from knowledge_graph.models import Concept, Relationship, SourceData
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+
+class GraphSnapshot:
+    """
+    Read-only, array-backed copy of the knowledge graph.
+
+    Node ids are interned to ints, relationship types to small-int codes, and
+    adjacency is stored as CSR arrays in both directions, so neighbor lookups
+    and k-hop expansion are array slices instead of database round trips.
+
+    Edge arrays (out direction, sorted by source node):
+    - indptr[i]:indptr[i+1] is the slice of out-edges of node i
+    - indices: target node of each edge
+    - edge_types: relationship type code of each edge
+    - edge_index: position of the edge in `relationship_ids`
+    The in direction uses rev_indptr/rev_indices/rev_edge_index the same way.
+    """
+
+    def __init__(
+        self,
+        node_ids: List[str],
+        node_names: List[str],
+        node_type_codes: np.ndarray,
+        node_types: List[str],
+        relationship_ids: List[str],
+        relationship_types: List[str],
+        sources: np.ndarray,
+        targets: np.ndarray,
+        type_codes: np.ndarray,
+    ):
+        self.node_ids = node_ids
+        self.node_names = node_names
+        self.node_type_codes = node_type_codes
+        self.node_types = node_types
+        self.relationship_ids = relationship_ids
+        self.relationship_types = relationship_types
+        self._node_index = {node_id: i for i, node_id in enumerate(node_ids)}
+        self._type_index = {name: i for i, name in enumerate(relationship_types)}
+
+        self.edge_sources = sources
+        self.edge_targets = targets
+        self.edge_type_codes = type_codes
+
+        n = len(node_ids)
+        self.indptr, self.indices, self.edge_index = self._build_csr(n, sources, targets)
+        self.rev_indptr, self.rev_indices, self.rev_edge_index = self._build_csr(
+            n, targets, sources
+        )
+        self.edge_types = type_codes[self.edge_index]
+        self.rev_edge_types = type_codes[self.rev_edge_index]
+
+    @staticmethod
+    def _build_csr(
+        num_nodes: int, rows: np.ndarray, cols: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        order = np.argsort(rows, kind="stable").astype(np.int64)
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=num_nodes), out=indptr[1:])
+        return indptr, cols[order].astype(np.int32), order
+
+    # ---- construction ----
+
+    @classmethod
+    def from_db(cls, db: Session) -> "GraphSnapshot":
+        """
+        Bulk-load concepts, source documents and all relationships.
+
+        Relationship endpoints of other entity types (e.g. knowledge blocks) are
+        added as nodes without a name.
+        """
+        node_ids: List[str] = []
+        node_names: List[str] = []
+        node_type_codes: List[int] = []
+        node_types: List[str] = []
+        node_index: Dict[str, int] = {}
+        node_type_index: Dict[str, int] = {}
+
+        def intern(node_id: str, node_type: str, name: str = "") -> int:
+            i = node_index.get(node_id)
+            if i is None:
+                i = node_index[node_id] = len(node_ids)
+                node_ids.append(node_id)
+                node_names.append(name)
+                type_code = node_type_index.get(node_type)
+                if type_code is None:
+                    type_code = node_type_index[node_type] = len(node_types)
+                    node_types.append(node_type)
+                node_type_codes.append(type_code)
+            return i
+
+        for concept_id, name in db.query(Concept.id, Concept.name).yield_per(10000):
+            intern(concept_id, "Concept", name)
+        for source_id, name in db.query(SourceData.id, SourceData.name).yield_per(
+            10000
+        ):
+            intern(source_id, "SourceData", name)
+
+        relationship_ids: List[str] = []
+        relationship_types: List[str] = []
+        type_index: Dict[str, int] = {}
+        sources: List[int] = []
+        targets: List[int] = []
+        type_codes: List[int] = []
+        for rel in db.query(
+            Relationship.id,
+            Relationship.source_type,
+            Relationship.source_id,
+            Relationship.target_type,
+            Relationship.target_id,
+            Relationship.relationship_type,
+        ).yield_per(10000):
+            code = type_index.get(rel.relationship_type)
+            if code is None:
+                code = type_index[rel.relationship_type] = len(relationship_types)
+                relationship_types.append(rel.relationship_type)
+            relationship_ids.append(rel.id)
+            sources.append(intern(rel.source_id, rel.source_type))
+            targets.append(intern(rel.target_id, rel.target_type))
+            type_codes.append(code)
+
+        return cls(
+            node_ids=node_ids,
+            node_names=node_names,
+            node_type_codes=np.asarray(node_type_codes, dtype=np.int8),
+            node_types=node_types,
+            relationship_ids=relationship_ids,
+            relationship_types=relationship_types,
+            sources=np.asarray(sources, dtype=np.int32),
+            targets=np.asarray(targets, dtype=np.int32),
+            type_codes=np.asarray(type_codes, dtype=np.int16),
+        )
+
+    # ---- persistence ----
+
+    def save(self, path: str):
+        """Write the snapshot to one .npz file (strings go into a JSON header)."""
+        meta = json.dumps(
+            {
+                "version": SNAPSHOT_FORMAT_VERSION,
+                "node_ids": self.node_ids,
+                "node_names": self.node_names,
+                "node_types": self.node_types,
+                "relationship_ids": self.relationship_ids,
+                "relationship_types": self.relationship_types,
+            },
+            ensure_ascii=False,
+        ).encode("utf-8")
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                meta=np.frombuffer(meta, dtype=np.uint8),
+                node_type_codes=self.node_type_codes,
+                sources=self.edge_sources,
+                targets=self.edge_targets,
+                type_codes=self.edge_type_codes,
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "GraphSnapshot":
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+            if meta.get("version") != SNAPSHOT_FORMAT_VERSION:
+                raise ValueError(
+                    f"Unsupported graph snapshot version {meta.get('version')} in {path}"
+                )
+            return cls(
+                node_ids=meta["node_ids"],
+                node_names=meta["node_names"],
+                node_type_codes=data["node_type_codes"],
+                node_types=meta["node_types"],
+                relationship_ids=meta["relationship_ids"],
+                relationship_types=meta["relationship_types"],
+                sources=data["sources"],
+                targets=data["targets"],
+                type_codes=data["type_codes"],
+            )
+
+    # ---- lookups ----
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.relationship_ids)
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self._node_index
+
+    def node_index(self, node_id: str) -> int:
+        return self._node_index[node_id]
+
+    def node_type(self, node_id: str) -> str:
+        return self.node_types[self.node_type_codes[self._node_index[node_id]]]
+
+    def node_name(self, node_id: str) -> str:
+        return self.node_names[self._node_index[node_id]]
+
+    def relationship_type_codes(self, relationship_types: Iterable[str]) -> np.ndarray:
+        return np.asarray(
+            [
+                self._type_index[name]
+                for name in relationship_types
+                if name in self._type_index
+            ],
+            dtype=np.int16,
+        )
+
+    def _expand(
+        self,
+        frontier: np.ndarray,
+        direction: str,
+        type_codes: Optional[np.ndarray],
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """All (neighbor node, edge) pairs of the frontier nodes, as two arrays."""
+        if direction == "out":
+            layouts = [(self.indptr, self.indices, self.edge_index, self.edge_types)]
+        elif direction == "in":
+            layouts = [
+                (
+                    self.rev_indptr,
+                    self.rev_indices,
+                    self.rev_edge_index,
+                    self.rev_edge_types,
+                )
+            ]
+        elif direction == "both":
+            layouts = [
+                (self.indptr, self.indices, self.edge_index, self.edge_types),
+                (
+                    self.rev_indptr,
+                    self.rev_indices,
+                    self.rev_edge_index,
+                    self.rev_edge_types,
+                ),
+            ]
+        else:
+            raise ValueError(f"Unknown direction: {direction}")
+
+        neighbors = []
+        edges = []
+        for indptr, indices, edge_index, edge_types in layouts:
+            starts, ends = indptr[frontier], indptr[frontier + 1]
+            lengths = ends - starts
+            if lengths.sum() == 0:
+                continue
+            # positions of all edges of the frontier, without a Python loop per node
+            positions = np.repeat(
+                starts - (lengths.cumsum() - lengths), lengths
+            ) + np.arange(lengths.sum())
+            if type_codes is not None:
+                positions = positions[np.isin(edge_types[positions], type_codes)]
+            neighbors.append(indices[positions])
+            edges.append(edge_index[positions])
+
+        if not neighbors:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        return np.concatenate(neighbors), np.concatenate(edges)
+
+    def neighbors(
+        self,
+        node_id: str,
+        relationship_types: Optional[Iterable[str]] = None,
+        direction: str = "both",
+    ) -> List[Tuple[str, str]]:
+        """
+        Parameters:
+        - node_id: Node to look up
+        - relationship_types: Only follow these relationship types (all if None)
+        - direction: "out", "in" or "both"
+
+        Returns:
+        - (neighbor id, relationship type) of every matching edge
+        """
+        if node_id not in self._node_index:
+            return []
+        type_codes = (
+            self.relationship_type_codes(relationship_types)
+            if relationship_types is not None
+            else None
+        )
+        frontier = np.asarray([self._node_index[node_id]], dtype=np.int64)
+        neighbors, edges = self._expand(frontier, direction, type_codes)
+        return [
+            (
+                self.node_ids[neighbor],
+                self.relationship_types[self.edge_type_codes[edge]],
+            )
+            for neighbor, edge in zip(neighbors.tolist(), edges.tolist())
+        ]
+
+    def k_hop(
+        self,
+        seeds: Sequence[str],
+        k: int = 1,
+        relationship_types: Optional[Iterable[str]] = None,
+        direction: str = "both",
+        max_nodes: Optional[int] = None,
+    ) -> Tuple[Dict[str, int], List[str]]:
+        """
+        Breadth-first expansion from the seed nodes.
+
+        Parameters:
+        - seeds: Node ids to start from (unknown ids are ignored)
+        - k: Number of hops
+        - relationship_types: Only follow these relationship types (all if None)
+        - direction: "out", "in" or "both"
+        - max_nodes: Stop adding nodes once this many have been reached
+
+        Returns:
+        - Reached node id -> hop distance (seeds are 0), and the ids of the
+          relationships traversed
+        """
+        type_codes = (
+            self.relationship_type_codes(relationship_types)
+            if relationship_types is not None
+            else None
+        )
+        frontier = np.unique(
+            np.asarray(
+                [self._node_index[seed] for seed in seeds if seed in self._node_index],
+                dtype=np.int64,
+            )
+        )
+        distance = np.full(len(self.node_ids), -1, dtype=np.int32)
+        distance[frontier] = 0
+        reached = len(frontier)
+        traversed = set()
+
+        for hop in range(1, k + 1):
+            if len(frontier) == 0 or (max_nodes is not None and reached >= max_nodes):
+                break
+            neighbors, edges = self._expand(frontier, direction, type_codes)
+            traversed.update(edges.tolist())
+            neighbors = np.unique(neighbors)
+            new_nodes = neighbors[distance[neighbors] < 0]
+            if max_nodes is not None:
+                new_nodes = new_nodes[: max(0, max_nodes - reached)]
+            distance[new_nodes] = hop
+            reached += len(new_nodes)
+            frontier = new_nodes.astype(np.int64)
+
+        reached_nodes = np.flatnonzero(distance >= 0)
+        # keep only edges whose both ends were reached
+        edge_list = [
+            edge
+            for edge in sorted(traversed)
+            if distance[self.edge_sources[edge]] >= 0
+            and distance[self.edge_targets[edge]] >= 0
+        ]
+        return (
+            {self.node_ids[i]: int(distance[i]) for i in reached_nodes.tolist()},
+            [self.relationship_ids[edge] for edge in edge_list],
+        )
+
+    def edge(self, relationship_position: int) -> Dict[str, str]:
+        """Source, target and type of the relationship at a position of relationship_ids."""
+        return {
+            "id": self.relationship_ids[relationship_position],
+            "source_id": self.node_ids[self.edge_sources[relationship_position]],
+            "target_id": self.node_ids[self.edge_targets[relationship_position]],
+            "relationship_type": self.relationship_types[
+                self.edge_type_codes[relationship_position]
+            ],
+        }
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "nodes": len(self.node_ids),
+            "edges": self.num_edges,
+            "relationship_types": len(self.relationship_types),
+        }
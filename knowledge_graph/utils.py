@@ -1,7 +1,15 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
 from loguru import logger
 import boto3
+from botocore.config import Config
 
 from llm.providers.bedrock import BedrockProvider
+from llm.rate_limit import RateLimiter, get_rate_limiter
+from llm.retry import RetryPolicy, is_throttling_error
+from utils.token import estimate_tokens
 
 DOCUMENT_CONTEXT_PROMPT = """
 <document>
@@ -19,13 +27,42 @@ Please give a short succinct context to situate this chunk within the overall do
 Answer only with the succinct context and nothing else.
 """
 
+DEFAULT_CONTEXT_MODEL = "us.anthropic.claude-3-7-sonnet-20250219-v1:0"
+
+USAGE_KEYS = (
+    "inputTokens",
+    "outputTokens",
+    "cacheWriteInputTokens",
+    "cacheReadInputTokens",
+)
+
+
+def block_embedding_text(content: str, context: Optional[str] = None) -> str:
+    """Text embedded into a knowledge block's content_vec."""
+    if context:
+        return f"<context>\n{context}</context>\n\n{content}"
+    return content
+
+
+@lru_cache(maxsize=1)
+def get_bedrock_client(max_pool_connections: int = 32):
+    """
+    Return a process-wide bedrock-runtime client.
 
-def gen_situate_context(
-    doc: str, chunk: str, model: str = "us.anthropic.claude-3-7-sonnet-20250219-v1:0"
-) -> str:
+    boto3 clients are thread-safe, so a single client with a large enough
+    connection pool is shared by every context generation worker.
+    """
     credentials = BedrockProvider.get_credentials()
-    client = boto3.client("bedrock-runtime", **credentials)
+    return boto3.client(
+        "bedrock-runtime",
+        config=Config(max_pool_connections=max_pool_connections),
+        **credentials,
+    )
+
 
+def _converse_situate_context(
+    client, doc: str, chunk: str, model: str
+) -> Tuple[str, Dict[str, int]]:
     messages = [
         {
             "role": "user",
@@ -45,14 +82,7 @@ def gen_situate_context(
         },
         messages=messages,
     )
-    logger.debug(f"Input tokens: {response['usage']['inputTokens']}")
-    logger.debug(f"Output tokens: {response['usage']['outputTokens']}")
-    logger.debug(
-        f"Cache creation input tokens: {response['usage']['cacheWriteInputTokens']}"
-    )
-    logger.debug(
-        f"Cache read input tokens: {response['usage']['cacheReadInputTokens']}"
-    )
+    usage = {key: response["usage"].get(key, 0) for key in USAGE_KEYS}
 
     answer = None
     reasoning = None
@@ -62,6 +92,89 @@ def gen_situate_context(
         elif "reasoningContent" in message:
             reasoning = message["reasoningContent"]["reasoningText"]["text"]
     if reasoning:
-        return f"<think>{reasoning}</think>\n{answer}"
+        return f"<think>{reasoning}</think>\n{answer}", usage
     else:
-        return answer
+        return answer, usage
+
+
+def gen_situate_context(doc: str, chunk: str, model: str = DEFAULT_CONTEXT_MODEL) -> str:
+    answer, usage = _converse_situate_context(get_bedrock_client(), doc, chunk, model)
+    logger.debug(f"Input tokens: {usage['inputTokens']}")
+    logger.debug(f"Output tokens: {usage['outputTokens']}")
+    logger.debug(f"Cache creation input tokens: {usage['cacheWriteInputTokens']}")
+    logger.debug(f"Cache read input tokens: {usage['cacheReadInputTokens']}")
+    return answer
+
+
+def gen_situate_contexts(
+    doc: str,
+    chunks: List[str],
+    model: str = DEFAULT_CONTEXT_MODEL,
+    max_workers: int = 8,
+    rate_limiter: Optional[RateLimiter] = None,
+    retry_policy: Optional[RetryPolicy] = None,
+) -> Tuple[List[str], Dict[str, int]]:
+    """
+    Generate situated contexts for all chunks of one document concurrently.
+
+    The first chunk is sent alone so that the document prefix is written to the
+    prompt cache before the remaining chunks are sent in parallel and read it.
+
+    Parameters:
+    - doc: Full document content
+    - chunks: Chunk contents to situate within the document
+    - model: Bedrock model id
+    - max_workers: Maximum number of concurrent requests
+    - rate_limiter: Optional limiter shared between documents, defaults to the
+      limiter registered for the bedrock model
+    - retry_policy: Retry policy for transient errors of each request
+
+    Returns:
+    - Tuple of (contexts in chunk order, summed token usage for the document)
+    """
+    client = get_bedrock_client()
+    if rate_limiter is None:
+        rate_limiter = get_rate_limiter("bedrock", model)
+    retry_policy = retry_policy or RetryPolicy()
+    usage_total = {key: 0 for key in USAGE_KEYS}
+    if not chunks:
+        return [], usage_total
+
+    def attempt(chunk: str) -> Tuple[str, Dict[str, int]]:
+        if rate_limiter is None:
+            return _converse_situate_context(client, doc, chunk, model)
+
+        rate_limiter.acquire(estimate_tokens(doc) + estimate_tokens(chunk))
+        try:
+            result = _converse_situate_context(client, doc, chunk, model)
+        except Exception as e:
+            if is_throttling_error(e):
+                rate_limiter.on_throttle()
+            raise
+        rate_limiter.on_success()
+        return result
+
+    def situate(chunk: str) -> Tuple[str, Dict[str, int]]:
+        return retry_policy.call(attempt, chunk)
+
+    results = [situate(chunks[0])]
+    if len(chunks) > 1:
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(max_workers, len(chunks) - 1))
+        ) as executor:
+            results.extend(executor.map(situate, chunks[1:]))
+
+    contexts = []
+    for answer, usage in results:
+        contexts.append(answer)
+        for key in USAGE_KEYS:
+            usage_total[key] += usage[key]
+
+    logger.info(
+        f"Situated {len(chunks)} chunks, "
+        f"input tokens: {usage_total['inputTokens']}, "
+        f"output tokens: {usage_total['outputTokens']}, "
+        f"cache write tokens: {usage_total['cacheWriteInputTokens']}, "
+        f"cache read tokens: {usage_total['cacheReadInputTokens']}"
+    )
+    return contexts, usage_total
@@ -0,0 +1,230 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from loguru import logger
+from sqlalchemy import and_, or_, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from knowledge_graph.models import BestPractice, Concept, KnowledgeBlock, Relationship
+
+# TiDB distance function per metric; a vector index only serves the metric it was built for
+DISTANCE_FUNCTIONS = {
+    "cosine": "VEC_COSINE_DISTANCE",
+    "l2": "VEC_L2_DISTANCE",
+}
+
+
+@dataclass(frozen=True)
+class VectorIndexSpec:
+    table: str
+    column: str
+    metric: str = "cosine"
+
+    @property
+    def name(self) -> str:
+        return f"vec_idx_{self.column}_{self.metric}"
+
+    def ddl(self) -> str:
+        if self.metric not in DISTANCE_FUNCTIONS:
+            raise ValueError(f"Unsupported vector index metric: {self.metric}")
+        return (
+            f"ALTER TABLE {self.table} ADD VECTOR INDEX {self.name} "
+            f"(({DISTANCE_FUNCTIONS[self.metric]}({self.column}))) USING HNSW"
+        )
+
+
+def column_name(vector_column) -> str:
+    """Physical name of a mapped column, which the embedding registry may remap."""
+    return vector_column.property.columns[0].name
+
+
+# every vector column of the schema, indexed for cosine similarity
+VECTOR_INDEXES = [
+    VectorIndexSpec(
+        KnowledgeBlock.__tablename__, column_name(KnowledgeBlock.content_vec)
+    ),
+    VectorIndexSpec(Concept.__tablename__, column_name(Concept.definition_vec)),
+    VectorIndexSpec(
+        Relationship.__tablename__, column_name(Relationship.relationship_desc_vec)
+    ),
+    VectorIndexSpec(
+        BestPractice.__tablename__, column_name(BestPractice.guideline_vec)
+    ),
+]
+
+
+def ensure_tiflash_replica(engine: Engine, table: str, replicas: int = 1):
+    """Vector indexes are built on TiFlash, so the table needs a TiFlash replica."""
+    with engine.begin() as conn:
+        current = conn.execute(
+            text(
+                "SELECT REPLICA_COUNT FROM information_schema.tiflash_replica "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+            ),
+            {"table": table},
+        ).scalar()
+        if current is not None and current >= replicas:
+            return
+        logger.info(f"Setting {replicas} TiFlash replica(s) for {table}")
+        conn.execute(text(f"ALTER TABLE {table} SET TIFLASH REPLICA {int(replicas)}"))
+
+
+def existing_indexes(engine: Engine, table: str) -> set:
+    with engine.connect() as conn:
+        return {row.Key_name for row in conn.execute(text(f"SHOW INDEX FROM {table}"))}
+
+
+def create_vector_indexes(
+    engine: Engine,
+    specs: Optional[Iterable[VectorIndexSpec]] = None,
+    replicas: int = 1,
+) -> List[str]:
+    """
+    Create the HNSW vector indexes (and the TiFlash replicas they need) that
+    don't exist yet.
+
+    Parameters:
+    - engine: Engine of the TiDB database
+    - specs: Indexes to create, defaults to VECTOR_INDEXES
+    - replicas: TiFlash replica count for the indexed tables
+
+    Returns:
+    - Names of the indexes created
+    """
+    created = []
+    for spec in specs or VECTOR_INDEXES:
+        ensure_tiflash_replica(engine, spec.table, replicas)
+        if spec.name in existing_indexes(engine, spec.table):
+            continue
+        logger.info(f"Creating vector index {spec.name} on {spec.table}")
+        with engine.begin() as conn:
+            conn.execute(text(spec.ddl()))
+        created.append(spec.name)
+    return created
+
+
+def drop_vector_index(engine: Engine, spec: VectorIndexSpec):
+    if spec.name not in existing_indexes(engine, spec.table):
+        return
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {spec.table} DROP INDEX {spec.name}"))
+
+
+def vector_index_status(engine: Engine) -> List[Dict[str, Any]]:
+    """Build progress of the vector indexes, as reported by TiFlash."""
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(
+                "SELECT TABLE_NAME, INDEX_NAME, ROWS_STABLE_INDEXED, "
+                "ROWS_STABLE_NOT_INDEXED, ROWS_DELTA_INDEXED, ROWS_DELTA_NOT_INDEXED, "
+                "ERROR_MESSAGE FROM information_schema.tiflash_indexes "
+                "WHERE TIDB_DATABASE = DATABASE()"
+            )
+        )
+        return [dict(row._mapping) for row in rows]
+
+
+def _distance(vector_column, query_vec, metric: str):
+    if metric == "cosine":
+        return vector_column.cosine_distance(query_vec)
+    if metric == "l2":
+        return vector_column.l2_distance(query_vec)
+    raise ValueError(f"Unsupported vector distance metric: {metric}")
+
+
+def vector_search(
+    db: Session,
+    vector_column,
+    query_vec: Sequence[float],
+    k: int,
+    columns: Sequence[Any] = (),
+    filters: Optional[Dict[str, Any]] = None,
+    metric: str = "cosine",
+    oversample: int = 4,
+    prefilter: bool = False,
+) -> List[Any]:
+    """
+    K-nearest-neighbor search in a form TiDB can serve from the vector index.
+
+    The index is only used for a bare `ORDER BY <distance> LIMIT k`, so filters
+    are applied to an oversampled KNN result in an outer query:
+
+        SELECT ... FROM (
+            SELECT ..., VEC_COSINE_DISTANCE(col, :vec) AS distance FROM t
+            ORDER BY distance LIMIT k * oversample
+        ) WHERE <filters> ORDER BY distance LIMIT k
+
+    Rows without a vector are not in the index, but a full scan (no TiFlash
+    replica, an index still building, a metric without an index) sorts their
+    NULL distances first, where they would crowd the real hits out of the
+    LIMIT. When the KNN result holds any, the search is repeated with an
+    explicit `IS NOT NULL` predicate.
+
+    Parameters:
+    - db: Session
+    - vector_column: Mapped vector column, e.g. KnowledgeBlock.content_vec
+    - query_vec: Query vector
+    - k: Number of rows to return
+    - columns: Mapped columns to return besides `distance`
+    - filters: Column name -> value (or list of values) that rows must match
+    - metric: "cosine" or "l2", must match the index for it to be used
+    - oversample: Rows fetched by the KNN per returned row when filtering
+    - prefilter: Apply the filters before the KNN instead (exact scan, only
+      worth it when the filters are very selective)
+
+    Returns:
+    - Rows with the requested columns and `distance`, nearest first
+    """
+    table = vector_column.class_
+    distance = _distance(vector_column, query_vec, metric).label("distance")
+    filters = filters or {}
+
+    def conditions(source):
+        clauses = []
+        for name, value in filters.items():
+            column = source[name]
+            if isinstance(value, (list, tuple, set)):
+                clauses.append(column.in_(list(value)))
+            else:
+                clauses.append(column == value)
+        return clauses
+
+    if prefilter:
+        query = (
+            select(*columns, distance)
+            .where(vector_column.isnot(None), *conditions(table.__table__.c))
+            .order_by(distance)
+            .limit(k)
+        )
+        return db.execute(query).all()
+
+    filter_columns = [
+        table.__table__.c[name]
+        for name in filters
+        if name not in {column.key for column in columns}
+    ]
+
+    def search(*where):
+        knn = (
+            select(*columns, *filter_columns, distance)
+            .where(*where)
+            .order_by(distance)
+            .limit(k * max(1, oversample) if filters else k)
+            .subquery()
+        )
+        query = (
+            select(*[knn.c[column.key] for column in columns], knn.c.distance)
+            # NULL distances sort first, so the first row tells whether the KNN saw any
+            .order_by(knn.c.distance.isnot(None), knn.c.distance)
+            .limit(k)
+        )
+        clauses = conditions(knn.c)
+        if clauses:
+            query = query.where(or_(knn.c.distance.is_(None), and_(*clauses)))
+        return db.execute(query).all()
+
+    rows = search()
+    if rows and rows[0].distance is None:
+        rows = search(vector_column.isnot(None))
+    return rows
@@ -0,0 +1,495 @@
+import os
+import json
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from knowledge_graph.quantization import Quantizer, get_quantizer, rerank, top_k
+
+# (id, cosine similarity, metadata)
+SearchHit = Tuple[str, float, Dict[str, Any]]
+
+
+def tidb_collections() -> Dict[str, Tuple[Any, Any, List[Any]]]:
+    """
+    Collection -> (vector column, id column, metadata columns) of the TiDB
+    schema. Imported lazily, so the local store works without a database.
+    """
+    from knowledge_graph.models import Concept, KnowledgeBlock, Relationship
+
+    return {
+        "knowledge_blocks": (
+            KnowledgeBlock.content_vec,
+            KnowledgeBlock.id,
+            [
+                KnowledgeBlock.source_id,
+                KnowledgeBlock.knowledge_type,
+                KnowledgeBlock.source_version,
+            ],
+        ),
+        "concepts": (Concept.definition_vec, Concept.id, []),
+        "relationships": (
+            Relationship.relationship_desc_vec,
+            Relationship.id,
+            [
+                Relationship.source_id,
+                Relationship.target_id,
+                Relationship.relationship_type,
+            ],
+        ),
+    }
+
+
+class VectorStore(ABC):
+    """
+    Storage and nearest-neighbor search of embeddings, grouped in collections
+    named after the tables they belong to (knowledge_blocks, concepts,
+    relationships).
+    """
+
+    @abstractmethod
+    def add(
+        self,
+        collection: str,
+        ids: Sequence[str],
+        vectors: Sequence[Sequence[float]],
+        metadata: Optional[Sequence[Dict[str, Any]]] = None,
+    ):
+        """Insert or replace vectors, with optional metadata usable in search filters."""
+
+    @abstractmethod
+    def search(
+        self,
+        collection: str,
+        query_vec: Sequence[float],
+        k: int,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[SearchHit]:
+        """
+        Parameters:
+        - collection: Collection to search
+        - query_vec: Query vector
+        - k: Number of hits
+        - filters: Metadata key -> value (or list of values) that hits must match
+
+        Returns:
+        - (id, cosine similarity, metadata) of the k nearest vectors, nearest first
+        """
+
+    @abstractmethod
+    def delete(self, collection: str, ids: Sequence[str]):
+        pass
+
+    @abstractmethod
+    def count(self, collection: str) -> int:
+        pass
+
+
+class TiDBVectorStore(VectorStore):
+    """
+    The vectors stored inline in the TiDB tables.
+
+    Rows (and their vectors) are written by the builders' own inserts, so `add`
+    and `delete` have nothing to do; search goes through the vector index.
+    The database modules are imported on first use, so importing this module
+    does not need DATABASE_URI.
+    """
+
+    def add(self, collection, ids, vectors, metadata=None):
+        pass
+
+    def delete(self, collection, ids):
+        pass
+
+    def search(self, collection, query_vec, k, filters=None):
+        from knowledge_graph.vector_index import vector_search
+        from setting.db import SessionLocal
+
+        vector_column, id_column, metadata_columns = tidb_collections()[collection]
+        with SessionLocal() as db:
+            rows = vector_search(
+                db,
+                vector_column,
+                query_vec,
+                k,
+                columns=[id_column, *metadata_columns],
+                filters=filters,
+            )
+        return [
+            (
+                row[0],
+                1.0 - float(row[-1]),
+                {
+                    column.key: value
+                    for column, value in zip(metadata_columns, row[1:-1])
+                },
+            )
+            for row in rows
+        ]
+
+    def count(self, collection):
+        from setting.db import SessionLocal
+
+        vector_column, id_column, _ = tidb_collections()[collection]
+        with SessionLocal() as db:
+            return (
+                db.query(id_column).filter(vector_column.isnot(None)).count()
+            )
+
+
+class _LocalCollection:
+    """
+    Vectors of one collection: an append-only file of unit-normalized rows read
+    through np.memmap, plus an append-only JSON-lines file of ids and metadata.
+    Replaced and deleted rows are tombstoned, not rewritten.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str],
+        name: str,
+        dim: int,
+        dtype,
+        quantizer: Optional[Quantizer] = None,
+        refit_growth: Optional[float] = None,
+    ):
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.vector_path = os.path.join(directory, f"{name}.vec") if directory else None
+        self.meta_path = (
+            os.path.join(directory, f"{name}.meta.jsonl") if directory else None
+        )
+
+        self.ids: List[str] = []
+        self.metadata: List[Dict[str, Any]] = []
+        self.positions: Dict[str, int] = {}
+        self.alive = np.zeros(0, dtype=bool)
+        self._memory = np.zeros((0, dim), dtype=self.dtype)
+        self._matrix = None
+        self._filter_columns: Dict[str, np.ndarray] = {}
+        # compact in-memory codes of the first `_encoded` rows
+        self.quantizer = quantizer
+        self.refit_growth = refit_growth
+        self._codes = None
+        self._encoded = 0
+        # vectors the quantizer was last fit on
+        self._fit_rows = 0
+
+        if self.meta_path and os.path.exists(self.meta_path):
+            self._load()
+
+    def _load(self):
+        alive = []
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("deleted"):
+                    position = self.positions.pop(record["id"], None)
+                    if position is not None:
+                        alive[position] = False
+                    continue
+                previous = self.positions.get(record["id"])
+                if previous is not None:
+                    alive[previous] = False
+                self.positions[record["id"]] = len(self.ids)
+                self.ids.append(record["id"])
+                self.metadata.append(record.get("metadata") or {})
+                alive.append(True)
+        self.alive = np.asarray(alive, dtype=bool)
+
+        # drop rows an interrupted add wrote without their metadata, so the
+        # next rows are appended where the metadata expects them
+        size = len(self.ids) * self.dim * self.dtype.itemsize
+        if (
+            os.path.exists(self.vector_path)
+            and os.path.getsize(self.vector_path) > size
+        ):
+            with open(self.vector_path, "r+b") as f:
+                f.truncate(size)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        if self.vector_path is None:
+            return self._memory
+        if self._matrix is None:
+            rows = len(self.ids)
+            if rows == 0:
+                self._matrix = np.zeros((0, self.dim), dtype=self.dtype)
+            else:
+                self._matrix = np.memmap(
+                    self.vector_path, dtype=self.dtype, mode="r", shape=(rows, self.dim)
+                )
+        return self._matrix
+
+    def codes(self):
+        """Codes of every row, encoding the rows added since the last call."""
+        matrix = self.matrix
+        if self.quantizer.needs_training and (
+            not self.quantizer.is_trained
+            or (
+                self.refit_growth is not None
+                and len(matrix) >= self._fit_rows * self.refit_growth
+            )
+        ):
+            # fit on what the collection holds at its first search, and again
+            # whenever it has outgrown that, so early codebooks don't stick
+            self._fit(np.asarray(matrix, dtype=np.float32))
+        if self._encoded < len(matrix):
+            new_codes = self.quantizer.encode(
+                np.asarray(matrix[self._encoded :], dtype=np.float32)
+            )
+            self._codes = (
+                new_codes
+                if self._codes is None
+                else Quantizer.concat(self._codes, new_codes)
+            )
+            self._encoded = len(matrix)
+        return self._codes
+
+    def _fit(self, vectors: np.ndarray):
+        """Fit the quantizer and drop the codes made with the previous fit."""
+        self.quantizer.fit(vectors)
+        self._fit_rows = len(vectors)
+        self._codes = None
+        self._encoded = 0
+
+    def train(self, sample):
+        sample = np.asarray(sample, dtype=np.float32).reshape(-1, self.dim)
+        norms = np.linalg.norm(sample, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self._fit(sample / norms)
+
+    def add(self, ids, vectors, metadata):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = (vectors / norms).astype(self.dtype)
+        metadata = [meta or {} for meta in metadata]
+        if self.meta_path:
+            # serialized before anything changes, so metadata that can't be
+            # stored leaves the collection and its files untouched
+            lines = "".join(
+                json.dumps({"id": id_, "metadata": meta}, ensure_ascii=False) + "\n"
+                for id_, meta in zip(ids, metadata)
+            )
+
+        alive = np.ones(len(ids), dtype=bool)
+        for id_ in ids:
+            previous = self.positions.get(id_)
+            if previous is not None:
+                self.alive[previous] = False
+        for id_, meta in zip(ids, metadata):
+            self.positions[id_] = len(self.ids)
+            self.ids.append(id_)
+            self.metadata.append(meta)
+        # an id repeated within one batch keeps only its last vector
+        seen = set()
+        for i in range(len(ids) - 1, -1, -1):
+            if ids[i] in seen:
+                alive[i] = False
+            seen.add(ids[i])
+        self.alive = np.concatenate([self.alive, alive])
+
+        if self.vector_path is None:
+            self._memory = np.concatenate([self._memory, vectors])
+        else:
+            # vectors first: rows without metadata are dropped on load, while
+            # metadata without rows would shift every later vector
+            with open(self.vector_path, "ab") as f:
+                f.write(np.ascontiguousarray(vectors).tobytes())
+            with open(self.meta_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+            self._matrix = None
+        self._filter_columns = {}
+
+    def delete(self, ids):
+        deleted = []
+        for id_ in ids:
+            position = self.positions.pop(id_, None)
+            if position is not None:
+                self.alive[position] = False
+                deleted.append(id_)
+        if self.meta_path and deleted:
+            with open(self.meta_path, "a", encoding="utf-8") as f:
+                for id_ in deleted:
+                    f.write(json.dumps({"id": id_, "deleted": True}) + "\n")
+
+    def filter_mask(self, filters: Dict[str, Any]) -> np.ndarray:
+        mask = self.alive.copy()
+        for key, value in filters.items():
+            column = self._filter_columns.get(key)
+            if column is None:
+                column = np.asarray(
+                    [meta.get(key) for meta in self.metadata], dtype=object
+                )
+                self._filter_columns[key] = column
+            if isinstance(value, (list, tuple, set)):
+                mask &= np.isin(column, list(value))
+            else:
+                mask &= column == value
+        return mask
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector store for tests, benchmarks and laptops without TiDB.
+
+    Vectors are normalized on insert, so cosine similarity is a dot product.
+    Search streams over the (memory-mapped) matrix in chunks and keeps a
+    running top-k, so memory stays bounded by `chunk_size` rows whatever the
+    collection size. Store as float16 to halve memory and I/O.
+
+    With `quantization` ("float16", "int8" or "pq") search scans compact
+    in-memory codes instead, and only the best `k * rerank_factor` candidates
+    are rescored against the full-precision rows, which stay on disk.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        directory: Optional[str] = None,
+        dtype: str = "float32",
+        chunk_size: int = 65536,
+        quantization: Optional[str] = None,
+        rerank_factor: int = 4,
+        quantizer_options: Optional[Dict[str, Any]] = None,
+        refit_growth: Optional[float] = 2.0,
+    ):
+        """
+        Parameters:
+        - dim: Vector dimension
+        - directory: Where the collections are persisted, in memory if None
+        - dtype: "float32" or "float16" storage
+        - chunk_size: Rows scored per matrix multiply
+        - quantization: Optional, "float16", "int8" or "pq" codes to search
+        - rerank_factor: Candidates rescored in full precision per hit
+        - quantizer_options: Keyword arguments of the quantizer, e.g.
+          {"subvectors": 96} for pq, which must divide `dim`
+        - refit_growth: Refit a trained quantizer (pq) and re-encode the
+          collection once it holds this many times the vectors of the last
+          fit, None to keep the first fit
+        """
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        if refit_growth is not None and refit_growth <= 1:
+            raise ValueError("refit_growth must be greater than 1")
+        self.dim = dim
+        self.directory = directory
+        self.dtype = dtype
+        self.chunk_size = chunk_size
+        self.quantization = quantization
+        self.rerank_factor = rerank_factor
+        self.quantizer_options = quantizer_options or {}
+        self.refit_growth = refit_growth
+        if quantization is not None:
+            # validate early rather than at the first search
+            get_quantizer(quantization, **self.quantizer_options).check_dimension(dim)
+        self._collections: Dict[str, _LocalCollection] = {}
+        self._lock = threading.RLock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _collection(self, name: str) -> _LocalCollection:
+        collection = self._collections.get(name)
+        if collection is None:
+            quantizer = (
+                get_quantizer(self.quantization, **self.quantizer_options)
+                if self.quantization
+                else None
+            )
+            collection = _LocalCollection(
+                self.directory,
+                name,
+                self.dim,
+                self.dtype,
+                quantizer,
+                self.refit_growth,
+            )
+            self._collections[name] = collection
+        return collection
+
+    def add(self, collection, ids, vectors, metadata=None):
+        if len(ids) == 0:
+            return
+        metadata = metadata if metadata is not None else [{}] * len(ids)
+        with self._lock:
+            self._collection(collection).add(list(ids), vectors, list(metadata))
+
+    def delete(self, collection, ids):
+        with self._lock:
+            self._collection(collection).delete(ids)
+
+    def train(self, collection, sample):
+        """
+        Fit the quantizer of a collection on a representative sample now,
+        instead of on whatever the collection holds at its first search.
+
+        Parameters:
+        - collection: Collection name
+        - sample: Vectors like the ones the collection will hold
+        """
+        with self._lock:
+            store = self._collection(collection)
+            if store.quantizer is None:
+                raise ValueError("Only a quantized store can be trained")
+            store.train(sample)
+
+    def count(self, collection):
+        with self._lock:
+            return int(self._collection(collection).alive.sum())
+
+    def search(self, collection, query_vec, k, filters=None):
+        with self._lock:
+            store = self._collection(collection)
+            matrix = store.matrix
+            mask = store.filter_mask(filters) if filters else store.alive
+            ids, metadata = store.ids, store.metadata
+            codes = store.codes() if store.quantizer is not None and len(ids) else None
+
+        if k <= 0 or len(ids) == 0:
+            return []
+        query = np.asarray(query_vec, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        if codes is not None:
+            scores = store.quantizer.scores(query, codes)
+            candidates = np.flatnonzero(mask)
+            candidates = candidates[
+                top_k(scores[candidates], k * max(1, self.rerank_factor))
+            ]
+            rows, scores = rerank(query, candidates, matrix, k)
+            return [
+                (ids[row], float(score), metadata[row])
+                for row, score in zip(rows, scores)
+            ]
+
+        best_scores = np.zeros(0, dtype=np.float32)
+        best_rows = np.zeros(0, dtype=np.int64)
+        for start in range(0, len(mask), self.chunk_size):
+            chunk_mask = mask[start : start + self.chunk_size]
+            if not chunk_mask.any():
+                continue
+            rows = np.flatnonzero(chunk_mask) + start
+            if len(rows) == len(chunk_mask):
+                chunk = matrix[start : start + len(chunk_mask)]
+            else:
+                chunk = matrix[rows]
+            scores = np.asarray(chunk, dtype=np.float32) @ query
+
+            # merge the chunk into the running top-k
+            scores = np.concatenate([best_scores, scores])
+            rows = np.concatenate([best_rows, rows])
+            if len(scores) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                scores, rows = scores[top], rows[top]
+            best_scores, best_rows = scores, rows
+
+        order = np.argsort(-best_scores, kind="stable")
+        return [
+            (ids[best_rows[i]], float(best_scores[i]), metadata[best_rows[i]])
+            for i in order
+        ]
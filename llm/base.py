@@ -1,8 +1,12 @@
-import time
+import asyncio
 import logging
+from dataclasses import replace
 from abc import ABC, abstractmethod
-from typing import Optional, Generator
+from typing import Optional, Generator, AsyncGenerator
 from setting.base import MODEL_CONFIGS
+from llm.rate_limit import RateLimiter, get_rate_limiter
+from llm.retry import RetryPolicy, is_throttling_error
+from utils.token import calculate_tokens, estimate_tokens
 
 logger = logging.getLogger(__name__)
 
@@ -12,21 +16,79 @@ class BaseLLMProvider(ABC):
     Abstract base class for LLM providers.
     """
 
-    def __init__(self, model: str, max_retries: int = 1, retry_delay: float = 2):
+    provider_name: str = "base"
+
+    def __init__(
+        self,
+        model: str,
+        max_retries: Optional[int] = None,
+        retry_delay: Optional[float] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+    ):
         self.model = model
-        self.max_retries = max_retries
-        self.retry_delay = retry_delay
+        # copy rather than mutate, the policy may be shared with other providers
+        overrides = {}
+        if max_retries is not None:
+            overrides["max_retries"] = max_retries
+        if retry_delay is not None:
+            overrides["base_delay"] = retry_delay
+        self.retry_policy = replace(retry_policy or RetryPolicy(), **overrides)
+        self.rate_limiter = rate_limiter or get_rate_limiter(self.provider_name, model)
 
-    def _retry_with_exponential_backoff(self, func, *args, **kwargs):
-        for attempt in range(self.max_retries):
+    def count_tokens(self, text: str) -> int:
+        """Count tokens with the tokenizer registered for this provider's model."""
+        return calculate_tokens(text, self.model)
+
+    @staticmethod
+    def _estimate_request_tokens(prompt: str, system_prompt: Optional[str] = None) -> int:
+        # a cheap estimate is good enough for rate-limit budgeting
+        return estimate_tokens(prompt) + estimate_tokens(system_prompt or "")
+
+    def _rate_limited(self, func, tokens: int = 0):
+        """
+        Wrap a provider call so it waits for the rate limiter and feeds
+        throttling errors and successes back into it.
+        """
+        if self.rate_limiter is None:
+            return func
+
+        def call(*args, **kwargs):
+            self.rate_limiter.acquire(tokens)
             try:
-                return func(*args, **kwargs)
+                result = func(*args, **kwargs)
             except Exception as e:
-                if attempt == self.max_retries - 1:
-                    raise
-                wait_time = self.retry_delay * (2**attempt)
-                print(f"API request failed. Retrying in {wait_time:.2f} seconds...")
-                time.sleep(wait_time)
+                if is_throttling_error(e):
+                    self.rate_limiter.on_throttle()
+                raise
+            self.rate_limiter.on_success()
+            return result
+
+        return call
+
+    def _arate_limited(self, func, tokens: int = 0):
+        """Async counterpart of _rate_limited."""
+        if self.rate_limiter is None:
+            return func
+
+        async def call(*args, **kwargs):
+            await self.rate_limiter.aacquire(tokens)
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                if is_throttling_error(e):
+                    self.rate_limiter.on_throttle()
+                raise
+            self.rate_limiter.on_success()
+            return result
+
+        return call
+
+    def _retry_with_exponential_backoff(self, func, *args, **kwargs):
+        return self.retry_policy.call(func, *args, **kwargs)
+
+    async def _aretry_with_exponential_backoff(self, func, *args, **kwargs):
+        return await self.retry_policy.acall(func, *args, **kwargs)
 
     @abstractmethod
     def generate(
@@ -51,6 +113,33 @@ class BaseLLMProvider(ABC):
         """
         pass
 
+    async def agenerate(
+        self, prompt: str, system_prompt: Optional[str] = None, **kwargs
+    ) -> Optional[str]:
+        """
+        Async counterpart of generate.
+
+        Providers with a native async client override this; the default runs
+        the blocking call in a worker thread.
+        """
+        return await asyncio.to_thread(self.generate, prompt, system_prompt, **kwargs)
+
+    async def agenerate_stream(
+        self, prompt: str, system_prompt: Optional[str] = None, **kwargs
+    ) -> AsyncGenerator[str, None]:
+        """
+        Async counterpart of generate_stream.
+
+        The default pulls chunks from the blocking generator in a worker thread.
+        """
+        stream = self.generate_stream(prompt, system_prompt, **kwargs)
+        sentinel = object()
+        while True:
+            chunk = await asyncio.to_thread(next, stream, sentinel)
+            if chunk is sentinel:
+                break
+            yield chunk
+
     def _get_default_model_config(self) -> dict:
         """Get model-specific configuration parameters."""
         # First check if there's a user-defined config in environment variables
@@ -1,14 +1,62 @@
 import openai
 import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from llm.embedding_cache import EmbeddingCache
+from setting.embedding import DEFAULT_EMBEDDING_MODEL, get_embedding_spec
+from utils.token import count_tokens_batch
+
+logger = logging.getLogger(__name__)
 
 embedding_model = openai.OpenAI()
 
+# shared by every text embedded through this module, see enable_embedding_cache
+_embedding_cache: Optional[EmbeddingCache] = None
 
-def get_text_embedding(text: str, model="text-embedding-3-small"):
-    text = text.replace("\n", " ")
+
+def enable_embedding_cache(cache: Optional[EmbeddingCache] = None) -> EmbeddingCache:
+    """
+    Cache the vectors of every text embedded through this module, so re-running
+    a build only sends new or changed texts to the API.
+
+    This covers get_text_embedding, get_text_embeddings and the functions of
+    get_column_embedding_funcs, and with them the builders and migrations that
+    embed through them.
+
+    Args:
+        cache (Optional[EmbeddingCache]): Cache to use, defaults to one at
+            EMBEDDING_CACHE_PATH
+
+    Returns:
+        EmbeddingCache: The cache in use, e.g. to read its stats()
+    """
+    global _embedding_cache
+    _embedding_cache = cache or EmbeddingCache()
+    _default_engine.cache = _embedding_cache
+    return _embedding_cache
+
+
+def disable_embedding_cache():
+    global _embedding_cache
+    _embedding_cache = None
+    _default_engine.cache = None
+
+
+def _create_embedding(text: str, model: str) -> List[float]:
     return embedding_model.embeddings.create(input=[text], model=model).data[0].embedding
 
 
+def get_text_embedding(text: str, model=DEFAULT_EMBEDDING_MODEL):
+    text = text.replace("\n", " ")
+    if _embedding_cache is not None:
+        return _embedding_cache.wrap(lambda t: _create_embedding(t, model), model)(
+            text
+        )
+    return _create_embedding(text, model)
+
+
 def get_entity_description_embedding(name: str, description: str):
     combined_text = f"{name}: {description}"
     return get_text_embedding(combined_text)
@@ -17,3 +65,122 @@ def get_entity_description_embedding(name: str, description: str):
 def get_entity_metadata_embedding(metadata: dict):
     combined_text = json.dumps(metadata)
     return get_text_embedding(combined_text)
+
+
+class EmbeddingEngine:
+    """
+    Embeds many texts with as few round trips as possible.
+
+    Texts are packed into batches bounded by both a token budget and an input
+    count, the batches are sent concurrently, and the vectors are returned in
+    the same order as the input texts. With a cache, only the texts it misses
+    are sent.
+    """
+
+    def __init__(
+        self,
+        model: str = DEFAULT_EMBEDDING_MODEL,
+        max_batch_tokens: int = 50000,
+        max_batch_size: int = 512,
+        max_workers: int = 4,
+        client=None,
+        cache: Optional[EmbeddingCache] = None,
+    ):
+        self.model = model
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_workers = max_workers
+        self.client = client or embedding_model
+        self.cache = cache
+
+    def _make_batches(self, texts: List[str]) -> List[List[int]]:
+        """Pack text positions into batches that respect the token and size limits."""
+        batches = []
+        current = []
+        current_tokens = 0
+        for i, tokens in enumerate(count_tokens_batch(texts, model=self.model)):
+            if current and (
+                current_tokens + tokens > self.max_batch_tokens
+                or len(current) >= self.max_batch_size
+            ):
+                batches.append(current)
+                current = []
+                current_tokens = 0
+            current.append(i)
+            current_tokens += tokens
+
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        response = self.client.embeddings.create(input=texts, model=self.model)
+        # the API documents `index` on each item, don't rely on response order
+        data = sorted(response.data, key=lambda item: item.index)
+        return [item.embedding for item in data]
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a list of texts.
+
+        Args:
+            texts (List[str]): Texts to embed
+
+        Returns:
+            List[List[float]]: One vector per input text, in input order
+        """
+        if not texts:
+            return []
+
+        texts = [text.replace("\n", " ") for text in texts]
+        if self.cache is not None:
+            return self.cache.wrap_batch(self._embed_texts, self.model)(texts)
+        return self._embed_texts(texts)
+
+    def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        batches = self._make_batches(texts)
+        logger.debug(f"Embedding {len(texts)} texts in {len(batches)} batches")
+
+        vectors = [None] * len(texts)
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(self.max_workers, len(batches)))
+        ) as executor:
+            batch_vectors = executor.map(
+                lambda batch: self._embed_batch([texts[i] for i in batch]), batches
+            )
+            for batch, embeddings in zip(batches, batch_vectors):
+                for i, embedding in zip(batch, embeddings):
+                    vectors[i] = embedding
+
+        return vectors
+
+
+_default_engine = EmbeddingEngine()
+
+
+def get_text_embeddings(texts: List[str], model=DEFAULT_EMBEDDING_MODEL):
+    if model == _default_engine.model:
+        return _default_engine.embed(texts)
+    return EmbeddingEngine(model=model, cache=_embedding_cache).embed(texts)
+
+
+def get_column_embedding_funcs(key: str) -> Tuple[Callable, Callable]:
+    """
+    Embedding functions for a registered vector column (see setting.embedding).
+
+    Args:
+        key (str): Column key, e.g. "concepts.definition_vec"
+
+    Returns:
+        Tuple[Callable, Callable]: Single-text and batch functions that embed
+            with the column's model and fit the vectors to its dimension
+    """
+    spec = get_embedding_spec(key)
+
+    def embed_batch(texts: List[str]) -> List[List[float]]:
+        return spec.prepare(get_text_embeddings(texts, model=spec.model))
+
+    def embed(text: str) -> List[float]:
+        return embed_batch([text])[0]
+
+    return embed, embed_batch
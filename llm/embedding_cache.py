@@ -0,0 +1,231 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+from setting.base import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text before hashing so whitespace-only changes hit the cache."""
+    return " ".join(text.split())
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def _encode_vector(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _decode_vector(data: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(data)
+    return vector.tolist()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache keyed by (model, normalized text hash).
+
+    Vectors are persisted in a local SQLite file, with an in-memory LRU layer in
+    front of it. When the file grows beyond `max_disk_bytes`, the least recently
+    used entries are evicted.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        memory_size: int = 10000,
+        max_disk_bytes: Optional[int] = None,
+    ):
+        self.path = os.path.expanduser(path or EMBEDDING_CACHE_PATH)
+        self.memory_size = memory_size
+        self.max_disk_bytes = max_disk_bytes or EMBEDDING_CACHE_MAX_BYTES
+        self.hits = 0
+        self.misses = 0
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access)"
+        )
+        self._conn.commit()
+        self._disk_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    def _remember(self, key, vector: List[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Look up cached vectors, returning None for every miss."""
+        hashes = [text_hash(text) for text in texts]
+        results = [None] * len(texts)
+
+        with self._lock:
+            disk_lookups = {}
+            for i, h in enumerate(hashes):
+                key = (model, h)
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    results[i] = self._memory[key]
+                else:
+                    disk_lookups.setdefault(h, []).append(i)
+
+            found = {}
+            pending = list(disk_lookups.keys())
+            # stay below SQLite's default host parameter limit
+            for start in range(0, len(pending), 500):
+                chunk = pending[start : start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *chunk],
+                ).fetchall()
+                for h, data in rows:
+                    found[h] = _decode_vector(data)
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, h) for h in found],
+                )
+                self._conn.commit()
+
+            for h, positions in disk_lookups.items():
+                if h in found:
+                    self._remember((model, h), found[h])
+                    for i in positions:
+                        results[i] = found[h]
+
+            hit_count = sum(1 for vector in results if vector is not None)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+
+        return results
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        """Store vectors for the given texts."""
+        now = time.time()
+        rows = {}
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                h = text_hash(text)
+                self._remember((model, h), vector)
+                rows[h] = _encode_vector(vector)
+
+            for h, data in rows.items():
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO embeddings (model, text_hash, vector, last_access) VALUES (?, ?, ?, ?)",
+                    (model, h, data, now),
+                )
+                if cursor.rowcount:
+                    self._disk_bytes += len(data)
+            self._conn.commit()
+
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Evict least recently used entries until the cache is 90% of its budget."""
+        target = int(self.max_disk_bytes * 0.9)
+        evicted = 0
+        while self._disk_bytes > target:
+            rows = self._conn.execute(
+                "SELECT model, text_hash, LENGTH(vector) FROM embeddings ORDER BY last_access LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                self._disk_bytes = 0
+                break
+            to_delete = []
+            for model, h, size in rows:
+                if self._disk_bytes <= target:
+                    break
+                to_delete.append((model, h))
+                self._disk_bytes -= size
+                self._memory.pop((model, h), None)
+            self._conn.executemany(
+                "DELETE FROM embeddings WHERE model = ? AND text_hash = ?", to_delete
+            )
+            evicted += len(to_delete)
+        self._conn.commit()
+        logger.info(f"Evicted {evicted} embeddings from cache {self.path}")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_bytes": self._disk_bytes,
+        }
+
+    def wrap_batch(self, batch_func: Callable, model: str) -> Callable:
+        """
+        Wrap a function that embeds a list of texts, only sending cache misses
+        through to it.
+        """
+
+        def cached_batch_func(texts: List[str]) -> List[List[float]]:
+            vectors = self.get_many(model, texts)
+            missing = {}
+            for i, vector in enumerate(vectors):
+                if vector is None:
+                    missing.setdefault(normalize_text(texts[i]), []).append(i)
+
+            if missing:
+                miss_texts = [texts[positions[0]] for positions in missing.values()]
+                miss_vectors = batch_func(miss_texts)
+                self.put_many(model, miss_texts, miss_vectors)
+                for positions, vector in zip(missing.values(), miss_vectors):
+                    for i in positions:
+                        vectors[i] = vector
+
+            return vectors
+
+        return cached_batch_func
+
+    def wrap(self, embedding_func: Callable, model: str) -> Callable:
+        """Wrap a single-text embedding function such as get_text_embedding."""
+        cached_batch_func = self.wrap_batch(
+            lambda texts: [embedding_func(text) for text in texts], model
+        )
+
+        def cached_embedding_func(text: str) -> List[float]:
+            return cached_batch_func([text])[0]
+
+        return cached_embedding_func
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
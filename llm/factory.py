@@ -1,7 +1,8 @@
 import logging
-from typing import Optional, Generator
+from typing import Optional, Generator, AsyncGenerator
 
 from llm.base import BaseLLMProvider
+from llm.response_cache import ResponseCache, response_cache_key
 from llm.providers import (
     OpenAIProvider,
     OllamaProvider,
@@ -13,8 +14,25 @@ logger = logging.getLogger(__name__)
 
 
 class LLMInterface:
-    def __init__(self, provider: str, model: str, **kwargs):
-        self.provider = self._get_provider(provider.lower(), model, **kwargs)
+    def __init__(
+        self,
+        provider: str,
+        model: str,
+        response_cache: Optional[ResponseCache] = None,
+        **kwargs,
+    ):
+        """
+        Args:
+            provider (str): Provider name, e.g. "openai" or "bedrock"
+            model (str): Model name
+            response_cache (Optional[ResponseCache]): Opt-in cache for generate
+                responses, keyed by provider, model, prompts and generation params
+            **kwargs: Additional arguments to pass to the provider
+        """
+        self.provider_name = provider.lower()
+        self.model = model
+        self.response_cache = response_cache
+        self.provider = self._get_provider(self.provider_name, model, **kwargs)
 
     def _get_provider(self, provider: str, model: str, **kwargs) -> BaseLLMProvider:
         if provider == "openai":
@@ -28,15 +46,36 @@ class LLMInterface:
         else:
             raise ValueError(f"Unsupported LLM provider: {provider}")
 
+    def _cache_key(self, prompt: str, system_prompt: Optional[str], kwargs: dict) -> str:
+        params = {**self.provider._get_default_model_config(), **kwargs}
+        return response_cache_key(
+            self.provider_name, self.model, system_prompt, prompt, params
+        )
+
     def generate(
-        self, prompt: str, system_prompt: Optional[str] = None, **kwargs
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        bypass_cache: bool = False,
+        **kwargs,
     ) -> Optional[str]:
+        use_cache = self.response_cache is not None and not bypass_cache
+        if use_cache:
+            key = self._cache_key(prompt, system_prompt, kwargs)
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                return cached
+
         try:
-            return self.provider.generate(prompt, system_prompt, **kwargs)
+            response = self.provider.generate(prompt, system_prompt, **kwargs)
         except Exception as e:
             logger.error(f"LLM generation failed: {e}")
             raise e
 
+        if use_cache:
+            self.response_cache.put(key, response)
+        return response
+
     def generate_stream(
         self, prompt: str, system_prompt: Optional[str] = None, **kwargs
     ) -> Generator[str, None, None]:
@@ -57,3 +96,50 @@ class LLMInterface:
         except Exception as e:
             logger.error(f"LLM streaming generation failed: {e}")
             yield f"Error: {str(e)}"
+
+    async def agenerate(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        bypass_cache: bool = False,
+        **kwargs,
+    ) -> Optional[str]:
+        use_cache = self.response_cache is not None and not bypass_cache
+        if use_cache:
+            key = self._cache_key(prompt, system_prompt, kwargs)
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                return cached
+
+        try:
+            response = await self.provider.agenerate(prompt, system_prompt, **kwargs)
+        except Exception as e:
+            logger.error(f"LLM generation failed: {e}")
+            raise e
+
+        if use_cache:
+            self.response_cache.put(key, response)
+        return response
+
+    async def agenerate_stream(
+        self, prompt: str, system_prompt: Optional[str] = None, **kwargs
+    ) -> AsyncGenerator[str, None]:
+        """
+        Generate streaming response from the LLM asynchronously.
+
+        Args:
+            prompt (str): The prompt to send to the LLM
+            system_prompt (Optional[str]): Optional system prompt to prepend to the prompt
+            **kwargs: Additional arguments to pass to the LLM
+
+        Yields:
+            str: Chunks of the generated text
+        """
+        try:
+            async for chunk in self.provider.agenerate_stream(
+                prompt, system_prompt, **kwargs
+            ):
+                yield chunk
+        except Exception as e:
+            logger.error(f"LLM streaming generation failed: {e}")
+            yield f"Error: {str(e)}"
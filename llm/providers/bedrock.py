@@ -3,13 +3,27 @@ from typing import Optional, Generator
 import json
 import logging
 import boto3
+from botocore.config import Config
 from llm.base import BaseLLMProvider
+from utils.token import get_encoding_by_name, register_tokenizer
 
 logger = logging.getLogger(__name__)
 
 
+def _count_claude_tokens(text: str) -> int:
+    # Anthropic doesn't ship a local tokenizer for Claude 3+, cl100k_base is
+    # a closer approximation than the o200k_base default
+    return len(get_encoding_by_name("cl100k_base").encode(text, disallowed_special=()))
+
+
+for _prefix in ("anthropic.", "us.anthropic.", "eu.anthropic.", "apac.anthropic."):
+    register_tokenizer(_prefix, _count_claude_tokens)
+
+
 class BedrockProvider(BaseLLMProvider):
 
+    provider_name = "bedrock"
+
     @staticmethod
     def get_credentials() -> dict:
         required_vars = ["AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"]
@@ -37,7 +51,7 @@ class BedrockProvider(BaseLLMProvider):
             return False
 
     def __init__(self, model: str, **kwargs):
-        super().__init__(model)
+        super().__init__(model, **kwargs)
 
         if not self.is_configured():
             raise ValueError(
@@ -46,6 +60,11 @@ class BedrockProvider(BaseLLMProvider):
             )
 
         credentials = self.get_credentials()
+        timeout = self.retry_policy.request_timeout
+        if timeout is not None:
+            credentials["config"] = Config(
+                connect_timeout=min(timeout, 60), read_timeout=timeout
+            )
         self.client = boto3.client("bedrock-runtime", **credentials)
 
         # TODO: support more models
@@ -63,7 +82,11 @@ class BedrockProvider(BaseLLMProvider):
     ) -> Optional[str]:
         messages = [{"role": "user", "content": [{"text": prompt}]}]
         if system_prompt:
-            response = self.client.converse(
+            response = self._retry_with_exponential_backoff(
+                self._rate_limited(
+                    self.client.converse,
+                    self._estimate_request_tokens(prompt, system_prompt),
+                ),
                 modelId=self.model,
                 inferenceConfig={
                     "maxTokens": 30000,
@@ -73,7 +96,11 @@ class BedrockProvider(BaseLLMProvider):
                 messages=messages,
             )
         else:
-            response = self.client.converse(
+            response = self._retry_with_exponential_backoff(
+                self._rate_limited(
+                    self.client.converse,
+                    self._estimate_request_tokens(prompt, system_prompt),
+                ),
                 modelId=self.model,
                 inferenceConfig={
                     "maxTokens": 30000,
@@ -117,7 +144,10 @@ class BedrockProvider(BaseLLMProvider):
             }
 
             streaming_response = self._retry_with_exponential_backoff(
-                self.client.invoke_model_with_response_stream,
+                self._rate_limited(
+                    self.client.invoke_model_with_response_stream,
+                    self._estimate_request_tokens(prompt, system_prompt),
+                ),
                 modelId=self.model,
                 body=json.dumps(request_body),
             )
@@ -1,7 +1,7 @@
 import os
 import logging
 from google import genai
-from typing import Optional, Generator
+from typing import Optional, Generator, AsyncGenerator
 
 from llm.base import BaseLLMProvider
 
@@ -13,6 +13,8 @@ class GeminiProvider(BaseLLMProvider):
     Provider for Google's Gemini API.
     """
 
+    provider_name = "gemini"
+
     def __init__(self, model: str, **kwargs):
         super().__init__(model, **kwargs)
         api_key = os.getenv("GOOGLE_API_KEY")
@@ -22,14 +24,21 @@ class GeminiProvider(BaseLLMProvider):
                 "Google API key not set. Please set the GOOGLE_API_KEY environment variable."
             )
 
-        self.client = genai.Client(api_key=api_key)
+        http_options = None
+        if self.retry_policy.request_timeout is not None:
+            # google-genai takes the timeout in milliseconds
+            http_options = {"timeout": int(self.retry_policy.request_timeout * 1000)}
+        self.client = genai.Client(api_key=api_key, http_options=http_options)
 
     def generate(
         self, prompt: str, context: Optional[str] = None, **kwargs
     ) -> Optional[str]:
         full_prompt = f"{context}\n{prompt}" if context else prompt
         response = self._retry_with_exponential_backoff(
-            self.client.models.generate_content,
+            self._rate_limited(
+                self.client.models.generate_content,
+                self._estimate_request_tokens(full_prompt),
+            ),
             model=self.model,
             contents=full_prompt,
             **kwargs,
@@ -45,7 +54,10 @@ class GeminiProvider(BaseLLMProvider):
         full_prompt = f"{context}\n{prompt}" if context else prompt
         try:
             response = self._retry_with_exponential_backoff(
-                self.client.models.generate_content_stream,
+                self._rate_limited(
+                    self.client.models.generate_content_stream,
+                    self._estimate_request_tokens(full_prompt),
+                ),
                 model=self.model,
                 contents=full_prompt,
                 **kwargs,
@@ -63,3 +75,49 @@ class GeminiProvider(BaseLLMProvider):
         except Exception as e:
             logger.error(f"Error during Gemini streaming: {e}")
             yield f"Error: {str(e)}"
+
+    async def agenerate(
+        self, prompt: str, context: Optional[str] = None, **kwargs
+    ) -> Optional[str]:
+        full_prompt = f"{context}\n{prompt}" if context else prompt
+        response = await self._aretry_with_exponential_backoff(
+            self._arate_limited(
+                self.client.aio.models.generate_content,
+                self._estimate_request_tokens(full_prompt),
+            ),
+            model=self.model,
+            contents=full_prompt,
+            **kwargs,
+        )
+        return response.text.strip()
+
+    async def agenerate_stream(
+        self, prompt: str, context: Optional[str] = None, **kwargs
+    ) -> AsyncGenerator[str, None]:
+        """
+        Generate streaming response from Gemini API asynchronously.
+        """
+        full_prompt = f"{context}\n{prompt}" if context else prompt
+        try:
+            response = await self._aretry_with_exponential_backoff(
+                self._arate_limited(
+                    self.client.aio.models.generate_content_stream,
+                    self._estimate_request_tokens(full_prompt),
+                ),
+                model=self.model,
+                contents=full_prompt,
+                **kwargs,
+            )
+
+            async for resp in response:
+                if not resp.candidates:
+                    continue
+
+                for candidate in resp.candidates:
+                    for part in candidate.content.parts:
+                        if part.text:
+                            yield part.text
+
+        except Exception as e:
+            logger.error(f"Error during Gemini streaming: {e}")
+            yield f"Error: {str(e)}"
@@ -1,6 +1,7 @@
 import os
-from typing import Optional, Generator
+from typing import Optional, Generator, AsyncGenerator
 import requests
+import httpx
 import json
 import logging
 
@@ -14,9 +15,41 @@ class OllamaProvider(BaseLLMProvider):
     Provider for Ollama.
     """
 
+    provider_name = "ollama"
+
     def __init__(self, model: str, **kwargs):
         super().__init__(model, **kwargs)
         self.ollama_base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+        self._async_client = None
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        # created lazily so the provider can be constructed outside an event loop
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                base_url=self.ollama_base_url,
+                timeout=self.retry_policy.request_timeout,
+            )
+        return self._async_client
+
+    def _post(self, data: dict, stream: bool = False) -> requests.Response:
+        response = requests.post(
+            f"{self.ollama_base_url}/api/generate",
+            json=data,
+            stream=stream,
+            timeout=self.retry_policy.request_timeout,
+        )
+        # raise inside the retried call so HTTP errors are classified
+        response.raise_for_status()
+        return response
+
+    async def _apost(self, data: dict, stream: bool = False) -> httpx.Response:
+        request = self.async_client.build_request("POST", "/api/generate", json=data)
+        response = await self.async_client.send(request, stream=stream)
+        if response.is_error:
+            await response.aclose()
+        response.raise_for_status()
+        return response
 
     def generate(
         self, prompt: str, system_prompt: Optional[str] = None, **kwargs
@@ -27,9 +60,9 @@ class OllamaProvider(BaseLLMProvider):
             full_prompt = prompt
         data = {"model": self.model, "prompt": full_prompt, "stream": False, **kwargs}
         response = self._retry_with_exponential_backoff(
-            requests.post, f"{self.ollama_base_url}/api/generate", json=data
+            self._rate_limited(self._post, self._estimate_request_tokens(full_prompt)),
+            data,
         )
-        response.raise_for_status()
         return response.json()["response"].strip()
 
     def generate_stream(
@@ -53,12 +86,14 @@ class OllamaProvider(BaseLLMProvider):
         try:
             data = {"model": self.model, "prompt": full_prompt, **kwargs}
 
-            response = requests.post(
-                f"{self.ollama_base_url}/api/generate", json=data, stream=True
+            response = self._retry_with_exponential_backoff(
+                self._rate_limited(
+                    self._post, self._estimate_request_tokens(full_prompt)
+                ),
+                data,
+                stream=True,
             )
 
-            response.raise_for_status()
-
             for line in response.iter_lines():
                 if not line:
                     continue
@@ -78,3 +113,59 @@ class OllamaProvider(BaseLLMProvider):
         except Exception as e:
             logger.error(f"Error during Ollama streaming: {e}")
             yield f"Error: {str(e)}"
+
+    async def agenerate(
+        self, prompt: str, system_prompt: Optional[str] = None, **kwargs
+    ) -> Optional[str]:
+        if system_prompt:
+            full_prompt = f"{system_prompt}\n{prompt}"
+        else:
+            full_prompt = prompt
+        data = {"model": self.model, "prompt": full_prompt, "stream": False, **kwargs}
+        response = await self._aretry_with_exponential_backoff(
+            self._arate_limited(
+                self._apost, self._estimate_request_tokens(full_prompt)
+            ),
+            data,
+        )
+        return response.json()["response"].strip()
+
+    async def agenerate_stream(
+        self, prompt: str, system_prompt: Optional[str] = None, **kwargs
+    ) -> AsyncGenerator[str, None]:
+        if system_prompt:
+            full_prompt = f"{system_prompt}\n{prompt}"
+        else:
+            full_prompt = prompt
+        try:
+            data = {"model": self.model, "prompt": full_prompt, **kwargs}
+
+            response = await self._aretry_with_exponential_backoff(
+                self._arate_limited(
+                    self._apost, self._estimate_request_tokens(full_prompt)
+                ),
+                data,
+                stream=True,
+            )
+            try:
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+
+                    try:
+                        chunk = json.loads(line)
+                        if chunk.get("done", False):
+                            break
+
+                        if "response" in chunk:
+                            yield chunk["response"]
+
+                    except json.JSONDecodeError as e:
+                        logger.error(f"Failed to decode JSON from Ollama response: {e}")
+                        continue
+            finally:
+                await response.aclose()
+
+        except Exception as e:
+            logger.error(f"Error during Ollama streaming: {e}")
+            yield f"Error: {str(e)}"
@@ -1,5 +1,5 @@
 import os
-from typing import Optional, Generator
+from typing import Optional, Generator, AsyncGenerator
 import openai
 import logging
 
@@ -14,28 +14,29 @@ class OpenAILikeProvider(BaseLLMProvider):
     Provider for OpenAI.
     """
 
+    provider_name = "openai_like"
+
     def __init__(self, model: str, **kwargs):
         super().__init__(model, **kwargs)
         api_key = os.getenv("OPENAI_LIKE_API_KEY")
         base_url = os.getenv("OPENAI_LIKE_BASE_URL")
-        self.client = openai.OpenAI(api_key=api_key, base_url=base_url)
+        timeout = self.retry_policy.request_timeout
+        self.client = openai.OpenAI(api_key=api_key, base_url=base_url, timeout=timeout)
+        self.async_client = openai.AsyncOpenAI(
+            api_key=api_key, base_url=base_url, timeout=timeout
+        )
 
-    def generate(
-        self, prompt: str, system_prompt: Optional[str] = None, **kwargs
-    ) -> Optional[str]:
+    @staticmethod
+    def _build_messages(prompt: str, system_prompt: Optional[str] = None) -> list:
         if system_prompt:
-            messages = [
+            return [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": prompt},
             ]
-        else:
-            messages = [{"role": "user", "content": prompt}]
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            **self._update_kwargs(kwargs),
-        )
+        return [{"role": "user", "content": prompt}]
 
+    @staticmethod
+    def _parse_response(response) -> Optional[str]:
         if response.choices is None:
             raise Exception(f"LLM response is None: {response.error}")
 
@@ -50,19 +51,32 @@ class OpenAILikeProvider(BaseLLMProvider):
 
         return response.choices[0].message.content.strip()
 
+    def generate(
+        self, prompt: str, system_prompt: Optional[str] = None, **kwargs
+    ) -> Optional[str]:
+        messages = self._build_messages(prompt, system_prompt)
+        response = self._retry_with_exponential_backoff(
+            self._rate_limited(
+                self.client.chat.completions.create,
+                self._estimate_request_tokens(prompt, system_prompt),
+            ),
+            model=self.model,
+            messages=messages,
+            **self._update_kwargs(kwargs),
+        )
+
+        return self._parse_response(response)
+
     def generate_stream(
         self, prompt: str, system_prompt: Optional[str] = None, **kwargs
     ) -> Generator[str, None, None]:
-        if system_prompt:
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt},
-            ]
-        else:
-            messages = [{"role": "user", "content": prompt}]
+        messages = self._build_messages(prompt, system_prompt)
         try:
             response = self._retry_with_exponential_backoff(
-                self.client.chat.completions.create,
+                self._rate_limited(
+                    self.client.chat.completions.create,
+                    self._estimate_request_tokens(prompt, system_prompt),
+                ),
                 model=self.model,
                 messages=messages,
                 stream=True,  # Enable streaming
@@ -76,3 +90,42 @@ class OpenAILikeProvider(BaseLLMProvider):
         except Exception as e:
             logger.error(f"Error during OpenAI streaming: {e}")
             yield f"Error: {str(e)}"
+
+    async def agenerate(
+        self, prompt: str, system_prompt: Optional[str] = None, **kwargs
+    ) -> Optional[str]:
+        messages = self._build_messages(prompt, system_prompt)
+        response = await self._aretry_with_exponential_backoff(
+            self._arate_limited(
+                self.async_client.chat.completions.create,
+                self._estimate_request_tokens(prompt, system_prompt),
+            ),
+            model=self.model,
+            messages=messages,
+            **self._update_kwargs(kwargs),
+        )
+        return self._parse_response(response)
+
+    async def agenerate_stream(
+        self, prompt: str, system_prompt: Optional[str] = None, **kwargs
+    ) -> AsyncGenerator[str, None]:
+        messages = self._build_messages(prompt, system_prompt)
+        try:
+            response = await self._aretry_with_exponential_backoff(
+                self._arate_limited(
+                    self.async_client.chat.completions.create,
+                    self._estimate_request_tokens(prompt, system_prompt),
+                ),
+                model=self.model,
+                messages=messages,
+                stream=True,  # Enable streaming
+                **self._update_kwargs(kwargs),
+            )
+
+            async for chunk in response:
+                if chunk.choices[0].delta.content is not None:
+                    yield chunk.choices[0].delta.content
+
+        except Exception as e:
+            logger.error(f"Error during OpenAI streaming: {e}")
+            yield f"Error: {str(e)}"
@@ -0,0 +1,186 @@
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, Optional
+
+from setting.base import LLM_RATE_LIMITS
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Thread-safe token-bucket limiter for requests/minute and tokens/minute.
+
+    The effective rate adapts with AIMD: every throttling error halves it (at
+    most once per cooldown window), and every successful request adds back a
+    small fraction of the configured rate until it is reached again.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        burst: int = 1,
+        decrease_factor: float = 0.5,
+        increase_ratio: float = 0.05,
+        min_scale: float = 0.05,
+        cooldown: float = 5.0,
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.request_capacity = max(1, burst)
+        self.decrease_factor = decrease_factor
+        self.increase_ratio = increase_ratio
+        self.min_scale = min_scale
+        self.cooldown = cooldown
+
+        self._scale = 1.0
+        self._last_decrease = 0.0
+        self._request_tokens = float(self.request_capacity)
+        self._budget_tokens = float(tokens_per_minute or 0)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def current_rate(self) -> Dict[str, Optional[float]]:
+        """The effective limits after adaptive backoff."""
+        return {
+            "requests_per_minute": (
+                self.requests_per_minute * self._scale
+                if self.requests_per_minute
+                else None
+            ),
+            "tokens_per_minute": (
+                self.tokens_per_minute * self._scale
+                if self.tokens_per_minute
+                else None
+            ),
+            "scale": self._scale,
+        }
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        if self.requests_per_minute:
+            self._request_tokens = min(
+                self.request_capacity,
+                self._request_tokens
+                + elapsed * self.requests_per_minute * self._scale / 60,
+            )
+        if self.tokens_per_minute:
+            self._budget_tokens = min(
+                self.tokens_per_minute,
+                self._budget_tokens
+                + elapsed * self.tokens_per_minute * self._scale / 60,
+            )
+
+    def _try_acquire(self, tokens: int) -> float:
+        """Take capacity if available, otherwise return how long to wait."""
+        with self._lock:
+            self._refill()
+            wait_time = 0.0
+            if self.requests_per_minute and self._request_tokens < 1:
+                wait_time = max(
+                    wait_time,
+                    (1 - self._request_tokens)
+                    * 60
+                    / (self.requests_per_minute * self._scale),
+                )
+            if self.tokens_per_minute:
+                # a single oversized request may use the whole budget
+                tokens = min(tokens, self.tokens_per_minute)
+                if self._budget_tokens < tokens:
+                    wait_time = max(
+                        wait_time,
+                        (tokens - self._budget_tokens)
+                        * 60
+                        / (self.tokens_per_minute * self._scale),
+                    )
+            if wait_time > 0:
+                return wait_time
+
+            if self.requests_per_minute:
+                self._request_tokens -= 1
+            if self.tokens_per_minute:
+                self._budget_tokens -= tokens
+            return 0.0
+
+    def acquire(self, tokens: int = 0):
+        """Block until a request of `tokens` estimated tokens may be sent."""
+        while True:
+            wait_time = self._try_acquire(tokens)
+            if wait_time <= 0:
+                return
+            time.sleep(wait_time)
+
+    async def aacquire(self, tokens: int = 0):
+        """Async counterpart of acquire."""
+        while True:
+            wait_time = self._try_acquire(tokens)
+            if wait_time <= 0:
+                return
+            await asyncio.sleep(wait_time)
+
+    def on_throttle(self):
+        """Multiplicative decrease after the provider throttled a request."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown:
+                return
+            self._last_decrease = now
+            self._scale = max(self.min_scale, self._scale * self.decrease_factor)
+            # drain the buckets so in-flight callers pause as well
+            self._request_tokens = min(self._request_tokens, 0.0)
+            self._budget_tokens = min(self._budget_tokens, 0.0)
+        logger.warning(f"Throttled by provider, rate reduced to {self.current_rate}")
+
+    def on_success(self):
+        """Additive increase after a successful request."""
+        if self._scale >= 1.0:
+            return
+        with self._lock:
+            self._scale = min(1.0, self._scale + self.increase_ratio)
+
+
+_rate_limiters: Dict[str, RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def register_rate_limit(
+    provider: str,
+    model: Optional[str] = None,
+    requests_per_minute: Optional[float] = None,
+    tokens_per_minute: Optional[float] = None,
+    **kwargs,
+) -> RateLimiter:
+    """
+    Register the quota for a provider, or for a single model of a provider.
+    """
+    key = f"{provider}:{model}" if model else provider
+    limiter = RateLimiter(requests_per_minute, tokens_per_minute, **kwargs)
+    with _rate_limiters_lock:
+        _rate_limiters[key] = limiter
+    return limiter
+
+
+def get_rate_limiter(provider: str, model: str) -> Optional[RateLimiter]:
+    """
+    Return the limiter shared by all clients of `provider` and `model`.
+
+    Limits come from register_rate_limit or the LLM_RATE_LIMITS setting, e.g.
+    {"bedrock:us.anthropic.claude-3-7-sonnet-20250219-v1:0": {"requests_per_minute": 50,
+    "tokens_per_minute": 200000}}. A bare provider key is one quota shared by
+    all models of that provider. Returns None when no limit is configured.
+    """
+    with _rate_limiters_lock:
+        for key in (f"{provider}:{model}", provider):
+            if key in _rate_limiters:
+                return _rate_limiters[key]
+            if key in LLM_RATE_LIMITS:
+                limiter = RateLimiter(**LLM_RATE_LIMITS[key])
+                _rate_limiters[key] = limiter
+                return limiter
+    return None
@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Optional
+
+from setting.base import (
+    RESPONSE_CACHE_PATH,
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_MAX_BYTES,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def response_cache_key(
+    provider: str,
+    model: str,
+    system_prompt: Optional[str],
+    prompt: str,
+    params: Optional[dict] = None,
+) -> str:
+    """Hash everything that determines an LLM response into a cache key."""
+    payload = json.dumps(
+        [provider, model, system_prompt, prompt, params or {}],
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Disk-backed cache of LLM responses.
+
+    Entries expire after `ttl` seconds, and when the file grows beyond
+    `max_bytes` the least recently used responses are evicted.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        self.path = os.path.expanduser(path or RESPONSE_CACHE_PATH)
+        self.ttl = ttl if ttl is not None else RESPONSE_CACHE_TTL
+        self.max_bytes = max_bytes or RESPONSE_CACHE_MAX_BYTES
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)"
+        )
+        self._conn.commit()
+        self._size = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, size, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            response, size, created_at = row
+            if self.ttl and now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self._size -= size
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return response
+
+    def put(self, key: str, response: str):
+        if response is None:
+            return
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now),
+            )
+            self._size += size - (row[0] if row else 0)
+            self._conn.commit()
+
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Drop expired entries, then least recently used ones down to 90% of the budget."""
+        if self.ttl:
+            self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+
+        target = int(self.max_bytes * 0.9)
+        self._size = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        while self._size > target:
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                self._size = 0
+                break
+            to_delete = []
+            for key, size in rows:
+                if self._size <= target:
+                    break
+                to_delete.append((key,))
+                self._size -= size
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", to_delete)
+        self._conn.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "bytes": self._size,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._size = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
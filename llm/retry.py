@@ -0,0 +1,203 @@
+import time
+import random
+import asyncio
+import logging
+from enum import Enum
+from email.utils import parsedate_to_datetime
+from dataclasses import dataclass
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ErrorKind(Enum):
+    THROTTLING = "throttling"
+    SERVER = "server"
+    TIMEOUT = "timeout"
+    CONNECTION = "connection"
+    VALIDATION = "validation"
+    AUTH = "auth"
+    UNKNOWN = "unknown"
+
+
+RETRYABLE_ERROR_KINDS = {
+    ErrorKind.THROTTLING,
+    ErrorKind.SERVER,
+    ErrorKind.TIMEOUT,
+    ErrorKind.CONNECTION,
+}
+
+# botocore ClientError codes returned by bedrock-runtime
+_BOTO_ERROR_KINDS = {
+    "ThrottlingException": ErrorKind.THROTTLING,
+    "TooManyRequestsException": ErrorKind.THROTTLING,
+    "ServiceQuotaExceededException": ErrorKind.THROTTLING,
+    "ServiceUnavailableException": ErrorKind.SERVER,
+    "InternalServerException": ErrorKind.SERVER,
+    "ModelNotReadyException": ErrorKind.SERVER,
+    "ModelTimeoutException": ErrorKind.TIMEOUT,
+    "ValidationException": ErrorKind.VALIDATION,
+    "ResourceNotFoundException": ErrorKind.VALIDATION,
+    "ModelErrorException": ErrorKind.VALIDATION,
+    "AccessDeniedException": ErrorKind.AUTH,
+    "UnrecognizedClientException": ErrorKind.AUTH,
+    "ExpiredTokenException": ErrorKind.AUTH,
+}
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        if isinstance(response, dict):
+            status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return status if isinstance(status, int) else None
+
+
+def classify_error(error: Exception) -> ErrorKind:
+    """
+    Classify a provider exception so the retry policy knows whether it is
+    worth retrying.
+
+    Works on the openai, httpx, requests, botocore and google-genai exception
+    types without importing them.
+    """
+    # botocore.exceptions.ClientError
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        code = response.get("Error", {}).get("Code", "")
+        if code in _BOTO_ERROR_KINDS:
+            return _BOTO_ERROR_KINDS[code]
+
+    name = type(error).__name__
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError)) or "Timeout" in name:
+        return ErrorKind.TIMEOUT
+    if isinstance(error, ConnectionError) or "Connection" in name:
+        return ErrorKind.CONNECTION
+
+    status = _status_code(error)
+    if status is not None:
+        if status == 429:
+            return ErrorKind.THROTTLING
+        if status == 408:
+            return ErrorKind.TIMEOUT
+        if status in (401, 403):
+            return ErrorKind.AUTH
+        if status >= 500:
+            return ErrorKind.SERVER
+        if 400 <= status < 500:
+            return ErrorKind.VALIDATION
+
+    message = str(error).lower()
+    if "throttl" in message or "rate limit" in message or "too many requests" in message:
+        return ErrorKind.THROTTLING
+    return ErrorKind.UNKNOWN
+
+
+def is_throttling_error(error: Exception) -> bool:
+    return classify_error(error) is ErrorKind.THROTTLING
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Return the server's Retry-After hint in seconds, if the error carries one."""
+    headers = None
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        headers = response.get("ResponseMetadata", {}).get("HTTPHeaders")
+    elif response is not None:
+        headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    try:
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms is not None:
+            return float(retry_after_ms) / 1000
+
+        retry_after = headers.get("retry-after")
+        if retry_after is None:
+            return None
+        try:
+            return float(retry_after)
+        except ValueError:
+            retry_at = parsedate_to_datetime(retry_after)
+            return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Retry transient provider errors with full-jitter exponential backoff.
+
+    Only throttling, 5xx, timeout and connection errors are retried. Server
+    Retry-After hints are honored, and no retry is scheduled past the
+    deadline (in seconds, measured from the first attempt). The deadline only
+    bounds the retry schedule; a hung attempt is cut off by request_timeout,
+    which providers pass to their HTTP clients.
+    """
+
+    max_retries: int = 5
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+    deadline: Optional[float] = 600.0
+    retry_unknown: bool = False
+    request_timeout: Optional[float] = 300.0
+
+    def should_retry(self, error: Exception) -> bool:
+        kind = classify_error(error)
+        return kind in RETRYABLE_ERROR_KINDS or (
+            self.retry_unknown and kind is ErrorKind.UNKNOWN
+        )
+
+    def compute_delay(self, attempt: int, error: Exception) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2**attempt)))
+        retry_after = get_retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def _next_delay(self, attempt: int, error: Exception, start: float) -> Optional[float]:
+        """Delay before the next attempt, or None if the error should be raised."""
+        if attempt >= self.max_retries or not self.should_retry(error):
+            return None
+        delay = self.compute_delay(attempt, error)
+        if (
+            self.deadline is not None
+            and time.monotonic() - start + delay > self.deadline
+        ):
+            return None
+        logger.warning(
+            f"API request failed ({classify_error(error).value}: {error}). "
+            f"Retrying in {delay:.2f} seconds..."
+        )
+        return delay
+
+    def call(self, func, *args, **kwargs):
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                delay = self._next_delay(attempt, e, start)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+            attempt += 1
+
+    async def acall(self, func, *args, **kwargs):
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                delay = self._next_delay(attempt, e, start)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
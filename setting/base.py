@@ -12,9 +12,27 @@ GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
 
+# Embedding cache settings
+EMBEDDING_CACHE_PATH = os.environ.get(
+    "EMBEDDING_CACHE_PATH", "~/.cache/graph/embeddings.sqlite"
+)
+EMBEDDING_CACHE_MAX_BYTES = int(
+    os.environ.get("EMBEDDING_CACHE_MAX_BYTES", 2 * 1024 * 1024 * 1024)
+)
+
+# LLM response cache settings
+RESPONSE_CACHE_PATH = os.environ.get(
+    "RESPONSE_CACHE_PATH", "~/.cache/graph/llm_responses.sqlite"
+)
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", 30 * 24 * 3600))
+RESPONSE_CACHE_MAX_BYTES = int(
+    os.environ.get("RESPONSE_CACHE_MAX_BYTES", 1024 * 1024 * 1024)
+)
+
 # DB settings
 DATABASE_URI = os.environ.get("DATABASE_URI")
 SESSION_POOL_SIZE: int = os.environ.get("SESSION_POOL_SIZE", 40)
+BULK_INSERT_CHUNK_SIZE = int(os.environ.get("BULK_INSERT_CHUNK_SIZE", 500))
 
 
 # Model configurations
@@ -29,3 +47,16 @@ def parse_model_configs() -> dict:
 
 
 MODEL_CONFIGS = parse_model_configs()
+
+
+def parse_rate_limits() -> dict:
+    """Parse LLM_RATE_LIMITS from environment variable"""
+    config_str = os.environ.get("LLM_RATE_LIMITS", "{}")
+    try:
+        return json.loads(config_str)
+    except json.JSONDecodeError:
+        print(f"Warning: Invalid LLM_RATE_LIMITS format: {config_str}")
+        return {}
+
+
+LLM_RATE_LIMITS = parse_rate_limits()
@@ -0,0 +1,124 @@
+import os
+import json
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "text-embedding-3-small")
+DEFAULT_EMBEDDING_DIMENSION = int(os.environ.get("EMBEDDING_DIMENSION", 1536))
+
+# native output dimension of the known models
+MODEL_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+
+@dataclass(frozen=True)
+class EmbeddingSpec:
+    """
+    How one vector column is embedded.
+
+    A `dimension` below the model's native dimension means Matryoshka
+    truncation: the vector keeps its first `dimension` components (and is
+    renormalized if `normalize`), which only makes sense for models trained
+    for it, such as text-embedding-3-*.
+    """
+
+    model: str = DEFAULT_EMBEDDING_MODEL
+    dimension: int = DEFAULT_EMBEDDING_DIMENSION
+    normalize: bool = True
+    # physical column name, defaults to the attribute name; point it at a new
+    # column once a re-embedding migration has filled it
+    column: Optional[str] = None
+
+    @property
+    def native_dimension(self) -> int:
+        return MODEL_DIMENSIONS.get(self.model, self.dimension)
+
+    @property
+    def truncated(self) -> bool:
+        return self.dimension < self.native_dimension
+
+    def prepare(self, vectors: Sequence[Sequence[float]]) -> List[List[float]]:
+        """Truncate and normalize model output to what the column stores."""
+        if not vectors:
+            return []
+        if not self.truncated and not self.normalize:
+            return [list(vector) for vector in vectors]
+        matrix = np.asarray(vectors, dtype=np.float32)[:, : self.dimension]
+        if self.normalize:
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix = matrix / norms
+        return matrix.tolist()
+
+
+def parse_embedding_configs(name: str = "EMBEDDING_CONFIGS") -> Dict[str, EmbeddingSpec]:
+    """
+    Parse EMBEDDING_CONFIGS (or another variable of the same format) from
+    environment variable, e.g.
+    {"concepts.definition_vec": {"dimension": 512, "column": "definition_vec_512"}}
+    """
+    config_str = os.environ.get(name, "{}")
+    try:
+        configs = json.loads(config_str)
+        return {key: EmbeddingSpec(**config) for key, config in configs.items()}
+    except (json.JSONDecodeError, TypeError, AttributeError):
+        print(f"Warning: Invalid {name} format: {config_str}")
+        return {}
+
+
+# "table.attribute" -> spec, for every vector column of the schema
+EMBEDDING_REGISTRY: Dict[str, EmbeddingSpec] = {
+    key: EmbeddingSpec()
+    for key in (
+        "knowledge_blocks.content_vec",
+        "concepts.definition_vec",
+        "relationships.relationship_desc_vec",
+        "best_practices.guideline_vec",
+    )
+}
+EMBEDDING_REGISTRY.update(parse_embedding_configs())
+
+
+def get_embedding_spec(key: str) -> EmbeddingSpec:
+    """Spec of a vector column, keyed "table.attribute"."""
+    if key not in EMBEDDING_REGISTRY:
+        raise KeyError(f"No embedding spec registered for {key}")
+    return EMBEDDING_REGISTRY[key]
+
+
+def register_embedding_spec(key: str, spec: Optional[EmbeddingSpec] = None, **changes):
+    """
+    Register or update the spec of a vector column. Must run before
+    knowledge_graph.models is imported to change the schema.
+    """
+    spec = spec or EMBEDDING_REGISTRY.get(key, EmbeddingSpec())
+    EMBEDDING_REGISTRY[key] = replace(spec, **changes) if changes else spec
+    return EMBEDDING_REGISTRY[key]
+
+
+# "table.attribute" -> target spec of a re-embedding migration in progress
+# (see knowledge_graph.migration); builders also fill its column, so rows
+# written before the registry switches to it are not left without a vector
+EMBEDDING_MIGRATIONS: Dict[str, EmbeddingSpec] = parse_embedding_configs(
+    "EMBEDDING_MIGRATIONS"
+)
+
+
+def get_embedding_migration(key: str) -> Optional[EmbeddingSpec]:
+    """Target spec of the re-embedding migration of a column, if one is registered."""
+    return EMBEDDING_MIGRATIONS.get(key)
+
+
+def register_embedding_migration(key: str, spec: EmbeddingSpec):
+    if not spec.column:
+        raise ValueError(f"The migration of {key} needs a target column")
+    EMBEDDING_MIGRATIONS[key] = spec
+
+
+def unregister_embedding_migration(key: str):
+    EMBEDDING_MIGRATIONS.pop(key, None)
@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# setting.db creates its engine on import; point it at a throwaway SQLite file
+# (without any tables) unless a database is configured
+os.environ.setdefault(
+    "DATABASE_URI", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "graph.db")
+)
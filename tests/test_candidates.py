@@ -0,0 +1,198 @@
+import json
+import math
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+pytest.importorskip("tidb_vector")
+
+from knowledge_graph.candidates import (
+    ConceptPair,
+    CooccurrenceIndex,
+    tidb_vector_candidate_pairs,
+)
+from knowledge_graph.graph import DocBuilder
+from knowledge_graph.models import Concept
+from setting.embedding import get_embedding_spec
+
+DIMENSION = get_embedding_spec("concepts.definition_vec").dimension
+
+
+def _vector(*head):
+    return list(head) + [0.0] * (DIMENSION - len(head))
+
+
+def _cosine_distance(a, b):
+    if a is None or b is None:
+        return None
+    a, b = json.loads(a), json.loads(b)
+    dot = sum(x * y for x, y in zip(a, b))
+    return 1 - dot / math.sqrt(sum(x * x for x in a) * sum(y * y for y in b))
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+
+    @event.listens_for(engine, "connect")
+    def register_functions(conn, _):
+        conn.create_function("VEC_COSINE_DISTANCE", 2, _cosine_distance)
+
+    statements = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_statements(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    Concept.__table__.create(engine)
+    with Session(engine) as session:
+        session.add_all(
+            [
+                Concept(
+                    id="east",
+                    name="east",
+                    definition="",
+                    definition_vec=_vector(1.0, 0.0),
+                ),
+                Concept(
+                    id="east-ish",
+                    name="east-ish",
+                    definition="",
+                    definition_vec=_vector(0.9, 0.1),
+                ),
+                Concept(
+                    id="north",
+                    name="north",
+                    definition="",
+                    definition_vec=_vector(0.0, 1.0),
+                ),
+                Concept(id="blank", name="blank", definition=""),
+            ]
+        )
+        session.commit()
+        statements.clear()
+        session.statements = statements
+        yield session
+
+
+def test_cooccurrence_candidate_pairs():
+    index = CooccurrenceIndex(
+        {
+            ("KnowledgeBlock", "b1"): {"a", "b", "c"},
+            ("KnowledgeBlock", "b2"): {"a", "b"},
+            ("KnowledgeBlock", "b3"): {"c", "d"},
+        }
+    )
+    pairs = index.candidate_pairs()
+    assert [(p.concept_a_id, p.concept_b_id, p.score) for p in pairs] == [
+        ("a", "b", 2.0),
+        ("a", "c", 1.0),
+        ("b", "c", 1.0),
+        ("c", "d", 1.0),
+    ]
+    assert pairs[0].shared_blocks == [
+        ("KnowledgeBlock", "b1"),
+        ("KnowledgeBlock", "b2"),
+    ]
+
+    focused = index.candidate_pairs(concept_ids=["c", "d"])
+    assert [p.key for p in focused] == [("a", "c"), ("b", "c"), ("c", "d")]
+    assert [p.key for p in index.candidate_pairs(max_pairs=1)] == [("a", "b")]
+    assert ("a", "b") not in [
+        p.key for p in index.candidate_pairs(exclude={("a", "b")})
+    ]
+    # b1 is a hub once the limit drops below its concept count
+    assert [p.key for p in index.candidate_pairs(max_block_concepts=2)] == [
+        ("a", "b"),
+        ("c", "d"),
+    ]
+
+
+@pytest.mark.parametrize("concept_ids", [None, ["east", "east-ish", "north", "blank"]])
+def test_tidb_vector_candidates_load_query_vectors_in_one_query(db, concept_ids):
+    pairs = tidb_vector_candidate_pairs(db, concept_ids, k=1)
+
+    # one query loads all query vectors, the rest are nearest-neighbor searches
+    lookups = [s for s in db.statements if "VEC_COSINE_DISTANCE" not in s]
+    assert len(lookups) == 1
+    assert [pair.key for pair in pairs] == [("east", "east-ish"), ("east-ish", "north")]
+    assert all(pair.method == "vector" for pair in pairs)
+
+
+class _LLM:
+    def __init__(self):
+        self.prompts = []
+
+    def generate(self, prompt):
+        self.prompts.append(prompt)
+        return '```json\n{"relation_type": "RELATED_TO", "description": "d", "confidence": 0.9}\n```'
+
+
+def _concept(concept_id):
+    return Concept(
+        id=concept_id, name=concept_id.upper(), definition=f"{concept_id} def"
+    )
+
+
+def test_pair_without_shared_blocks_is_judged_on_each_concepts_blocks():
+    llm = _LLM()
+    builder = DocBuilder(llm, embedding_func=None)
+    pair = ConceptPair(
+        "a",
+        "b",
+        0.9,
+        method="vector",
+        concept_blocks={
+            "a": [("KnowledgeBlock", "k1")],
+            "b": [("KnowledgeBlock", "k2")],
+        },
+    )
+    block_texts = {
+        ("KnowledgeBlock", "k1"): "text one",
+        ("KnowledgeBlock", "k2"): "text two",
+    }
+
+    relationship = builder._analyze_concept_pair(
+        _concept("a"), _concept("b"), pair, block_texts
+    )
+
+    prompt = llm.prompts[0]
+    assert "do not appear together" in prompt
+    assert "appear together in the following" not in prompt
+    assert (
+        prompt.index("text one")
+        < prompt.index("Knowledge that mentions Concept 2")
+        < prompt.index("text two")
+    )
+    assert relationship.knowledge_bundle == [
+        {"id": "k1", "type": "KnowledgeBlock"},
+        {"id": "k2", "type": "KnowledgeBlock"},
+    ]
+    assert relationship.attributes["shared_context"] is False
+
+
+def test_pair_with_shared_blocks_uses_the_cooccurrence_prompt():
+    llm = _LLM()
+    builder = DocBuilder(llm, embedding_func=None)
+    pair = ConceptPair("a", "b", 1.0, shared_blocks=[("KnowledgeBlock", "k1")])
+
+    relationship = builder._analyze_concept_pair(
+        _concept("a"), _concept("b"), pair, {("KnowledgeBlock", "k1"): "shared text"}
+    )
+
+    assert "appear together in the following" in llm.prompts[0]
+    assert "shared text" in llm.prompts[0]
+    assert relationship.attributes["shared_context"] is True
+
+
+def test_pair_without_any_block_text_is_skipped():
+    llm = _LLM()
+    builder = DocBuilder(llm, embedding_func=None)
+    pair = ConceptPair(
+        "a", "b", 0.9, method="vector", concept_blocks={"a": [], "b": []}
+    )
+
+    assert builder._analyze_concept_pair(_concept("a"), _concept("b"), pair, {}) is None
+    assert llm.prompts == []
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+pytest.importorskip("tidb_vector")
+
+import knowledge_graph.graph as graph
+from knowledge_graph.graph import DocBuilder
+from knowledge_graph.models import Concept
+from setting.embedding import get_embedding_spec
+
+DIMENSION = get_embedding_spec("concepts.definition_vec").dimension
+
+
+class FakeLLM:
+    model = "gpt-4o"
+
+    def __init__(self):
+        self.prompts = []
+
+    def generate(self, prompt):
+        self.prompts.append(prompt)
+        concepts = [{"name": "TiFlash", "definition": "Columnar storage engine"}]
+        return f"```json\n{json.dumps(concepts)}\n```"
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Concept.__table__.create(engine)
+    # the blocks are only read by name and content (their LONGTEXT column
+    # doesn't compile on SQLite)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE knowledge_blocks (name TEXT, content TEXT)"))
+        conn.execute(
+            text("INSERT INTO knowledge_blocks VALUES (:name, :content)"),
+            {
+                "name": "TiFlash",
+                "content": "TiFlash is the columnar storage engine of TiDB.",
+            },
+        )
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(graph, "SessionLocal", factory)
+    monkeypatch.setattr(
+        graph,
+        "count_tokens_batch",
+        lambda texts, model: [len(text.split()) for text in texts],
+    )
+    return factory
+
+
+def test_analyze_concepts_prompts_from_the_hub(session_factory):
+    llm = FakeLLM()
+    builder = DocBuilder(llm, lambda text: [1.0] + [0.0] * (DIMENSION - 1))
+
+    concepts = builder.analyze_concepts(topic="storage engines")
+
+    assert concepts == [[{"name": "TiFlash", "definition": "Columnar storage engine"}]]
+    (prompt,) = llm.prompts
+    assert "Content: TiFlash is the columnar storage engine of TiDB." in prompt
+    assert "storage engines" in prompt
+    with session_factory() as db:
+        assert [c.name for c in db.query(Concept).all()] == ["TiFlash"]
@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+from setting.embedding import EmbeddingSpec, register_embedding_spec, get_embedding_spec
+
+
+@pytest.fixture
+def registry():
+    saved = {
+        key: get_embedding_spec(key)
+        for key in (
+            "knowledge_blocks.content_vec",
+            "concepts.definition_vec",
+            "relationships.relationship_desc_vec",
+        )
+    }
+    yield
+    for key, spec in saved.items():
+        register_embedding_spec(key, spec)
+
+
+@pytest.fixture
+def column_model(monkeypatch):
+    """Embeddings of models other than the builder's, recorded per model."""
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    import llm.embedding
+
+    calls = []
+
+    def get_text_embeddings(texts, model):
+        calls.append((model, list(texts)))
+        return [[3.0, 4.0, 12.0] for _ in texts]
+
+    def get_text_embedding(text, model):
+        return get_text_embeddings([text], model)[0]
+
+    monkeypatch.setattr(llm.embedding, "get_text_embeddings", get_text_embeddings)
+    monkeypatch.setattr(llm.embedding, "get_text_embedding", get_text_embedding)
+    return calls
+
+
+def test_prepare_truncates_and_normalizes():
+    spec = EmbeddingSpec(model="text-embedding-3-small", dimension=2)
+    assert spec.truncated
+    (vector,) = spec.prepare([[3.0, 4.0, 100.0]])
+    assert np.allclose(vector, [0.6, 0.8])
+
+
+def test_prepare_keeps_zero_vectors():
+    spec = EmbeddingSpec(model="text-embedding-3-small", dimension=2)
+    assert spec.prepare([[0.0, 0.0, 1.0]]) == [[0.0, 0.0]]
+
+
+def test_prepare_without_normalization():
+    spec = EmbeddingSpec(model="custom", dimension=3, normalize=False)
+    assert not spec.truncated
+    assert spec.prepare([(1.0, 2.0, 3.0)]) == [[1.0, 2.0, 3.0]]
+
+
+def test_builder_embeds_with_its_own_funcs_for_its_model(registry, column_model):
+    from knowledge_graph.knowledge import KnowledgeBuilder
+
+    register_embedding_spec(
+        "concepts.definition_vec", EmbeddingSpec(model="model-a", dimension=2)
+    )
+    builder = KnowledgeBuilder(
+        None,
+        None,
+        lambda texts: [[1.0, 1.0, 5.0] for _ in texts],
+        embedding_model="model-a",
+    )
+    vectors = builder._embed_texts(["x"], "concepts.definition_vec")
+    assert np.allclose(vectors, [[2**-0.5, 2**-0.5]])
+    assert column_model == []
+
+
+def test_builder_embeds_other_models_per_column(registry, column_model):
+    from knowledge_graph.graph import DocBuilder
+
+    register_embedding_spec(
+        "concepts.definition_vec", EmbeddingSpec(model="model-b", dimension=2)
+    )
+    builder = DocBuilder(
+        None,
+        None,
+        lambda texts: pytest.fail("the builder's model must not be used"),
+        embedding_model="model-a",
+    )
+    vectors = builder._embed_texts(["x", "y"], "concepts.definition_vec")
+    assert column_model == [("model-b", ["x", "y"])]
+    assert np.allclose(vectors, [[0.6, 0.8], [0.6, 0.8]])
+
+
+def test_retriever_embeds_the_query_once_per_model(registry, column_model):
+    from knowledge_graph.retrieval import Retriever
+
+    register_embedding_spec(
+        "knowledge_blocks.content_vec", EmbeddingSpec(model="model-a", dimension=3)
+    )
+    register_embedding_spec(
+        "concepts.definition_vec", EmbeddingSpec(model="model-a", dimension=2)
+    )
+    register_embedding_spec(
+        "relationships.relationship_desc_vec",
+        EmbeddingSpec(model="model-b", dimension=2),
+    )
+    own_calls = []
+
+    def embed(query):
+        own_calls.append(query)
+        return [0.0, 0.0, 2.0]
+
+    retriever = Retriever(embed, embedding_model="model-a")
+    query_vecs = retriever._embed_query("q")
+    assert own_calls == ["q"]
+    assert column_model == [("model-b", ["q"])]
+    assert np.allclose(query_vecs["knowledge_blocks.content_vec"], [0.0, 0.0, 1.0])
+    assert query_vecs["concepts.definition_vec"] == [0.0, 0.0]
+    assert np.allclose(query_vecs["relationships.relationship_desc_vec"], [0.6, 0.8])
@@ -0,0 +1,106 @@
+from types import SimpleNamespace
+
+import pytest
+
+from llm.embedding_cache import EmbeddingCache
+from setting.embedding import EmbeddingSpec, get_embedding_spec, register_embedding_spec
+
+
+@pytest.fixture
+def registry():
+    saved = get_embedding_spec("concepts.definition_vec")
+    yield
+    register_embedding_spec("concepts.definition_vec", saved)
+
+
+def test_embedding_cache_only_embeds_misses(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path / "embeddings.db"))
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        return [[float(len(text)), 0.5] for text in texts]
+
+    cached = cache.wrap_batch(embed, "model-a")
+    assert cached(["ab", "abc", "ab"]) == [[2.0, 0.5], [3.0, 0.5], [2.0, 0.5]]
+    assert calls == [["ab", "abc"]]
+
+    # whitespace-only changes hit the cache
+    assert cached(["  ab ", "abcd"]) == [[2.0, 0.5], [4.0, 0.5]]
+    assert calls[-1] == ["abcd"]
+    # vectors are keyed by model
+    cache.wrap_batch(embed, "model-b")(["ab"])
+    assert calls[-1] == ["ab"]
+    cache.close()
+
+
+def test_embedding_cache_persists_and_evicts(tmp_path):
+    path = str(tmp_path / "embeddings.db")
+    cache = EmbeddingCache(path=path, memory_size=1)
+    cache.put_many("m", ["a", "b"], [[1.0], [2.0]])
+    cache.close()
+
+    reopened = EmbeddingCache(path=path)
+    assert reopened.get_many("m", ["a", "b", "c"]) == [[1.0], [2.0], None]
+    assert reopened.stats()["hits"] == 2
+    reopened.close()
+
+    # each vector is 4 bytes, so a budget of 8 keeps at most the newest ones
+    small = EmbeddingCache(path=str(tmp_path / "small.db"), max_disk_bytes=8)
+    small.put_many("m", ["a", "b", "c"], [[1.0], [2.0], [3.0]])
+    assert small.stats()["disk_bytes"] <= 8
+    small.close()
+
+
+class FakeEmbeddingsAPI:
+    def __init__(self):
+        self.inputs = []
+
+    def create(self, input, model):
+        self.inputs.append((model, list(input)))
+        data = [
+            SimpleNamespace(index=i, embedding=[float(len(text)), 1.0])
+            for i, text in enumerate(input)
+        ]
+        return SimpleNamespace(data=data)
+
+
+@pytest.fixture
+def embedding_module(monkeypatch, tmp_path):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    import llm.embedding
+
+    api = FakeEmbeddingsAPI()
+    client = SimpleNamespace(embeddings=api)
+    monkeypatch.setattr(llm.embedding, "embedding_model", client)
+    monkeypatch.setattr(llm.embedding._default_engine, "client", client)
+    monkeypatch.setattr(
+        llm.embedding,
+        "count_tokens_batch",
+        lambda texts, model: [len(text.split()) for text in texts],
+    )
+    cache = llm.embedding.enable_embedding_cache(
+        EmbeddingCache(path=str(tmp_path / "embeddings.db"))
+    )
+    yield llm.embedding, api
+    llm.embedding.disable_embedding_cache()
+    cache.close()
+
+
+def test_module_embeddings_go_through_the_cache(embedding_module, registry):
+    embedding, api = embedding_module
+
+    assert embedding.get_text_embeddings(["ab", "abc"]) == [[2.0, 1.0], [3.0, 1.0]]
+    assert embedding.get_text_embeddings(["abc", "abcd"])[0] == [3.0, 1.0]
+    assert embedding.get_text_embedding("ab") == [2.0, 1.0]
+    assert [texts for _, texts in api.inputs] == [["ab", "abc"], ["abcd"]]
+
+    # columns embedded with another model are cached under that model
+    register_embedding_spec(
+        "concepts.definition_vec",
+        EmbeddingSpec(model="other", dimension=2, normalize=False),
+    )
+    embed, embed_batch = embedding.get_column_embedding_funcs("concepts.definition_vec")
+    assert embed_batch(["ab", "xyz"]) == [[2.0, 1.0], [3.0, 1.0]]
+    assert embed("xyz") == [3.0, 1.0]
+    assert api.inputs[2:] == [("other", ["ab", "xyz"])]
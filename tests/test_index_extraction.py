@@ -0,0 +1,114 @@
+import json
+
+import pytest
+
+from knowledge_graph.knowledge import KnowledgeBuilder, check_index_subgraph
+
+GOOD = {
+    "entities": [{"name": "TiFlash", "definition": "Columnar storage"}],
+    "relationships": [],
+}
+
+
+@pytest.mark.parametrize(
+    "subgraph",
+    [
+        [GOOD],
+        {"entities": []},
+        {"entities": [{"name": "x"}], "relationships": []},
+        {"entities": [{"name": ["x"], "definition": "d"}], "relationships": []},
+        {"entities": [], "relationships": [{"source_entity": "a"}]},
+        {
+            "entities": [],
+            "relationships": [
+                {"source_entity": "a", "target_entity": "b", "definition": 1}
+            ],
+        },
+    ],
+)
+def test_bad_subgraph_shapes(subgraph):
+    with pytest.raises(ValueError):
+        check_index_subgraph(subgraph)
+
+
+def test_good_subgraph_shape():
+    check_index_subgraph(GOOD)
+    check_index_subgraph(
+        {
+            "entities": [],
+            "relationships": [
+                {"source_entity": "a", "target_entity": "b", "relationship_type": None}
+            ],
+        }
+    )
+
+
+class FakeLLM:
+    model = "fake"
+
+    def __init__(self, responses):
+        self.responses = responses
+
+    def generate(self, prompt):
+        for path, response in self.responses.items():
+            if f"'{path}'" in prompt:
+                return response
+        raise AssertionError("unexpected prompt")
+
+
+def test_bad_paths_are_skipped_before_the_upsert(tmp_path):
+    nodes = "".join(
+        f'<node TEXT="{name}"><node TEXT="Definition"><node TEXT="d"/></node></node>'
+        for name in ("good", "list", "missing", "broken")
+    )
+    index_file = tmp_path / "index.mm"
+    index_file.write_text(f'<map><node TEXT="Map">{nodes}</node></map>')
+
+    responses = {
+        "good": json.dumps(GOOD),
+        "list": json.dumps({"entities": {"name": "x"}, "relationships": []}),
+        "missing": json.dumps({"entities": [{"name": "x"}], "relationships": []}),
+        "broken": "no json here",
+    }
+    builder = KnowledgeBuilder(FakeLLM(responses), None, index_workers=4)
+    upserted = []
+    builder._upsert_index_subgraphs = lambda extracted, *args: upserted.extend(
+        extracted
+    )
+
+    results = builder.extract_knowledge_index(str(index_file), {"doc_link": "l"})
+
+    assert results == [responses["good"]]
+    assert [knowledge["path"] for knowledge, _, _, _ in upserted] == [["good"]]
+
+
+class QAExtracted(Exception):
+    pass
+
+
+def test_qa_extraction_parses_the_document(tmp_path, monkeypatch):
+    import knowledge_graph.knowledge as knowledge
+
+    monkeypatch.setattr(
+        knowledge,
+        "count_tokens_batch",
+        lambda texts, model: [len(text.split()) for text in texts],
+    )
+    doc = tmp_path / "faq.md"
+    doc.write_text("# FAQ\n\nWhat is TiFlash? The columnar storage engine.\n")
+    prompts = []
+
+    class CapturingLLM:
+        model = "fake"
+
+        def generate(self, prompt):
+            prompts.append(prompt)
+            raise QAExtracted
+
+    builder = KnowledgeBuilder(CapturingLLM(), None)
+    with pytest.raises(QAExtracted):
+        builder.extract_qa_blocks(
+            str(doc), {}, token_counter=lambda text: len(text.split())
+        )
+    (prompt,) = prompts
+    assert "What is TiFlash? The columnar storage engine." in prompt
@@ -0,0 +1,49 @@
+import pytest
+
+from knowledge_graph.index_tree import index_leaves, index_tree_dict, walk_index_leaves
+from knowledge_graph.parser.base import FileData, Index, IndexLeaf
+
+
+def _indexes():
+    return [
+        Index(
+            "SQL",
+            [
+                Index("Reference", [Index("select.md"), Index("join.md")]),
+                Index("Tuning", [Index("Definition", [Index("Make queries fast")])]),
+            ],
+        ),
+        Index("Ops", [Index("Annotation", [Index("Runbooks")])]),
+    ]
+
+
+def test_walk_index_leaves_in_document_order():
+    assert list(walk_index_leaves(_indexes())) == [
+        IndexLeaf(("SQL",), "references", ("select.md", "join.md")),
+        IndexLeaf(("SQL", "Tuning"), "definition", ("Make queries fast",)),
+        IndexLeaf(("Ops",), "annotation", ("Runbooks",)),
+    ]
+    assert list(walk_index_leaves(None)) == []
+    assert len(list(walk_index_leaves(_indexes()[1]))) == 1
+
+
+def test_walk_index_leaves_rejects_nested_leaf_values():
+    bad = Index("Reference", [Index("doc.md", [Index("child")])])
+    with pytest.raises(ValueError):
+        list(walk_index_leaves(bad))
+
+
+def test_index_leaves_prefers_the_parser_leaves():
+    leaves = [IndexLeaf(("x",), "references", ("y",))]
+    assert index_leaves(FileData("f", "", indexes=_indexes(), leaves=leaves)) is leaves
+    assert len(index_leaves(FileData("f", "", indexes=_indexes()))) == 3
+
+
+def test_index_tree_dict():
+    assert index_tree_dict(_indexes()) == {
+        "SQL": {
+            "Reference": ["select.md", "join.md"],
+            "Tuning": {"Definition": ["Make queries fast"]},
+        },
+        "Ops": {"Annotation": ["Runbooks"]},
+    }
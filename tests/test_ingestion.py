@@ -0,0 +1,57 @@
+import queue
+
+from knowledge_graph.ingestion import _DONE, DocumentTask, IngestionRunner
+
+
+def _task(i):
+    return DocumentTask(path=f"doc{i}.md", attributes={}, ledger_id=str(i))
+
+
+def _run_stage(runner, stage_func, workers=2, tasks=5):
+    in_queue = queue.Queue()
+    out_queue = queue.Queue(maxsize=1)
+    threads = runner._start_stage("test", stage_func, workers, in_queue, out_queue)
+    for i in range(tasks):
+        in_queue.put(_task(i))
+    in_queue.put(_DONE)
+
+    results = []
+    while True:
+        item = out_queue.get(timeout=5)
+        if item is _DONE:
+            break
+        results.append(item)
+    for thread in threads:
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+    return results
+
+
+def test_stage_forwards_results_and_end_marker():
+    runner = IngestionRunner(builder=None)
+    results = _run_stage(runner, lambda task: task)
+    assert sorted(task.path for task in results) == [f"doc{i}.md" for i in range(5)]
+
+
+def test_stage_finishes_when_the_ledger_is_unavailable():
+    # the test database has no ledger table, so recording the failure fails too
+    runner = IngestionRunner(builder=None)
+
+    def broken(task):
+        raise RuntimeError("stage failed")
+
+    assert _run_stage(runner, broken) == []
+    assert runner._stats["failed"] == 5
+
+
+def test_stage_finishes_when_failure_handling_raises():
+    runner = IngestionRunner(builder=None)
+
+    def broken(task):
+        raise RuntimeError("stage failed")
+
+    def broken_fail(task, stage_name, error):
+        raise ConnectionError("database is down")
+
+    runner._fail = broken_fail
+    assert _run_stage(runner, broken) == []
@@ -0,0 +1,119 @@
+import re
+from types import SimpleNamespace
+
+from knowledge_graph.parser.markdown import MarkdownParser
+
+
+def _words(text):
+    return len(text.split())
+
+
+def _chars(text):
+    # one token per character and per run of whitespace
+    return len(re.sub(r"\s+", " ", text))
+
+
+def _blocks(text, **kwargs):
+    return list(MarkdownParser().iter_blocks(text.split("\n"), "doc", **kwargs))
+
+
+def test_sections_carry_their_parent_context():
+    blocks = _blocks(
+        "Intro text\n# Guide\nGuide intro\n## Install\nRun it\n## Use\n"
+        "```\n## not a heading\n```\n### Detail\nMore"
+    )
+    assert [(b.name, b.position) for b in blocks] == [
+        ("doc", 0),
+        ("Install", 1),
+        ("Use", 2),
+    ]
+    assert blocks[0].content == "Intro text"
+    assert blocks[1].content == "# Guide\nGuide intro\n## Install\nRun it"
+    assert blocks[2].content.endswith("```\n## not a heading\n```\n### Detail\nMore")
+
+
+def test_document_without_headings_is_one_block():
+    blocks = _blocks("just\ntext")
+    assert [(b.name, b.content) for b in blocks] == [("doc", "just\ntext")]
+
+
+def test_oversized_sections_are_split_with_repeated_headings():
+    paragraphs = "\n\n".join(f"para {i} " + "word " * 8 for i in range(6))
+    blocks = _blocks(
+        "# Guide\n## Big\n" + paragraphs, max_tokens=30, token_counter=_words
+    )
+
+    assert len(blocks) > 1
+    assert [b.position for b in blocks] == list(range(len(blocks)))
+    assert blocks[0].name == f"Big (1/{len(blocks)})"
+    for block in blocks:
+        assert block.content.startswith("# Guide\n## Big\n\n")
+        assert _words(block.content) <= 30
+    body = " ".join(b.content for b in blocks)
+    for i in range(6):
+        assert f"para {i}" in body
+
+
+def test_split_overlap_repeats_trailing_text():
+    paragraphs = "\n\n".join(f"p{i} w w" for i in range(6))
+    blocks = _blocks(
+        "## S\n" + paragraphs, max_tokens=14, overlap_tokens=6, token_counter=_words
+    )
+    assert len(blocks) > 2
+    for previous, block in zip(blocks, blocks[1:]):
+        last = previous.content.split("\n\n")[-1]
+        assert last in block.content
+
+
+def test_oversized_preambles_are_split():
+    preamble = "\n\n".join(f"p{i} " + "w " * 9 for i in range(5))
+    for text in (preamble, preamble + "\n## A\nx"):
+        blocks = _blocks(text, max_tokens=10, token_counter=_words)
+        parts = [b for b in blocks if b.name.startswith("doc")]
+        assert [b.name for b in parts] == [f"doc ({i}/5)" for i in range(1, 6)]
+        assert [b.position for b in blocks] == list(range(len(blocks)))
+        assert all(_words(b.content) <= 10 for b in parts)
+        assert "\n\n".join(b.content for b in parts) == preamble
+
+
+def test_unbroken_text_is_cut_on_the_budget():
+    # without spaces, and with CJK full stops not followed by whitespace
+    sentence = "数据库" * 100 + "。"
+    blocks = _blocks("## A\n" + sentence * 4, max_tokens=100, token_counter=_chars)
+    assert len(blocks) > 4
+    for block in blocks:
+        assert block.content.startswith("## A\n\n")
+        assert _chars(block.content) <= 100
+    body = "".join(b.content.split("\n\n", 1)[1].replace("\n\n", "") for b in blocks)
+    assert body == sentence * 4
+
+    # sentences short enough are kept whole
+    blocks = _blocks("## A\n" + "短句。" * 40, max_tokens=20, token_counter=_chars)
+    assert all(b.content.endswith("。") for b in blocks)
+
+
+def test_parse_reads_the_file(tmp_path):
+    path = tmp_path / "notes.md"
+    path.write_text("## A\nx\n## B\ny\n", encoding="utf-8")
+    data = MarkdownParser().parse(str(path))
+    assert data.name == "notes"
+    assert data.content == "## A\nx\n## B\ny\n"
+    assert [b.name for b in data.blocks] == ["A", "B"]
+
+
+def test_builder_accepts_documents_of_unbroken_text(tmp_path, monkeypatch):
+    import knowledge_graph.knowledge as knowledge
+
+    monkeypatch.setattr(
+        knowledge,
+        "count_tokens_batch",
+        lambda texts, model: [_chars(text) for text in texts],
+    )
+    path = tmp_path / "cjk.md"
+    text = "数据库" * 2000
+    path.write_text(f"{text}\n## A\n{text}\n", encoding="utf-8")
+
+    builder = knowledge.KnowledgeBuilder(SimpleNamespace(model="gpt-4o"), None)
+    _, blocks = builder.parse_document(str(path), token_counter=_chars)
+    assert len(blocks) > 2
+    assert all(_chars(b.content) <= knowledge.MAX_BLOCK_TOKENS for b in blocks)
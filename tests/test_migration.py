@@ -0,0 +1,96 @@
+import json
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+pytest.importorskip("tidb_vector")
+
+from knowledge_graph.migration import ReembeddingMigration, write_migration_vectors
+from knowledge_graph.models import Concept
+from setting.embedding import (
+    EmbeddingSpec,
+    get_embedding_spec,
+    register_embedding_migration,
+    unregister_embedding_migration,
+)
+
+KEY = "concepts.definition_vec"
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    Concept.__table__.create(engine)
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE concepts ADD COLUMN definition_vec_2 TEXT"))
+    return engine
+
+
+@pytest.fixture
+def migration_spec():
+    spec = EmbeddingSpec(model="model-b", dimension=2, column="definition_vec_2")
+    register_embedding_migration(KEY, spec)
+    yield spec
+    unregister_embedding_migration(KEY)
+
+
+def _concepts():
+    return [
+        Concept(id="c1", name="a", definition="alpha", version="1.0"),
+        Concept(id="c2", name="b", definition=None, version="1.0"),
+    ]
+
+
+def test_dual_write_fills_the_migration_column(engine, migration_spec):
+    embedded = []
+
+    def embed(texts):
+        embedded.extend(texts)
+        return [[3.0, 4.0, 9.0] for _ in texts]
+
+    with Session(engine) as db:
+        concepts = _concepts()
+        db.add_all(concepts)
+        db.flush()
+        write_migration_vectors(db, KEY, concepts, "model-b", embed)
+        db.commit()
+        rows = dict(db.execute(text("SELECT id, definition_vec_2 FROM concepts")).all())
+
+    # rows without text have nothing to embed
+    assert embedded == ["alpha"]
+    assert json.loads(rows["c1"]) == pytest.approx([0.6, 0.8])
+    assert rows["c2"] is None
+
+
+def test_no_dual_write_without_a_migration(engine):
+    with Session(engine) as db:
+        write_migration_vectors(
+            db, KEY, _concepts(), "model-b", lambda texts: pytest.fail("embedded")
+        )
+
+
+def test_migration_into_a_new_column(engine):
+    spec = EmbeddingSpec(model="model-b", dimension=2, column="definition_vec_2")
+    migration = ReembeddingMigration(engine, KEY, spec)
+    assert not migration.catch_up
+    assert migration.spec.column == "definition_vec_2"
+
+
+def test_catch_up_pass_over_the_column_in_use(engine):
+    current = get_embedding_spec(KEY)
+    migration = ReembeddingMigration(
+        engine, KEY, EmbeddingSpec(model=current.model, dimension=current.dimension)
+    )
+    assert migration.catch_up
+    assert migration.spec.column == "definition_vec"
+
+
+def test_column_in_use_cannot_change_model(engine):
+    current = get_embedding_spec(KEY)
+    with pytest.raises(ValueError):
+        ReembeddingMigration(
+            engine,
+            KEY,
+            EmbeddingSpec(model="model-b", dimension=current.dimension),
+        )
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from knowledge_graph.quantization import (
+    Float16Quantizer,
+    Int8Quantizer,
+    ProductQuantizer,
+    Quantizer,
+    get_quantizer,
+    rerank,
+    top_k,
+)
+
+
+def _unit_vectors(n=300, dim=32, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize(
+    "quantizer, tolerance",
+    [
+        (Float16Quantizer(), 1e-3),
+        (Int8Quantizer(), 2e-2),
+        (ProductQuantizer(subvectors=8, centroids=64, iterations=10), 0.5),
+    ],
+)
+def test_scores_approximate_exact_dot_products(quantizer, tolerance):
+    vectors = _unit_vectors()
+    codes = quantizer.fit(vectors).encode(vectors)
+    query = vectors[0]
+
+    scores = quantizer.scores(query, codes)
+    assert scores.shape == (len(vectors),)
+    assert np.abs(scores - vectors @ query).max() < tolerance
+    decoded = quantizer.decode(codes)
+    assert decoded.shape == vectors.shape
+    assert np.allclose(decoded @ query, scores, atol=1e-4)
+
+
+def test_concat_codes():
+    vectors = _unit_vectors(n=10)
+    quantizer = Int8Quantizer()
+    codes = Quantizer.concat(quantizer.encode(vectors[:4]), quantizer.encode(vectors[4:]))
+    assert np.allclose(quantizer.decode(codes), quantizer.decode(quantizer.encode(vectors)))
+
+    quantizer = Float16Quantizer()
+    codes = Quantizer.concat(quantizer.encode(vectors[:4]), quantizer.encode(vectors[4:]))
+    assert codes.shape == (10, 32)
+
+
+def test_bytes_per_vector():
+    assert Float16Quantizer().bytes_per_vector(1536) == 3072
+    assert Int8Quantizer().bytes_per_vector(1536) == 1540
+    assert ProductQuantizer(subvectors=96).bytes_per_vector(1536) == 96
+
+
+def test_product_quantizer_validation():
+    with pytest.raises(ValueError):
+        ProductQuantizer(centroids=512)
+    with pytest.raises(ValueError):
+        ProductQuantizer(subvectors=4).encode(_unit_vectors(n=2, dim=8))
+    with pytest.raises(ValueError):
+        ProductQuantizer(subvectors=5).fit(_unit_vectors(n=20, dim=32))
+
+
+def test_quantizer_is_abstract():
+    with pytest.raises(TypeError):
+        Quantizer()
+
+
+def test_get_quantizer():
+    assert isinstance(get_quantizer("pq", subvectors=4), ProductQuantizer)
+    with pytest.raises(ValueError):
+        get_quantizer("binary")
+
+
+def test_top_k_and_rerank():
+    scores = np.asarray([0.1, 0.9, 0.5, 0.7], dtype=np.float32)
+    assert top_k(scores, 2).tolist() == [1, 3]
+    assert top_k(scores, 10).tolist() == [1, 3, 2, 0]
+
+    vectors = _unit_vectors(n=20, dim=8)
+    rows, exact = rerank(vectors[7], np.asarray([3, 7, 11]), vectors, 2)
+    assert rows[0] == 7
+    assert exact[0] == pytest.approx(1.0, abs=1e-5)
+    assert len(rows) == 2
@@ -0,0 +1,72 @@
+import pytest
+
+from llm import rate_limit
+from llm.rate_limit import RateLimiter, get_rate_limiter, register_rate_limit
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    return clock
+
+
+def test_requests_are_spaced_by_the_request_rate(clock):
+    limiter = RateLimiter(requests_per_minute=60)
+    limiter.acquire()
+    limiter.acquire()
+    limiter.acquire()
+    assert clock.sleeps == [pytest.approx(1.0), pytest.approx(1.0)]
+
+
+def test_token_budget(clock):
+    limiter = RateLimiter(tokens_per_minute=600)
+    limiter.acquire(600)
+    assert clock.sleeps == []
+    limiter.acquire(60)
+    assert sum(clock.sleeps) == pytest.approx(6.0)
+    # an oversized request waits for the whole budget instead of forever
+    limiter.acquire(10000)
+    assert sum(clock.sleeps) == pytest.approx(66.0)
+
+
+def test_throttling_halves_the_rate_and_success_restores_it(clock):
+    limiter = RateLimiter(requests_per_minute=100, increase_ratio=0.25, cooldown=5.0)
+    limiter.on_throttle()
+    limiter.on_throttle()  # within the cooldown, ignored
+    assert limiter.current_rate["requests_per_minute"] == pytest.approx(50.0)
+
+    clock.now += 10
+    limiter.on_throttle()
+    assert limiter.current_rate["scale"] == pytest.approx(0.25)
+
+    for _ in range(5):
+        limiter.on_success()
+    assert limiter.current_rate["scale"] == 1.0
+
+
+def test_registered_limiters_are_shared(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_rate_limiters", {})
+    monkeypatch.setattr(
+        rate_limit, "LLM_RATE_LIMITS", {"ollama": {"requests_per_minute": 10}}
+    )
+    model_limiter = register_rate_limit("openai", "gpt-4o", requests_per_minute=5)
+
+    assert get_rate_limiter("openai", "gpt-4o") is model_limiter
+    assert get_rate_limiter("openai", "gpt-4o-mini") is None
+    ollama = get_rate_limiter("ollama", "llama3")
+    assert ollama.requests_per_minute == 10
+    assert get_rate_limiter("ollama", "qwen") is ollama
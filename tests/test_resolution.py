@@ -0,0 +1,114 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from knowledge_graph.models import Concept, Relationship
+from knowledge_graph.resolution import (
+    ConceptResolver,
+    MergePlan,
+    UnionFind,
+    merge_knowledge_bundles,
+    name_tokens,
+)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Concept.__table__.create(engine)
+    Relationship.__table__.create(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def _rel(id_, source_id, target_id, desc=None, bundle=None):
+    return Relationship(
+        id=id_,
+        source_type="Concept",
+        source_id=source_id,
+        target_type="Concept",
+        target_id=target_id,
+        relationship_type="DEPENDS_ON",
+        relationship_desc=desc,
+        knowledge_bundle=bundle,
+    )
+
+
+def test_union_find_groups():
+    sets = UnionFind()
+    sets.union("b", "c")
+    sets.union("d", "e")
+    sets.union("c", "a")
+    sets.find("f")
+
+    assert sets.groups() == {"a": {"a", "b", "c"}, "d": {"d", "e"}, "f": {"f"}}
+
+
+def test_union_find_root_does_not_depend_on_merge_order():
+    rank = lambda item: (len(item), item)
+    first, second = UnionFind(rank), UnionFind(rank)
+    first.union("ccc", "bb")
+    first.union("bb", "a")
+    second.union("a", "ccc")
+    second.union("bb", "ccc")
+
+    assert first.find("ccc") == second.find("ccc") == "a"
+
+
+def test_name_tokens():
+    assert name_tokens("The Indexes of Tables") == ["indexe", "table"]
+    assert name_tokens("Access") == ["access"]
+
+
+def test_merge_knowledge_bundles():
+    a = {"id": "k1", "type": "KnowledgeBlock"}
+    b = {"type": "KnowledgeBlock", "id": "k2"}
+    assert merge_knowledge_bundles([a], [dict(a), b]) == [a, b]
+    assert merge_knowledge_bundles([a], None) == [a]
+
+
+def test_apply_keeps_the_knowledge_of_merged_relationships(db):
+    db.add_all(
+        [
+            Concept(id="db", name="Database"),
+            Concept(id="db2", name="Databases"),
+            Concept(id="disk", name="Disk"),
+            _rel(
+                "r1",
+                "db",
+                "disk",
+                bundle=[
+                    {"id": "k1", "type": "KnowledgeBlock"},
+                    {"id": "d1", "type": "SourceData"},
+                ],
+            ),
+            _rel(
+                "r2",
+                "db2",
+                "disk",
+                desc="stores data on disk",
+                bundle=[
+                    {"id": "k2", "type": "KnowledgeBlock"},
+                    {"id": "k1", "type": "KnowledgeBlock"},
+                ],
+            ),
+            _rel("r3", "db2", "db", bundle=[{"id": "k3", "type": "KnowledgeBlock"}]),
+        ]
+    )
+    db.commit()
+
+    merged = ConceptResolver().apply(db, MergePlan(canonical={"db2": "db"}))
+    db.commit()
+    db.expire_all()
+
+    assert merged == 1
+    assert db.get(Concept, "db2") is None
+    # the self-loop is dropped, the described duplicate survives with both bundles
+    (rel,) = db.query(Relationship).all()
+    assert (rel.id, rel.source_id, rel.target_id) == ("r2", "db", "disk")
+    assert rel.relationship_desc == "stores data on disk"
+    assert rel.knowledge_bundle == [
+        {"id": "k2", "type": "KnowledgeBlock"},
+        {"id": "k1", "type": "KnowledgeBlock"},
+        {"id": "d1", "type": "SourceData"},
+    ]
@@ -0,0 +1,37 @@
+from llm.response_cache import ResponseCache, response_cache_key
+
+
+def test_response_cache(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "responses.db"), ttl=0)
+    key = response_cache_key("openai", "gpt-4o", "system", "prompt", {"temperature": 0})
+    assert key == response_cache_key(
+        "openai", "gpt-4o", "system", "prompt", {"temperature": 0}
+    )
+    assert key != response_cache_key("openai", "gpt-4o", None, "prompt")
+
+    assert cache.get(key) is None
+    cache.put(key, "answer")
+    assert cache.get(key) == "answer"
+    assert cache.stats()["hits"] == 1
+    cache.clear()
+    assert cache.get(key) is None
+    cache.close()
+
+
+def test_response_cache_expiry_and_eviction(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("llm.response_cache.time.time", lambda: now[0])
+    cache = ResponseCache(path=str(tmp_path / "responses.db"), ttl=60, max_bytes=10)
+
+    cache.put("old", "12345")
+    now[0] += 1
+    cache.put("new", "12345")
+    now[0] += 1
+    cache.put("newest", "12345")
+    # over budget: the least recently used entry is evicted
+    assert cache.get("old") is None
+    assert cache.get("newest") == "12345"
+
+    now[0] += 120
+    assert cache.get("newest") is None
+    cache.close()
@@ -0,0 +1,46 @@
+from collections import OrderedDict
+
+import pytest
+
+from knowledge_graph import retrieval
+from knowledge_graph.retrieval import Retriever, retrieve
+from knowledge_graph.vector_store import LocalVectorStore
+
+
+@pytest.fixture(autouse=True)
+def retrievers(monkeypatch):
+    monkeypatch.setattr(retrieval, "_retrievers", OrderedDict())
+    used = []
+    monkeypatch.setattr(
+        Retriever,
+        "retrieve",
+        lambda self, query, **kwargs: used.append(self) or iter(()),
+    )
+    return used
+
+
+def _embed(query):
+    return [1.0, 0.0]
+
+
+def test_retrieve_reuses_one_retriever_per_arguments(retrievers):
+    store = LocalVectorStore(dim=2)
+    retrieve("a", embedding_func=_embed, vector_store=store)
+    retrieve("b", embedding_func=_embed, vector_store=store)
+    retrieve("c", embedding_func=_embed, vector_store=LocalVectorStore(dim=2))
+
+    assert retrievers[0] is retrievers[1]
+    assert retrievers[2] is not retrievers[0]
+    assert retrievers[0].vector_store is store
+
+
+def test_shared_retrievers_are_bounded(retrievers, monkeypatch):
+    monkeypatch.setattr(retrieval, "MAX_SHARED_RETRIEVERS", 2)
+    stores = [LocalVectorStore(dim=2) for _ in range(3)]
+    retrieve("a", embedding_func=_embed, vector_store=stores[0])
+    retrieve("b", embedding_func=_embed, vector_store=stores[1])
+    retrieve("c", embedding_func=_embed, vector_store=stores[0])
+    retrieve("d", embedding_func=_embed, vector_store=stores[2])
+
+    # the least recently used retriever (stores[1]) was dropped
+    assert [key[2] for key in retrieval._retrievers] == [stores[0], stores[2]]
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from llm.providers.ollama import OllamaProvider
+from llm.retry import ErrorKind, RetryPolicy, classify_error
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": headers or {}})()
+
+
+def _flaky(errors, result="ok"):
+    calls = []
+
+    def func():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+
+    return func, calls
+
+
+def test_classify_error():
+    assert classify_error(_StatusError(429)) is ErrorKind.THROTTLING
+    assert classify_error(_StatusError(503)) is ErrorKind.SERVER
+    assert classify_error(_StatusError(400)) is ErrorKind.VALIDATION
+    assert classify_error(_StatusError(401)) is ErrorKind.AUTH
+    assert classify_error(TimeoutError()) is ErrorKind.TIMEOUT
+    throttled = Exception()
+    throttled.response = {"Error": {"Code": "ThrottlingException"}}
+    assert classify_error(throttled) is ErrorKind.THROTTLING
+    assert classify_error(ValueError("boom")) is ErrorKind.UNKNOWN
+
+
+def test_retries_transient_errors(monkeypatch):
+    monkeypatch.setattr("llm.retry.time.sleep", lambda delay: None)
+    func, calls = _flaky([_StatusError(503), _StatusError(429)])
+    assert RetryPolicy(max_retries=2).call(func) == "ok"
+    assert len(calls) == 3
+
+
+def test_gives_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr("llm.retry.time.sleep", lambda delay: None)
+    func, calls = _flaky([_StatusError(503)] * 3)
+    with pytest.raises(_StatusError):
+        RetryPolicy(max_retries=2).call(func)
+    assert len(calls) == 3
+
+
+def test_does_not_retry_validation_or_unknown_errors(monkeypatch):
+    monkeypatch.setattr("llm.retry.time.sleep", lambda delay: None)
+    func, calls = _flaky([_StatusError(400)])
+    with pytest.raises(_StatusError):
+        RetryPolicy().call(func)
+    assert len(calls) == 1
+
+    func, calls = _flaky([ValueError("boom")])
+    assert RetryPolicy(retry_unknown=True).call(func) == "ok"
+    assert len(calls) == 2
+
+
+def test_honors_retry_after_and_deadline():
+    error = _StatusError(429, headers={"retry-after": "30"})
+    assert RetryPolicy(base_delay=0.0).compute_delay(0, error) == 30.0
+
+    func, calls = _flaky([error])
+    with pytest.raises(_StatusError):
+        RetryPolicy(deadline=10.0).call(func)
+    assert len(calls) == 1
+
+
+def test_acall_retries(monkeypatch):
+    async def no_sleep(delay):
+        pass
+
+    monkeypatch.setattr("llm.retry.asyncio.sleep", no_sleep)
+    errors = [_StatusError(503)]
+
+    async def func():
+        if errors:
+            raise errors.pop()
+        return "ok"
+
+    assert asyncio.run(RetryPolicy().acall(func)) == "ok"
+
+
+def test_provider_does_not_mutate_a_shared_policy():
+    policy = RetryPolicy(max_retries=5, base_delay=1.0, request_timeout=12.0)
+    provider = OllamaProvider("llama3", max_retries=1, retry_delay=0.5, retry_policy=policy)
+
+    assert (policy.max_retries, policy.base_delay) == (5, 1.0)
+    assert (provider.retry_policy.max_retries, provider.retry_policy.base_delay) == (1, 0.5)
+    assert provider.retry_policy.request_timeout == 12.0
+    assert provider.async_client.timeout.read == 12.0
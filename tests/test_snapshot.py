@@ -0,0 +1,85 @@
+import numpy as np
+
+from knowledge_graph.candidates import CooccurrenceIndex
+from knowledge_graph.snapshot import GraphSnapshot
+
+
+def _snapshot():
+    # c1..c3 are concepts, b1/b2 knowledge blocks
+    node_ids = ["c1", "c2", "c3", "b1", "b2"]
+    edges = [
+        ("c1", "c2", "RELATED"),
+        ("c2", "c3", "PART_OF"),
+        ("c1", "b1", "MENTIONED_IN"),
+        ("c2", "b1", "MENTIONED_IN"),
+        ("c3", "b2", "MENTIONED_IN"),
+        ("c2", "b2", "MENTIONED_IN"),
+    ]
+    relationship_types = ["RELATED", "PART_OF", "MENTIONED_IN"]
+    return GraphSnapshot(
+        node_ids=node_ids,
+        node_names=["one", "two", "three", "", ""],
+        node_type_codes=np.asarray([0, 0, 0, 1, 1], dtype=np.int8),
+        node_types=["Concept", "KnowledgeBlock"],
+        relationship_ids=[f"r{i}" for i in range(len(edges))],
+        relationship_types=relationship_types,
+        sources=np.asarray([node_ids.index(e[0]) for e in edges], dtype=np.int32),
+        targets=np.asarray([node_ids.index(e[1]) for e in edges], dtype=np.int32),
+        type_codes=np.asarray(
+            [relationship_types.index(e[2]) for e in edges], dtype=np.int16
+        ),
+    )
+
+
+def test_neighbors():
+    graph = _snapshot()
+    assert sorted(graph.neighbors("c2")) == [
+        ("b1", "MENTIONED_IN"),
+        ("b2", "MENTIONED_IN"),
+        ("c1", "RELATED"),
+        ("c3", "PART_OF"),
+    ]
+    assert graph.neighbors("c2", direction="out", relationship_types=["PART_OF"]) == [
+        ("c3", "PART_OF")
+    ]
+    assert graph.neighbors("c2", direction="in") == [("c1", "RELATED")]
+    assert graph.neighbors("missing") == []
+    assert graph.node_type("b1") == "KnowledgeBlock"
+    assert graph.node_name("c3") == "three"
+
+
+def test_k_hop():
+    graph = _snapshot()
+    distances, relationships = graph.k_hop(["c1"], k=2, relationship_types=["RELATED", "PART_OF"])
+    assert distances == {"c1": 0, "c2": 1, "c3": 2}
+    assert relationships == ["r0", "r1"]
+
+    distances, _ = graph.k_hop(["c1"], k=1, direction="out")
+    assert distances == {"c1": 0, "c2": 1, "b1": 1}
+    distances, _ = graph.k_hop(["c1"], k=3, max_nodes=2)
+    assert len(distances) == 2
+
+
+def test_save_and_load(tmp_path):
+    graph = _snapshot()
+    path = str(tmp_path / "graph.npz")
+    graph.save(path)
+    loaded = GraphSnapshot.load(path)
+
+    assert loaded.stats() == graph.stats()
+    assert loaded.edge(1) == graph.edge(1) == {
+        "id": "r1",
+        "source_id": "c2",
+        "target_id": "c3",
+        "relationship_type": "PART_OF",
+    }
+    assert sorted(loaded.neighbors("c2")) == sorted(graph.neighbors("c2"))
+
+
+def test_cooccurrence_index_from_snapshot():
+    index = CooccurrenceIndex.from_snapshot(_snapshot())
+    assert index.block_concepts == {
+        ("KnowledgeBlock", "b1"): {"c1", "c2"},
+        ("KnowledgeBlock", "b2"): {"c2", "c3"},
+    }
+    assert index.shared_blocks("c1", "c2") == [("KnowledgeBlock", "b1")]
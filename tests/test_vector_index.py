@@ -0,0 +1,106 @@
+import json
+import math
+
+import pytest
+from sqlalchemy import Column, String, create_engine, event
+from sqlalchemy.orm import Session, declarative_base
+
+pytest.importorskip("tidb_vector")
+from tidb_vector.sqlalchemy import VectorType
+
+from knowledge_graph.vector_index import VectorIndexSpec, vector_search
+
+Base = declarative_base()
+
+
+class Item(Base):
+    __tablename__ = "items"
+
+    id = Column(String(16), primary_key=True)
+    kind = Column(String(16))
+    vec = Column(VectorType(2), nullable=True)
+
+
+def _cosine_distance(a, b):
+    if a is None or b is None:
+        return None
+    a, b = json.loads(a), json.loads(b)
+    dot = sum(x * y for x, y in zip(a, b))
+    return 1 - dot / math.sqrt(sum(x * x for x in a) * sum(y * y for y in b))
+
+
+@pytest.fixture
+def db():
+    # SQLite has no vector index, so every search is a full scan
+    engine = create_engine("sqlite://")
+
+    @event.listens_for(engine, "connect")
+    def register_functions(conn, _):
+        conn.create_function("VEC_COSINE_DISTANCE", 2, _cosine_distance)
+
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        # many rows without a vector, as for SOURCE_OF relationships
+        session.add_all(Item(id=f"null{i}", kind="a") for i in range(20))
+        session.add_all(
+            [
+                Item(id="east", kind="a", vec=[1.0, 0.0]),
+                Item(id="east-ish", kind="b", vec=[0.9, 0.1]),
+                Item(id="north", kind="a", vec=[0.0, 1.0]),
+            ]
+        )
+        session.commit()
+        yield session
+
+
+def ids(rows):
+    return [row.id for row in rows]
+
+
+def test_null_vectors_do_not_crowd_out_hits(db):
+    rows = vector_search(db, Item.vec, [1.0, 0.0], 2, columns=[Item.id])
+    assert ids(rows) == ["east", "east-ish"]
+    assert all(row.distance is not None for row in rows)
+
+
+def test_null_vectors_with_filters(db):
+    rows = vector_search(
+        db, Item.vec, [1.0, 0.0], 2, columns=[Item.id], filters={"kind": "a"}
+    )
+    assert ids(rows) == ["east", "north"]
+
+
+def test_filters_with_list_values(db):
+    rows = vector_search(
+        db, Item.vec, [0.0, 1.0], 5, columns=[Item.id], filters={"kind": ["b"]}
+    )
+    assert ids(rows) == ["east-ish"]
+
+
+def test_prefilter(db):
+    rows = vector_search(
+        db,
+        Item.vec,
+        [1.0, 0.0],
+        5,
+        columns=[Item.id],
+        filters={"kind": "a"},
+        prefilter=True,
+    )
+    assert ids(rows) == ["east", "north"]
+
+
+def test_unsupported_metric(db):
+    with pytest.raises(ValueError):
+        vector_search(db, Item.vec, [1.0, 0.0], 1, metric="dot")
+
+
+def test_index_ddl():
+    spec = VectorIndexSpec("concepts", "definition_vec")
+    assert spec.name == "vec_idx_definition_vec_cosine"
+    assert spec.ddl() == (
+        "ALTER TABLE concepts ADD VECTOR INDEX vec_idx_definition_vec_cosine "
+        "((VEC_COSINE_DISTANCE(definition_vec))) USING HNSW"
+    )
+    with pytest.raises(ValueError):
+        VectorIndexSpec("concepts", "definition_vec", "dot").ddl()
@@ -0,0 +1,185 @@
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from knowledge_graph.vector_store import LocalVectorStore
+
+
+def _vectors(n=50, dim=16, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def _exact_ids(vectors, query, k):
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = normalized @ (query / np.linalg.norm(query))
+    return [f"v{i}" for i in np.argsort(-scores)[:k]]
+
+
+def test_import_does_not_need_a_database():
+    env = {key: value for key, value in os.environ.items() if key != "DATABASE_URI"}
+    code = (
+        "import sys; from knowledge_graph.vector_store import LocalVectorStore; "
+        "assert 'setting.db' not in sys.modules"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", code], cwd=root, env=env, check=True)
+
+
+def test_search_matches_exact_ranking_across_chunks():
+    vectors = _vectors()
+    store = LocalVectorStore(dim=16, chunk_size=7)
+    store.add("concepts", [f"v{i}" for i in range(len(vectors))], vectors)
+
+    query = vectors[3] + 0.1
+    hits = store.search("concepts", query, 5)
+    assert [hit[0] for hit in hits] == _exact_ids(vectors, query, 5)
+    top = vectors[int(hits[0][0][1:])]
+    expected = top @ query / np.linalg.norm(top) / np.linalg.norm(query)
+    assert hits[0][1] == pytest.approx(float(expected), abs=1e-5)
+    assert [hit[1] for hit in hits] == sorted((hit[1] for hit in hits), reverse=True)
+
+
+def test_replace_delete_and_filters():
+    store = LocalVectorStore(dim=2)
+    store.add(
+        "knowledge_blocks",
+        ["a", "b", "c"],
+        [[1, 0], [0, 1], [1, 1]],
+        [{"source_id": "s1"}, {"source_id": "s2"}, {"source_id": "s1"}],
+    )
+    store.add("knowledge_blocks", ["a"], [[0, 1]], [{"source_id": "s1"}])
+    store.delete("knowledge_blocks", ["c"])
+
+    assert store.count("knowledge_blocks") == 2
+    hits = store.search("knowledge_blocks", [1, 0], 3)
+    assert {hit[0] for hit in hits} == {"a", "b"}
+    assert all(hit[1] == pytest.approx(0.0, abs=1e-6) for hit in hits)
+
+    hits = store.search("knowledge_blocks", [0, 1], 3, filters={"source_id": "s1"})
+    assert [hit[0] for hit in hits] == ["a"]
+    assert hits[0][2] == {"source_id": "s1"}
+    hits = store.search(
+        "knowledge_blocks", [0, 1], 3, filters={"source_id": ["s1", "s2"]}
+    )
+    assert {hit[0] for hit in hits} == {"a", "b"}
+
+
+def test_persisted_store_reloads(tmp_path):
+    vectors = _vectors(n=10, dim=4)
+    ids = [f"v{i}" for i in range(10)]
+    store = LocalVectorStore(dim=4, directory=str(tmp_path), dtype="float16")
+    store.add("concepts", ids, vectors)
+    store.delete("concepts", ["v0"])
+
+    reloaded = LocalVectorStore(dim=4, directory=str(tmp_path), dtype="float16")
+    assert reloaded.count("concepts") == 9
+    hits = reloaded.search("concepts", vectors[5], 1)
+    assert hits[0][0] == "v5"
+    assert hits[0][1] == pytest.approx(1.0, abs=1e-2)
+
+
+@pytest.mark.parametrize(
+    "quantization, options",
+    [("float16", {}), ("int8", {}), ("pq", {"subvectors": 4, "centroids": 16})],
+)
+def test_quantized_search_reranks_to_the_exact_top_hit(quantization, options):
+    vectors = _vectors(n=200, dim=16)
+    store = LocalVectorStore(
+        dim=16, quantization=quantization, quantizer_options=options, rerank_factor=10
+    )
+    store.add("concepts", [f"v{i}" for i in range(len(vectors))], vectors)
+    for i in (0, 17, 123):
+        hits = store.search("concepts", vectors[i], 3)
+        assert hits[0][0] == f"v{i}"
+        assert hits[0][1] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_rejects_unknown_options():
+    with pytest.raises(ValueError):
+        LocalVectorStore(dim=4, dtype="int8")
+    with pytest.raises(ValueError):
+        LocalVectorStore(dim=4, quantization="binary")
+    # 96 default pq subvectors don't divide 100 dimensions
+    with pytest.raises(ValueError):
+        LocalVectorStore(dim=100, quantization="pq")
+    LocalVectorStore(dim=96 * 4, quantization="pq")
+
+
+def test_unstorable_metadata_leaves_the_files_aligned(tmp_path):
+    store = LocalVectorStore(dim=2, directory=str(tmp_path))
+    store.add("concepts", ["a"], [[1.0, 0.0]])
+    with pytest.raises(TypeError):
+        store.add("concepts", ["b"], [[0.0, 1.0]], [{"at": datetime.now()}])
+
+    reopened = LocalVectorStore(dim=2, directory=str(tmp_path))
+    reopened.add("concepts", ["z"], [[1.0, 1.0]])
+    hits = reopened.search("concepts", [1.0, 1.0], 1)
+    assert hits[0][0] == "z"
+    assert hits[0][1] == pytest.approx(1.0)
+
+
+def test_rows_written_without_metadata_are_dropped_on_load(tmp_path):
+    store = LocalVectorStore(dim=2, directory=str(tmp_path))
+    store.add("concepts", ["a"], [[1.0, 0.0]])
+    # an add interrupted between the vector and the metadata write
+    with open(tmp_path / "concepts.vec", "ab") as f:
+        f.write(np.asarray([[0.0, 1.0]], dtype=np.float32).tobytes())
+
+    reopened = LocalVectorStore(dim=2, directory=str(tmp_path))
+    reopened.add("concepts", ["z"], [[1.0, 1.0]])
+    assert reopened.count("concepts") == 2
+    hits = reopened.search("concepts", [1.0, 1.0], 1)
+    assert hits[0][0] == "z"
+    assert hits[0][1] == pytest.approx(1.0)
+
+
+def test_pq_is_refit_as_the_collection_grows():
+    vectors = _vectors(n=400, dim=16)
+    options = {"subvectors": 4, "centroids": 16}
+    store = LocalVectorStore(
+        dim=16, quantization="pq", quantizer_options=options, rerank_factor=10
+    )
+    store.add("concepts", [f"v{i}" for i in range(8)], vectors[:8])
+    store.search("concepts", vectors[0], 1)
+    first_codebooks = store._collection("concepts").quantizer.codebooks
+
+    store.add("concepts", [f"v{i}" for i in range(8, 400)], vectors[8:])
+    hits = store.search("concepts", vectors[300], 1)
+    collection = store._collection("concepts")
+    assert collection._fit_rows == 400
+    assert collection.quantizer.codebooks is not first_codebooks
+    assert len(collection.codes()) == 400
+    assert hits[0][0] == "v300"
+
+    frozen = LocalVectorStore(
+        dim=16, quantization="pq", quantizer_options=options, refit_growth=None
+    )
+    frozen.add("concepts", [f"v{i}" for i in range(8)], vectors[:8])
+    frozen.search("concepts", vectors[0], 1)
+    frozen.add("concepts", [f"v{i}" for i in range(8, 400)], vectors[8:])
+    frozen.search("concepts", vectors[0], 1)
+    assert frozen._collection("concepts")._fit_rows == 8
+
+
+def test_trained_store_keeps_its_sample_fit():
+    vectors = _vectors(n=300, dim=16)
+    store = LocalVectorStore(
+        dim=16,
+        quantization="pq",
+        quantizer_options={"subvectors": 4, "centroids": 16},
+        rerank_factor=10,
+    )
+    store.train("concepts", vectors[:200])
+    store.add("concepts", [f"v{i}" for i in range(300)], vectors)
+    hits = store.search("concepts", vectors[250], 1)
+    assert hits[0][0] == "v250"
+    assert store._collection("concepts")._fit_rows == 200
+
+    with pytest.raises(ValueError):
+        LocalVectorStore(dim=16).train("concepts", vectors)
+    with pytest.raises(ValueError):
+        LocalVectorStore(dim=16, refit_growth=1)
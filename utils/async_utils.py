@@ -0,0 +1,24 @@
+import asyncio
+from typing import Any, Awaitable, Iterable, List
+
+
+async def gather_with_concurrency(
+    limit: int, aws: Iterable[Awaitable], return_exceptions: bool = False
+) -> List[Any]:
+    """
+    Like asyncio.gather, but keeps at most `limit` awaitables running at once.
+
+    :param limit: Maximum number of awaitables in flight
+    :param aws: Coroutines or futures to await
+    :param return_exceptions: Return exceptions as results instead of raising
+    :return: Results in the same order as `aws`
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(aw: Awaitable) -> Any:
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(
+        *(run(aw) for aw in aws), return_exceptions=return_exceptions
+    )
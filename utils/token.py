@@ -1,12 +1,105 @@
+import threading
+from functools import lru_cache
+from typing import Callable, Dict, List
+
 import tiktoken
 
-def calculate_tokens(text: str, model: str = "gpt-4o") -> int:
+DEFAULT_ENCODING = "o200k_base"
+
+_tokenizers: Dict[str, Callable[[str], int]] = {}
+_tokenizers_lock = threading.Lock()
+
+
+def register_tokenizer(model_prefix: str, count_func: Callable[[str], int]):
+    """
+    Register a token counter for every model whose name starts with `model_prefix`.
+
+    :param model_prefix: Model name prefix, the longest matching prefix wins
+    :param count_func: Function returning the number of tokens of a text
+    """
+    with _tokenizers_lock:
+        _tokenizers[model_prefix] = count_func
+    _find_tokenizer.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def _find_tokenizer(model: str):
+    with _tokenizers_lock:
+        matches = [prefix for prefix in _tokenizers if model.startswith(prefix)]
+        if not matches:
+            return None
+        return _tokenizers[max(matches, key=len)]
+
+
+@lru_cache(maxsize=None)
+def get_encoding_by_name(encoding_name: str) -> tiktoken.Encoding:
+    return tiktoken.get_encoding(encoding_name)
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str) -> tiktoken.Encoding:
+    """
+    Return the (memoized) tiktoken encoding for a model, falling back to
+    DEFAULT_ENCODING for models tiktoken doesn't know.
+    """
+    try:
+        encoding_name = tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        encoding_name = DEFAULT_ENCODING
+    return get_encoding_by_name(encoding_name)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token) for pre-filtering.
+
+    :param text: The text to estimate tokens for
+    :return: Estimated number of tokens
+    """
+    return (len(text) + 3) // 4
+
+
+def calculate_tokens(text: str, model: str = "gpt-4o", estimate: bool = False) -> int:
     """
     Count the number of tokens in a text string.
 
     :param text: The text to count tokens for
     :param model: The model name to use for token counting (default: gpt-4o)
+    :param estimate: Return a cheap character-based estimate instead
     :return: Number of tokens
     """
-    encoding = tiktoken.encoding_for_model(model)
-    return len(encoding.encode(text))
+    if estimate:
+        return estimate_tokens(text)
+
+    count_func = _find_tokenizer(model)
+    if count_func is not None:
+        return count_func(text)
+    return len(get_encoding(model).encode(text, disallowed_special=()))
+
+
+def count_tokens_batch(
+    texts: List[str],
+    model: str = "gpt-4o",
+    estimate: bool = False,
+    num_threads: int = 8,
+) -> List[int]:
+    """
+    Count tokens for many texts, using tiktoken's threaded encode_batch.
+
+    :param texts: The texts to count tokens for
+    :param model: The model name to use for token counting (default: gpt-4o)
+    :param estimate: Return cheap character-based estimates instead
+    :param num_threads: Number of tiktoken worker threads
+    :return: Number of tokens of each text, in input order
+    """
+    if estimate:
+        return [estimate_tokens(text) for text in texts]
+
+    count_func = _find_tokenizer(model)
+    if count_func is not None:
+        return [count_func(text) for text in texts]
+
+    encoded = get_encoding(model).encode_batch(
+        texts, num_threads=num_threads, disallowed_special=()
+    )
+    return [len(tokens) for tokens in encoded]